@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def install_database_triggers(sender, using, **kwargs):
+    """Recreates the triggers SQLite drops when a migration rebuilds their table."""
+    from accounts.counts import install_row_count_triggers
+    from accounts.search import install_name_search
+
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    if "accounts_rowcount" in tables:
+        install_row_count_triggers(connection)
+    if "accounts_consumer" in tables:
+        install_name_search(connection)
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        post_migrate.connect(install_database_triggers, sender=self)
@@ -0,0 +1,142 @@
+"""Async versions of the account list, export and upload views, served under ASGI.
+
+``accounts/urls.py`` routes the list, the export and the upload to these views (see
+``SERVER_INTERFACE``). They wait for clients on the event loop. The queries that run
+outside a transaction use the ORM's async methods: the validators and the count of the
+list, and the rows of the export. The page of the list, read by the synchronous
+pagination of the REST framework, and the ingestion, which runs in transactions, run
+in a thread through ``sync_to_async``, one call per step so that a request crosses
+threads as few times as possible.
+
+The views answer exactly like their WSGI counterparts in ``accounts.views``.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from accounts.caching import alist_cache_key
+from accounts.counts import aexact_count
+from accounts.metrics import timing
+from accounts.pagination import CustomLimitOffsetPagination
+from accounts.serializers import aserialize_debt_rows
+from accounts.views import (
+    AccountListView,
+    export_response,
+    ingest_upload,
+    queue_upload,
+    requested_fields,
+    set_validators,
+)
+
+# the output of the REST framework's JSONRenderer
+JSON_DUMPS_PARAMS = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+async def account_list(request):
+    """Lists the debts like :class:`AccountListView`, from which the database work is run.
+
+    Cached pages, and the 304 responses to conditional requests they allow, are
+    answered without querying the database. The response is always JSON.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed"}, status=405)
+
+    view = AccountListView(request=Request(request), args=(), kwargs={}, format_kwarg=None)
+    try:
+        fields = requested_fields(request.GET)
+    except APIException as e:
+        return JsonResponse(e.detail, status=e.status_code)
+
+    key = await alist_cache_key(request, view.database)
+    timeout = view.cache_timeout()
+    cached = await cache.aget(key) if timeout else None
+    if cached is not None:
+        etag, last_modified = cached["etag"], cached["last_modified"]
+    else:
+        with timing("validators"):
+            etag, last_modified = await view.avalidators(key)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    if cached is not None:
+        data = cached["data"]
+    else:
+        await count_rows(view)
+        try:
+            data = (await sync_to_async(view.list_rows)(view.request, fields)).data
+        except APIException as e:  # an invalid cursor
+            return JsonResponse({"detail": e.detail}, status=e.status_code)
+        if timeout:
+            entry = {"data": data, "etag": etag, "last_modified": last_modified}
+            await cache.aset(key, entry, timeout)
+    response = JsonResponse(data, safe=False, json_dumps_params=JSON_DUMPS_PARAMS)
+    return set_validators(response, etag, last_modified)
+
+
+async def count_rows(view):
+    """Runs the exact count of a limit/offset page with the async ORM.
+
+    The paginator then uses it instead of counting. Estimated counts and cursor pages
+    are left to the paginator.
+    """
+    paginator = view.paginator
+    if not isinstance(paginator, CustomLimitOffsetPagination):
+        return
+    if paginator.get_count_mode(view.request) == "exact":
+        with timing("count"):
+            paginator.known_count = await aexact_count(view.list_queryset())
+
+
+async def export_debts(request):
+    """Streams the debts like :func:`accounts.views.export_debts`.
+
+    Django's ASGI handler reads a synchronous iterator whole before sending it, so the
+    rows are read with the async ORM instead.
+    """
+    return export_response(request, aexport_lines)
+
+
+async def aexport_lines(rows, chunk_size, header, render):
+    """Async version of :func:`accounts.views.export_lines`."""
+    if header:
+        yield header
+    chunk = []
+    async for row in rows.aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield render(await aserialize_debt_rows(chunk, using=rows.db))
+            chunk = []
+    if chunk:
+        yield render(await aserialize_debt_rows(chunk, using=rows.db))
+
+
+@csrf_exempt
+async def upload_csv(request):
+    """Ingests an uploaded CSV file like :func:`accounts.views.upload_csv`.
+
+    The ASGI handler receives the whole body before calling the view, spooling it to
+    disk past ``FILE_UPLOAD_MAX_MEMORY_SIZE``, so a slow client holds no thread; the
+    multipart body is then parsed, and the file ingested, in a thread.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Only POST method allowed"}, status=405)
+
+    files = await sync_to_async(lambda: request.FILES, thread_sensitive=False)()
+    if "file" not in files:
+        return JsonResponse({"error": "CSV file is required"}, status=400)
+
+    if request.GET.get("async") in ("1", "true"):
+        return await sync_to_async(queue_upload)(files["file"])
+
+    resume_from = request.GET.get("resume_from", "0")
+    if not resume_from.isdigit():
+        return JsonResponse({"error": "resume_from must be a byte offset"}, status=400)
+
+    return await sync_to_async(ingest_upload)(files["file"], int(resume_from))
@@ -0,0 +1 @@
+"""Benchmarks for the ingestion and read paths (see ``manage.py bench``)."""
@@ -0,0 +1,90 @@
+"""Deterministic generator of CSV files in the ``upload_csv`` format."""
+
+import csv
+import random
+
+HEADER = [
+    "client reference no",
+    "balance",
+    "status",
+    "consumer name",
+    "consumer address",
+    "ssn",
+    "agency_id",
+]
+STATUSES = ["IN_COLLECTION", "PAID_IN_FULL", "INACTIVE"]
+FIRST_NAMES = ["John", "Jane", "Alice", "Bob", "Carlos", "María", "Wei", "Fatima", "Olga"]
+LAST_NAMES = ["Doe", "Smith", "García", "Chen", "Okafor", "Novak", "Jensen", "Rossi"]
+UNKNOWN_AGENCY_ID = 999999999
+
+# kinds of rows the ingestion is expected to reject
+BAD_ROW_KINDS = ["unknown_agency", "negative_balance", "invalid_balance", "invalid_ssn"]
+
+
+def ssn_for(number):
+    return f"{number // 1000000 % 1000:03d}-{number // 10000 % 100:02d}-{number % 10000:04d}"
+
+
+def consumer_name(number):
+    first = FIRST_NAMES[number % len(FIRST_NAMES)]
+    last = LAST_NAMES[number // len(FIRST_NAMES) % len(LAST_NAMES)]
+    return f"{first} {last} {number}"
+
+
+def generate_rows(
+    rows, repeat_clients=0.9, repeat_consumers=0.5, bad_rows=0.0, seed=0, agency_ids=()
+):
+    """Yields CSV rows (lists in ``HEADER`` order).
+
+    ``repeat_clients`` and ``repeat_consumers`` are the probabilities that a row
+    references a client or consumer already used by a previous row; ``bad_rows`` is the
+    share of rows that must be rejected. The same arguments always produce the same
+    rows.
+    """
+    rng = random.Random(seed)
+    # clients and consumers are derived from their number, so only counts are kept
+    clients = 0
+    consumers = 0
+    for _ in range(rows):
+        if clients and rng.random() < repeat_clients:
+            client = rng.randrange(clients)
+        else:
+            client = clients
+            clients += 1
+
+        if consumers and rng.random() < repeat_consumers:
+            consumer = rng.randrange(consumers)
+        else:
+            consumer = consumers
+            consumers += 1
+
+        agency_id = rng.choice(agency_ids) if agency_ids and rng.random() < 0.5 else ""
+        balance = f"{rng.randint(100, 99999999) / 100:.2f}"
+        row = [
+            f"C{client:08d}",
+            balance,
+            rng.choice(STATUSES),
+            consumer_name(consumer),
+            f"{consumer % 9999 + 1} Main St, Springfield",
+            ssn_for(consumer),
+            agency_id,
+        ]
+
+        if rng.random() < bad_rows:
+            kind = rng.choice(BAD_ROW_KINDS)
+            if kind == "unknown_agency":
+                row[6] = UNKNOWN_AGENCY_ID
+            elif kind == "negative_balance":
+                row[1] = f"-{balance}"
+            elif kind == "invalid_balance":
+                row[1] = "N/A"
+            elif kind == "invalid_ssn":
+                row[5] = row[5].replace("-", "")[:7]
+        yield row
+
+
+def write_csv(csv_file, rows, **options):
+    """Writes a generated CSV (header included) to a text file object."""
+    writer = csv.writer(csv_file)
+    writer.writerow(HEADER)
+    writer.writerows(generate_rows(rows, **options))
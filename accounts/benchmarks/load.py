@@ -0,0 +1,120 @@
+"""Load generator comparing the WSGI and ASGI deployments under slow clients.
+
+Slow clients trickle a CSV upload to the server while readers request the account
+list as fast as they can; the list latencies show how much capacity the uploads
+take away. Under WSGI every upload holds a worker thread until its last byte
+arrives, under ASGI the event loop receives the uploads.
+
+The clients speak HTTP/1.1 over plain asyncio streams, so one process can keep
+hundreds of slow uploads open. The uploaded file has no rows: nothing is ingested.
+"""
+
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+UPLOAD_HEADER = "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+BOUNDARY = "loadtest-boundary"
+
+
+def upload_body(padding):
+    """A multipart upload of a CSV file without rows, padded with ``padding`` bytes."""
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="load.csv"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+        f"{UPLOAD_HEADER}{' ' * padding}\r\n"
+        f"--{BOUNDARY}--\r\n"
+    ).encode()
+
+
+async def request(url, method="GET", body=b"", headers=(), pieces=1, interval=0):
+    """Sends a request, the body in ``pieces`` every ``interval`` seconds.
+
+    Returns the status code, or None if the connection failed.
+    """
+    parts = urlsplit(url)
+    try:
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    except OSError:
+        return None
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    head = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close"]
+    head += [f"{name}: {value}" for name, value in headers]
+    if body:
+        head.append(f"Content-Length: {len(body)}")
+    try:
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+        size = max(1, -(-len(body) // pieces))
+        for start in range(0, len(body), size):
+            writer.write(body[start : start + size])
+            await writer.drain()
+            if interval:
+                await asyncio.sleep(interval)
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    finally:
+        writer.close()
+
+
+async def slow_uploader(url, deadline, upload_seconds, results):
+    body = upload_body(padding=4096)
+    pieces = 32
+    while time.monotonic() < deadline:
+        status = await request(
+            f"{url}/accounts/csv",
+            "POST",
+            body,
+            headers=[("Content-Type", f"multipart/form-data; boundary={BOUNDARY}")],
+            pieces=pieces,
+            interval=upload_seconds / pieces,
+        )
+        results["uploads" if status == 200 else "upload_errors"] += 1
+
+
+async def reader(url, deadline, latencies, results):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        status = await request(f"{url}/accounts/?limit=10&count=none")
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            results["list_errors"] += 1
+
+
+async def _run_load(url, slow_clients, readers, seconds, upload_seconds):
+    deadline = time.monotonic() + seconds
+    latencies = []
+    results = {"uploads": 0, "upload_errors": 0, "list_errors": 0}
+    await asyncio.gather(
+        *[slow_uploader(url, deadline, upload_seconds, results) for _ in range(slow_clients)],
+        *[reader(url, deadline, latencies, results) for _ in range(readers)],
+    )
+    return latencies, results
+
+
+def run_load(url, slow_clients=50, readers=4, seconds=10.0, upload_seconds=5.0):
+    """Loads the server at ``url`` and returns the measurements of the account list."""
+    url = url.rstrip("/")
+    started = time.perf_counter()
+    latencies, results = asyncio.run(_run_load(url, slow_clients, readers, seconds, upload_seconds))
+    elapsed = time.perf_counter() - started
+    measurements = {
+        "url": url,
+        "slow_clients": slow_clients,
+        "readers": readers,
+        "list_requests": len(latencies),
+        "list_requests_per_second": round(len(latencies) / elapsed, 1),
+        "list_p50_ms": None,
+        "list_p99_ms": None,
+        **results,
+    }
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+        measurements["list_p50_ms"] = round(cuts[49] * 1000, 3)
+        measurements["list_p99_ms"] = round(cuts[98] * 1000, 3)
+    return measurements
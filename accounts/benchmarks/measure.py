@@ -0,0 +1,78 @@
+"""Measurement helpers shared by the benchmarks and the bulk-load command."""
+
+import re
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+# on Linux, the peak RSS of the process (its "high water mark") and how to reset it
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+HIGH_WATER_MARK = re.compile(r"^VmHWM:\s+(\d+) kB$", re.MULTILINE)
+
+
+def reset_peak_rss():
+    """Restarts the peak RSS of the process from its current RSS.
+
+    Only Linux allows it; returns whether the peak was reset. Elsewhere the peak stays
+    the one of the whole process.
+    """
+    try:
+        with open(PROC_CLEAR_REFS, "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size in MB, since the last :func:`reset_peak_rss`.
+
+    ``ru_maxrss`` (in KB on Linux, bytes on macOS) is never reset, so the peak of the
+    process is read from ``/proc`` where available.
+    """
+    if who == resource.RUSAGE_SELF:
+        try:
+            with open(PROC_STATUS) as status:
+                return int(HIGH_WATER_MARK.search(status.read()).group(1)) / 1024
+        except (OSError, AttributeError):
+            pass
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class QueryCounter:
+    """Counts the SQL statements executed through Django without storing them.
+
+    Unlike ``CaptureQueriesContext`` it keeps no SQL text, so it can wrap imports of
+    millions of rows. Statements sent on the raw DB-API cursor (e.g. ``COPY``) are not
+    counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure():
+    """Collects elapsed time, query count and peak RSS of the wrapped block.
+
+    The peak RSS is the block's own where :func:`reset_peak_rss` is supported, so a
+    scenario does not report the peak of one run before it.
+    """
+    stats = {}
+    counter = QueryCounter()
+    reset_peak_rss()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        yield stats
+    stats["seconds"] = time.perf_counter() - started
+    stats["queries"] = counter.count
+    stats["peak_rss_mb"] = round(peak_rss_mb(), 1)
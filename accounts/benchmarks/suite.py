@@ -0,0 +1,238 @@
+"""Benchmark scenarios.
+
+Every scenario is a function registered with :func:`scenario` that receives a
+:class:`BenchContext` and returns a dict of measurements. Scenarios run in the order
+they are requested, against whatever database is configured, and may rely on the
+state left by the previous ones (``reingest`` uploads the file ``ingest`` loaded).
+"""
+
+import csv
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+
+import django
+from django.db import close_old_connections, connection
+from django.db.models import Prefetch
+from django.test import Client as HttpClient, override_settings
+from django.urls import reverse
+
+from accounts.benchmarks.generator import write_csv
+from accounts.benchmarks.measure import measure
+from accounts.ingestion import BatchIngestor, CSVLineReader, get_ingestor, mmap_chunks
+from accounts.models import Client, CollectionAgency, Consumer, Debt
+from accounts.serializers import DEBT_ROW_FIELDS, DebtSerializer, serialize_debt_rows
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Registers a benchmark scenario under ``name``."""
+
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+
+    return register
+
+
+@dataclass
+class BenchContext:
+    path: str
+    rows: int
+    backend: str = "auto"
+    batch_size: int = None
+
+
+def make_ingestor(context):
+    if context.backend == "orm":
+        return BatchIngestor(batch_size=context.batch_size)
+    if context.backend == "copy":
+        from accounts.ingestion.postgres import CopyIngestor
+
+        return CopyIngestor(batch_size=context.batch_size)
+    return get_ingestor(batch_size=context.batch_size)
+
+
+def reset_data():
+    """Removes the ingested data, keeping (or creating) the default agency."""
+    Debt.objects.all().delete()
+    Client.objects.all().delete()
+    Consumer.objects.all().delete()
+    if not CollectionAgency.objects.exists():
+        CollectionAgency.objects.create(name="Default Agency")
+
+
+def _ingest_file(context):
+    ingestor = make_ingestor(context)
+    with measure() as stats:
+        result = ingestor.ingest(csv.DictReader(CSVLineReader(mmap_chunks(context.path))))
+    rows = max(context.rows, 1)
+    return {
+        "backend": type(ingestor).__name__,
+        "seconds": round(stats["seconds"], 4),
+        "rows_per_second": round(context.rows / stats["seconds"], 1),
+        "queries": stats["queries"],
+        "queries_per_row": round(stats["queries"] / rows, 4),
+        "peak_rss_mb": stats["peak_rss_mb"],
+        **result.as_dict(),
+    }
+
+
+@scenario("ingest")
+def bench_ingest(context):
+    """Loads the generated file into empty tables."""
+    reset_data()
+    return _ingest_file(context)
+
+
+@scenario("reingest")
+def bench_reingest(context):
+    """Uploads the same file again: every row should be detected as a duplicate."""
+    if not Debt.objects.exists():
+        _ingest_file(context)
+    return _ingest_file(context)
+
+
+LIST_PAGE_SIZE = 50
+
+
+@scenario("list_page")
+def bench_list_page(context):
+    """Serializes every page of the account list with DebtSerializer and with plain rows."""
+    if not Debt.objects.exists():
+        _ingest_file(context)
+    debts = Debt.objects.order_by("created_at", "id")
+    total = debts.count()
+    pages = range(0, total, LIST_PAGE_SIZE)
+
+    with measure() as serializer_stats:
+        for start in pages:
+            page = debts.prefetch_related(Prefetch("consumers", Consumer.objects.order_by("id")))
+            DebtSerializer(page[start : start + LIST_PAGE_SIZE], many=True).data
+    with measure() as stats:
+        rows = debts.values_list(*DEBT_ROW_FIELDS, named=True)
+        for start in pages:
+            serialize_debt_rows(rows[start : start + LIST_PAGE_SIZE])
+
+    page_count = max(len(pages), 1)
+    return {
+        "seconds": round(stats["seconds"], 4),
+        "rows_per_second": round(total / stats["seconds"], 1),
+        "queries": stats["queries"],
+        "ms_per_page": round(stats["seconds"] * 1000 / page_count, 3),
+        "serializer_ms_per_page": round(serializer_stats["seconds"] * 1000 / page_count, 3),
+        "speedup": round(serializer_stats["seconds"] / stats["seconds"], 2),
+        "peak_rss_mb": stats["peak_rss_mb"],
+    }
+
+
+LATENCY_REQUESTS = 200
+
+
+def _list_latencies(conn_max_age):
+    """Times account list requests, opening and closing connections like Django does.
+
+    The test client skips the connection handling of the request signals, so it is
+    replayed around every request, with the database's CONN_MAX_AGE set to
+    ``conn_max_age``.
+    """
+    connection.close()
+    connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+    client = HttpClient(HTTP_HOST="localhost")
+    url = reverse("accounts-list")
+    latencies = []
+    for _ in range(LATENCY_REQUESTS):
+        started = time.perf_counter()
+        close_old_connections()  # request_started
+        client.get(url, {"limit": 10})
+        close_old_connections()  # request_finished
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _percentiles(latencies):
+    cuts = statistics.quantiles(latencies, n=100)
+    return round(cuts[49] * 1000, 3), round(cuts[98] * 1000, 3)
+
+
+@scenario("list_latency")
+def bench_list_latency(context):
+    """Compares list latencies with a new connection per request and persistent ones."""
+    if not Debt.objects.exists():
+        _ingest_file(context)
+    conn_max_age = connection.settings_dict["CONN_MAX_AGE"]
+    try:
+        # measure the connection handling, not the response cache
+        with override_settings(ACCOUNT_LIST_CACHE_SECONDS=0):
+            _list_latencies(None)  # warm up
+            fresh = _list_latencies(0)
+            persistent = _list_latencies(None)
+    finally:
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+
+    fresh_p50, fresh_p99 = _percentiles(fresh)
+    p50, p99 = _percentiles(persistent)
+    return {
+        "requests": LATENCY_REQUESTS,
+        "requests_per_second": round(len(persistent) / sum(persistent), 1),
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "fresh_connection_p50_ms": fresh_p50,
+        "fresh_connection_p99_ms": fresh_p99,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, scenarios, backend="auto", batch_size=None, **generator_options):
+    """Runs ``scenarios`` for every size and returns machine-readable results."""
+    results = []
+    for rows in sizes:
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(handle, "w", newline="") as csv_file:
+                write_csv(csv_file, rows, **generator_options)
+            context = BenchContext(path=path, rows=rows, backend=backend, batch_size=batch_size)
+            for name in scenarios:
+                measurements = SCENARIOS[name](context)
+                results.append({"scenario": name, "rows": rows, **measurements})
+        finally:
+            os.remove(path)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "vendor": connection.vendor,
+            "django": django.get_version(),
+            "python": platform.python_version(),
+            "batch_size": batch_size,
+            "generator": generator_options,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline):
+    """Pairs results with a baseline run and returns the relative throughput change."""
+    key_fields = ("scenario", "rows", "backend")
+    previous = {tuple(r.get(k) for k in key_fields): r for r in baseline["results"]}
+    changes = []
+    for result in current["results"]:
+        before = previous.get(tuple(result.get(k) for k in key_fields))
+        if before and before.get("rows_per_second"):
+            change = result["rows_per_second"] / before["rows_per_second"] - 1
+            changes.append({**{k: result.get(k) for k in key_fields}, "change": change})
+    return changes
@@ -0,0 +1,103 @@
+"""Response cache of the account list, invalidated by generation counters.
+
+The account list only changes when debts are ingested, so its responses are cached
+under a key made of the normalized query parameters and a *generation* number.
+Ingestion bumps the global generation and the generation of every agency whose
+debts changed, once the batch is committed; the next request then misses the cache
+and the stale entries simply expire. The time of the bump is kept next to the
+generation, so that a change adding no debt still dates the list for ``Last-Modified``.
+
+Only ``get``, ``set``, ``set_many``, ``add`` and ``incr`` (and the async ``aget``,
+``aset`` and ``aadd`` of the async list view) are used, so any cache backend works, including the
+local-memory, file and database ones. With several worker processes use a backend they
+share (file or database), or every process keeps its own cache.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = "accounts:generation"
+CHANGED_KEY = "accounts:changed"
+
+
+def _generation_key(agency_id=None, prefix=GENERATION_KEY):
+    return prefix if agency_id is None else f"{prefix}:{agency_id}"
+
+
+def _fresh_generation():
+    # a generation lost to eviction must not come back with a value used before
+    return time.time_ns()
+
+
+def get_generation(agency_id=None):
+    """Returns the current generation of the whole list, or of one agency's debts."""
+    key = _generation_key(agency_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _fresh_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(agency_id=None):
+    """Async version of :func:`get_generation`."""
+    key = _generation_key(agency_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, _fresh_generation(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generations(agency_ids=()):
+    """Invalidates the cached lists of the given agencies and the unfiltered lists."""
+    agency_ids = [None, *agency_ids]
+    for key in [_generation_key(pk) for pk in agency_ids]:
+        try:
+            cache.incr(key)
+        except ValueError:  # not cached (yet, or any more)
+            cache.set(key, _fresh_generation(), None)
+    changed = int(time.time())
+    cache.set_many({_generation_key(pk, CHANGED_KEY): changed for pk in agency_ids}, None)
+
+
+def list_changed_at(request):
+    """Returns when the generation of the account list of ``request`` was last bumped.
+
+    The Unix time in seconds, or 0 if it was not bumped since the cache was emptied.
+    """
+    return cache.get(_generation_key(_list_agency_id(request), CHANGED_KEY), 0)
+
+
+async def alist_changed_at(request):
+    """Async version of :func:`list_changed_at`."""
+    return await cache.aget(_generation_key(_list_agency_id(request), CHANGED_KEY), 0)
+
+
+def list_cache_key(request, database):
+    """Returns the cache key of an account list request read from ``database``.
+
+    Parameters are sorted and empty ones dropped, so equivalent URLs share an entry.
+    A list filtered on one agency only depends on that agency's generation. A page read
+    from a lagging replica is kept apart from the primary's, which the clients pinned to
+    the primary after an upload must get.
+    """
+    return _list_cache_key(request, database, get_generation(_list_agency_id(request)))
+
+
+async def alist_cache_key(request, database):
+    """Async version of :func:`list_cache_key`."""
+    return _list_cache_key(request, database, await aget_generation(_list_agency_id(request)))
+
+
+def _list_agency_id(request):
+    agency_id = request.GET.get("agency_id", "")
+    return int(agency_id) if agency_id.isdigit() else None
+
+
+def _list_cache_key(request, database, generation):
+    params = sorted((name, values) for name, values in request.GET.lists() if any(values))
+    raw = repr((request.build_absolute_uri(request.path), params, database, generation))
+    return f"accounts:list:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
@@ -0,0 +1,126 @@
+"""Exact, cached and estimated row counts for paginated lists.
+
+An exact ``COUNT(*)`` over the filtered list can cost more than fetching the page
+itself, so totals can also be served from the cache or estimated:
+
+* on PostgreSQL the planner's row estimate for the query is used (``EXPLAIN``);
+* on SQLite unfiltered totals come from a :class:`RowCount` counter kept up to date
+  by triggers (see :func:`install_row_count_triggers`).
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from accounts.caching import aget_generation, get_generation
+from accounts.models import Debt, RowCount
+
+# models whose tables have row counting triggers on SQLite
+COUNTED_MODELS = {Debt}
+
+
+COUNT_TRIGGERS = {
+    "insert": """
+        CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE accounts_rowcount SET rows = rows + 1 WHERE "table" = '{table}';
+        END
+    """,
+    "delete": """
+        CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE accounts_rowcount SET rows = rows - 1 WHERE "table" = '{table}';
+        END
+    """,
+}
+
+
+def _sqlite_triggers(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    return {name for (name,) in cursor.fetchall()}
+
+
+def install_row_count_triggers(connection):
+    """Creates the SQLite triggers maintaining the :class:`RowCount` counters.
+
+    SQLite drops triggers along with their table, which Django does when it rebuilds
+    a table during a migration, so this also runs after every ``migrate``. A counter
+    whose triggers were missing is reset and recounted on its next use.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        triggers = _sqlite_triggers(cursor)
+        for model in COUNTED_MODELS:
+            table = model._meta.db_table
+            if {f"{table}_count_{event}" for event in COUNT_TRIGGERS} <= triggers:
+                continue
+            for sql in COUNT_TRIGGERS.values():
+                cursor.execute(sql.format(table=table))
+            cursor.execute('DELETE FROM accounts_rowcount WHERE "table" = %s', [table])
+
+
+def get_row_count(model, using="default"):
+    """Returns the maintained row count of ``model``'s table.
+
+    The counter is recreated from a full count if it is missing, e.g. after a flush.
+    """
+    counter, _ = RowCount.objects.using(using).get_or_create(
+        table=model._meta.db_table,
+        defaults={"rows": model._default_manager.using(using).count()},
+    )
+    return counter.rows
+
+
+def exact_count(queryset):
+    """Counts ``queryset``, caching the total briefly for identical queries.
+
+    Cached totals are dropped as soon as an ingest bumps the list generation.
+    """
+    key = _count_cache_key(queryset, get_generation())
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.ACCOUNT_LIST_COUNT_CACHE_SECONDS)
+    return count
+
+
+async def aexact_count(queryset):
+    """Async version of :func:`exact_count`."""
+    key = _count_cache_key(queryset, await aget_generation())
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(key, count, settings.ACCOUNT_LIST_COUNT_CACHE_SECONDS)
+    return count
+
+
+def _count_cache_key(queryset, generation):
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    key_data = (queryset.db, sql, params, generation)
+    return f"accounts:count:{hashlib.sha256(repr(key_data).encode('utf-8')).hexdigest()}"
+
+
+def planner_estimate(queryset):
+    """Returns the number of rows PostgreSQL's planner expects ``queryset`` to return."""
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        (plan,) = cursor.fetchone()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def estimated_count(queryset):
+    """Returns a cheap estimate of ``queryset.count()``."""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return planner_estimate(queryset)
+    if vendor == "sqlite" and queryset.model in COUNTED_MODELS and not queryset.query.where:
+        return get_row_count(queryset.model, using=queryset.db)
+    # filtered totals cannot be derived from the counter
+    return exact_count(queryset)
@@ -0,0 +1,21 @@
+"""Bulk ingestion of the CSV files provided by clients."""
+
+from accounts.ingestion.engine import (
+    BatchIngestor,
+    IngestResult,
+    chunked,
+    get_ingestor,
+    ingest_rows,
+)
+from accounts.ingestion.reader import CSVEncodingError, CSVLineReader, mmap_chunks
+
+__all__ = [
+    "BatchIngestor",
+    "CSVEncodingError",
+    "CSVLineReader",
+    "IngestResult",
+    "chunked",
+    "get_ingestor",
+    "ingest_rows",
+    "mmap_chunks",
+]
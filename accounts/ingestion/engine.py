@@ -0,0 +1,277 @@
+"""Batched ingestion engine for client CSV files.
+
+Rows are consumed in chunks. For every chunk the agencies, clients and consumers it
+references are resolved with one set-based query per model, the missing ones are
+created with ``bulk_create`` and finally the debts and their consumer links are
+bulk-inserted, so the number of queries depends on the number of chunks instead of
+the number of rows.
+
+Clients and consumers are inserted with ON CONFLICT DO NOTHING semantics and read
+back, so several imports can run concurrently without creating duplicates.
+
+Rows are validated and normalized batch by batch before any query runs (see
+:mod:`accounts.ingestion.validation`); rejected rows are reported as failed. Every
+clean row is fingerprinted (see :mod:`accounts.ingestion.fingerprint`); rows whose
+fingerprint is already stored are skipped and reported as duplicated. The new debts
+of every batch are added to the portfolio rollups (see :mod:`accounts.rollups`).
+"""
+
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+from accounts.caching import bump_generations
+from accounts.ingestion.validation import validate_batch
+from accounts.models import Client, CollectionAgency, Consumer, Debt
+from accounts.rollups import add_to_rollups
+
+
+@dataclass
+class IngestResult:
+    """Counters reported back to the client once a file has been processed."""
+
+    created: int = 0
+    duplicated: int = 0
+    failed: int = 0
+    # agencies that received new debts, whose cached lists must be invalidated
+    agency_ids: set = field(default_factory=set, repr=False)
+
+    def __add__(self, other):
+        return IngestResult(
+            created=self.created + other.created,
+            duplicated=self.duplicated + other.duplicated,
+            failed=self.failed + other.failed,
+            agency_ids=self.agency_ids | other.agency_ids,
+        )
+
+    @property
+    def processed(self):
+        return self.created + self.duplicated + self.failed
+
+    def as_dict(self):
+        return {"created": self.created, "duplicated": self.duplicated, "failed": self.failed}
+
+
+def chunked(iterable, size):
+    """Yields lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class BatchIngestor:
+    """Persists parsed CSV rows in batches using set-based queries."""
+
+    def __init__(self, batch_size=None, default_agency_id=None):
+        self.batch_size = batch_size or settings.CSV_INGEST_BATCH_SIZE
+        self.default_agency_id = default_agency_id
+        self._default_agency = None
+
+    @property
+    def default_agency(self):
+        # if agency_id is not specified, added to the default one
+        if self._default_agency is None:
+            agencies = CollectionAgency.objects.all()
+            if self.default_agency_id is not None:
+                agencies = agencies.filter(pk=self.default_agency_id)
+            self._default_agency = agencies.first()
+        return self._default_agency
+
+    def ingest(self, rows, on_batch=None):
+        """Ingests an iterable of CSV rows (dicts) and returns the aggregated counters.
+
+        ``on_batch`` is called with the counters of the batch and the running totals
+        inside the transaction of every batch, so progress is committed along with it.
+        Once a batch that created debts is committed, the cached account lists of their
+        agencies are invalidated.
+        """
+        result = IngestResult()
+        for batch in chunked(rows, self.batch_size):
+            with transaction.atomic():
+                batch_result = self.ingest_batch(batch)
+                if batch_result.agency_ids:
+                    transaction.on_commit(partial(bump_generations, batch_result.agency_ids))
+                result += batch_result
+                if on_batch is not None:
+                    on_batch(batch_result, result)
+        return result
+
+    def ingest_batch(self, rows):
+        """Persists a single batch of rows. Must be called inside a transaction."""
+        result = IngestResult()
+        clean, rejected = validate_batch(rows)
+        result.failed += len(rejected)
+        clean = self._drop_duplicates(clean, result)
+        if not clean:
+            return result
+
+        agencies = self._resolve_agencies(clean)
+        valid = []
+        for row in clean:
+            if row.agency_id and row.agency_id not in agencies:
+                result.failed += 1
+                continue
+            valid.append(row)
+
+        if not valid:
+            return result
+
+        clients = self._resolve_clients(valid, agencies)
+        consumers = self._resolve_consumers(valid)
+        debts, valid = self._insert_debts(valid, clients, result)
+
+        through = Debt.consumers.through
+        through.objects.bulk_create(
+            [
+                through(debt_id=debt.pk, consumer_id=consumers[row.ssn].pk)
+                for debt, row in zip(debts, valid)
+            ],
+            batch_size=self.batch_size,
+        )
+        add_to_rollups(debts)
+        result.created += len(debts)
+        result.agency_ids.update(debt.agency_id for debt in debts)
+        return result
+
+    @staticmethod
+    def _known_fingerprints(rows):
+        fingerprints = [row.fingerprint for row in rows]
+        return set(
+            Debt.objects.filter(fingerprint__in=fingerprints).values_list("fingerprint", flat=True)
+        )
+
+    def _drop_duplicates(self, rows, result):
+        """Removes the rows already stored or repeated within the batch.
+
+        A single query checks the whole batch, so re-ingesting a known file is close
+        to a read-only pass.
+        """
+        seen = self._known_fingerprints(rows)
+        unique = []
+        for row in rows:
+            if row.fingerprint in seen:
+                result.duplicated += 1
+                continue
+            seen.add(row.fingerprint)
+            unique.append(row)
+        return unique
+
+    def _insert_debts(self, rows, clients, result):
+        """Bulk-inserts the debts of ``rows`` and returns them with their rows.
+
+        If a concurrent import stored some of the same rows in the meantime, the
+        insert is retried without them and they are counted as duplicates.
+        """
+        while True:
+            try:
+                with transaction.atomic():
+                    debts = Debt.objects.bulk_create(
+                        [
+                            Debt(
+                                balance=row.balance,
+                                status=row.status,
+                                client_reference_no=row.client_ref,
+                                client=clients[row.client_ref],
+                                agency_id=clients[row.client_ref].agency_id,
+                                fingerprint=row.fingerprint,
+                            )
+                            for row in rows
+                        ],
+                        batch_size=self.batch_size,
+                    )
+                return debts, rows
+            except IntegrityError:
+                known = self._known_fingerprints(rows)
+                if not known:
+                    raise
+                result.duplicated += len(known)
+                rows = [row for row in rows if row.fingerprint not in known]
+
+    @staticmethod
+    def _resolve_agencies(rows):
+        """Maps every requested agency id to its agency."""
+        requested = {row.agency_id for row in rows if row.agency_id}
+        if not requested:
+            return {}
+        return CollectionAgency.objects.in_bulk(requested)
+
+    def _agency_for(self, row, agencies):
+        return agencies[row.agency_id] if row.agency_id else self.default_agency
+
+    def _resolve_clients(self, rows, agencies):
+        """Maps reference numbers to clients, creating the missing ones.
+
+        Existing clients keep their agency; new clients take the agency of the first row
+        that references them.
+        """
+        references = {row.client_ref for row in rows}
+        clients = Client.objects.in_bulk(references, field_name="reference_no")
+        missing = {}
+        for row in rows:
+            reference = row.client_ref
+            if reference not in clients and reference not in missing:
+                missing[reference] = Client(
+                    name=f"Client {reference}",
+                    agency=self._agency_for(row, agencies),
+                    reference_no=reference,
+                )
+        if missing:
+            # another import may create the same clients concurrently: ignore the
+            # conflicts and read back whichever row won. Inserting in key order makes
+            # concurrent imports wait on each other instead of deadlocking.
+            Client.objects.bulk_create(
+                [missing[reference] for reference in sorted(missing)],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            clients.update(Client.objects.in_bulk(missing, field_name="reference_no"))
+        return clients
+
+    def _resolve_consumers(self, rows):
+        """Maps SSNs to consumers, creating the missing ones from the first row seen."""
+        ssns = {row.ssn for row in rows}
+        consumers = {}
+        for consumer in Consumer.objects.filter(ssn__in=ssns).order_by("pk"):
+            consumers.setdefault(consumer.ssn, consumer)
+        missing = {}
+        for row in rows:
+            ssn = row.ssn
+            if ssn not in consumers and ssn not in missing:
+                missing[ssn] = Consumer(
+                    name=row.name, address=row.address, ssn=ssn, is_entity=False
+                )
+        if missing:
+            Consumer.objects.bulk_create(
+                [missing[ssn] for ssn in sorted(missing)],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            for consumer in Consumer.objects.filter(ssn__in=missing).order_by("pk"):
+                consumers.setdefault(consumer.ssn, consumer)
+        return consumers
+
+
+def get_ingestor(batch_size=None, default_agency_id=None):
+    """Returns the fastest ingestor supported by the database in use.
+
+    PostgreSQL uses the ``COPY`` staging path; other databases (SQLite) fall back to
+    the ORM batches.
+    """
+    if connection.vendor == "postgresql" and settings.CSV_INGEST_USE_COPY:
+        from accounts.ingestion.postgres import CopyIngestor
+
+        return CopyIngestor(batch_size=batch_size, default_agency_id=default_agency_id)
+    return BatchIngestor(batch_size=batch_size, default_agency_id=default_agency_id)
+
+
+def ingest_rows(rows, batch_size=None, on_batch=None, default_agency_id=None):
+    """Ingests parsed CSV rows in batches and returns an :class:`IngestResult`.
+
+    Rows without an ``agency_id`` are assigned to ``default_agency_id`` or, when not
+    given, to the first agency.
+    """
+    ingestor = get_ingestor(batch_size=batch_size, default_agency_id=default_agency_id)
+    return ingestor.ingest(rows, on_batch=on_batch)
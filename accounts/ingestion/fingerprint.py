@@ -0,0 +1,27 @@
+"""Row fingerprints used to detect debts that were already ingested."""
+
+import hashlib
+import re
+from decimal import Decimal
+
+CENTS = Decimal("0.01")
+STATUS_SEPARATORS = re.compile(r"[\s-]+")
+
+
+def debt_fingerprint(client_reference_no, ssn, balance, status):
+    """Returns a stable hash identifying a debt row.
+
+    Values are normalized first so cosmetic differences between two uploads of the
+    same file (whitespace, SSN punctuation, ``100.5`` vs ``100.50``, status casing and
+    separators) produce the same fingerprint. Status normalization matches
+    :func:`accounts.ingestion.validation.normalize_status`.
+    """
+    normalized = "|".join(
+        [
+            client_reference_no.strip(),
+            "".join(char for char in ssn if char.isdigit()),
+            str(Decimal(str(balance).strip()).quantize(CENTS)),
+            STATUS_SEPARATORS.sub("_", status.strip()).upper(),
+        ]
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
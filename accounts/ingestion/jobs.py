@@ -0,0 +1,147 @@
+"""Asynchronous ingestion jobs backed by the ``IngestJob`` table.
+
+Uploads in job mode are stored and queued; ``manage.py run_ingest_worker`` claims
+queued jobs one at a time and ingests them, committing progress and a resumable
+checkpoint with every batch. No external broker is needed: the job table is the queue.
+The file of a job is deleted once it is ingested, or once its failure is old enough to
+be purged.
+"""
+
+import csv
+import logging
+from functools import partial
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.ingestion.engine import ingest_rows
+from accounts.ingestion.parallel import import_file
+from accounts.ingestion.reader import CSVLineReader
+from accounts.models import IngestJob
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(uploaded_file):
+    """Stores an uploaded CSV file and queues it for ingestion."""
+    return IngestJob.objects.create(file=uploaded_file)
+
+
+def claim_next_job():
+    """Marks the oldest queued job as running and returns it, or ``None``.
+
+    The claim is a conditional UPDATE, so concurrent workers never pick the same job.
+    """
+    queued = IngestJob.objects.filter(status=IngestJob.QUEUED).order_by("created_at", "pk")
+    for job_id in queued.values_list("pk", flat=True)[:10]:
+        now = timezone.now()
+        claimed = IngestJob.objects.filter(pk=job_id, status=IngestJob.QUEUED).update(
+            status=IngestJob.RUNNING, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return IngestJob.objects.get(pk=job_id)
+    return None
+
+
+def requeue_jobs(retry_failed=False, stale_after=None):
+    """Queues interrupted jobs again so they resume from their checkpoint.
+
+    Running jobs that have not committed a batch within ``stale_after`` (a
+    ``timedelta``) are considered interrupted, e.g. by a worker or database restart.
+    Returns the number of requeued jobs.
+    """
+    interrupted = Q(pk__in=[])
+    if retry_failed:
+        # unless their file was purged
+        interrupted |= Q(status=IngestJob.FAILED) & ~Q(file="")
+    if stale_after is not None:
+        interrupted |= Q(status=IngestJob.RUNNING, heartbeat_at__lt=timezone.now() - stale_after)
+    return IngestJob.objects.filter(interrupted).update(
+        status=IngestJob.QUEUED, error="", finished_at=None
+    )
+
+
+def record_job_progress(job_id, batch_result, total, offset=None):
+    """Adds the counters of a committed batch to a job and moves its checkpoint."""
+    checkpoint = {} if offset is None else {"byte_offset": offset}
+    IngestJob.objects.filter(pk=job_id).update(
+        rows_processed=F("rows_processed") + batch_result.processed,
+        rows_created=F("rows_created") + batch_result.created,
+        rows_duplicated=F("rows_duplicated") + batch_result.duplicated,
+        rows_failed=F("rows_failed") + batch_result.failed,
+        heartbeat_at=timezone.now(),
+        **checkpoint,
+    )
+
+
+def run_job(job, workers=1):
+    """Ingests the file of a claimed job and records the outcome on it.
+
+    The checkpoint is committed with every batch, so a job that was interrupted
+    resumes after the last committed batch. With more than one worker a job that has
+    no checkpoint yet is imported in parallel (see
+    :func:`accounts.ingestion.parallel.import_file`); parallel imports do not record
+    checkpoints and start over when retried.
+    """
+    jobs = IngestJob.objects.filter(pk=job.pk)
+    try:
+        if workers > 1 and not job.byte_offset:
+            jobs.update(rows_processed=0, rows_created=0, rows_duplicated=0, rows_failed=0)
+            import_file(
+                job.file.path, workers=workers, on_batch=partial(record_job_progress, job.pk)
+            )
+        else:
+            with job.file.open("rb") as csv_file:
+                lines = CSVLineReader(csv_file.chunks(), offset=job.byte_offset)
+
+                def on_batch(batch_result, total):
+                    record_job_progress(job.pk, batch_result, total, offset=lines.offset)
+
+                ingest_rows(csv.DictReader(lines), on_batch=on_batch)
+    except Exception as exc:
+        logger.exception("Ingest job %s failed.", job.pk)
+        jobs.update(status=IngestJob.FAILED, error=str(exc), finished_at=timezone.now())
+    else:
+        jobs.update(status=IngestJob.DONE, finished_at=timezone.now())
+        delete_job_file(job)
+    job.refresh_from_db()
+    return job
+
+
+def delete_job_file(job):
+    """Deletes the stored file of a job that will not read it again."""
+    if job.file:
+        job.file.delete(save=False)
+        IngestJob.objects.filter(pk=job.pk).update(file="")
+
+
+def purge_failed_jobs(finished_before):
+    """Deletes the files of the jobs that failed before ``finished_before``.
+
+    Failed jobs keep their file so they can be retried from their checkpoint; once it
+    is purged they no longer can. Returns the number of purged jobs.
+    """
+    failed = IngestJob.objects.filter(status=IngestJob.FAILED, finished_at__lt=finished_before)
+    purged = 0
+    for job in failed.exclude(file=""):
+        delete_job_file(job)
+        purged += 1
+    return purged
+
+
+def job_status(job):
+    """Progress report returned by the job status endpoint."""
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "processed": job.rows_processed,
+        "created": job.rows_created,
+        "duplicated": job.rows_duplicated,
+        "failed": job.rows_failed,
+        "rows_per_second": job.rows_per_second,
+        "checkpoint": {"offset": job.byte_offset, "committed_at": job.heartbeat_at},
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,193 @@
+"""Parallel import of a CSV file stored on disk.
+
+The data section of the file is split into byte ranges aligned to line boundaries and
+every range is ingested by a separate process with its own database connection.
+Client and consumer creation is conflict-safe (see :mod:`accounts.ingestion.engine`),
+so workers never create duplicates when the same client or SSN shows up in several
+ranges.
+
+Ranges are aligned to physical lines, so files whose quoted fields contain line
+breaks must be imported with a single worker. On SQLite, which only allows one writer,
+files are always imported by the calling process.
+
+Workers send every committed batch back to the calling process over a queue, so it can
+report the progress of the whole import while the workers run.
+"""
+
+import csv
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain
+
+import django
+from django.apps import apps
+from django.db import connection, connections, transaction
+
+from accounts.benchmarks.measure import peak_rss_mb
+from accounts.ingestion.engine import IngestResult, ingest_rows
+from accounts.ingestion.reader import CSVLineReader
+
+READ_SIZE = 64 * 1024
+# seconds the calling process waits for a batch before checking the workers again
+PROGRESS_INTERVAL = 0.5
+
+# the queue of a worker process, set by its initializer
+_progress_queue = None
+
+
+def split_ranges(path, parts):
+    """Returns the header line and ``(start, end)`` byte ranges covering the data rows.
+
+    Every range starts at the beginning of a line and ends right after a line break
+    (or at the end of the file), so each row belongs to exactly one range.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as csv_file:
+        header = csv_file.readline()
+        data_start = csv_file.tell()
+        step = max((size - data_start) // max(parts, 1), 1)
+        boundaries = [data_start]
+        for index in range(1, parts):
+            csv_file.seek(max(data_start + index * step, boundaries[-1]))
+            csv_file.readline()
+            position = csv_file.tell()
+            if position >= size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+    boundaries.append(size)
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+    return header, ranges
+
+
+def iter_range(csv_file, start, end):
+    """Yields the bytes of ``csv_file`` between ``start`` and ``end`` in chunks."""
+    csv_file.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = csv_file.read(min(READ_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def ingest_range(path, header, start, end, batch_size=None, on_batch=None, default_agency_id=None):
+    """Ingests the rows found in a byte range of a CSV file."""
+    with open(path, "rb") as csv_file:
+        chunks = chain([header], iter_range(csv_file, start, end))
+        reader = csv.DictReader(CSVLineReader(chunks))
+        return ingest_rows(
+            reader,
+            batch_size=batch_size,
+            on_batch=on_batch,
+            default_agency_id=default_agency_id,
+        )
+
+
+def _init_worker(progress_queue=None):
+    global _progress_queue
+    # workers started with "spawn" or "forkserver" begin with an unconfigured Django
+    if not apps.ready:
+        django.setup()
+    _progress_queue = progress_queue
+
+
+def _send_batch(on_batch, send, batch_result, total):
+    """An ``on_batch`` callback sending every batch to ``send`` once it is committed.
+
+    ``send`` receives the batch, the seconds its commit took and the peak RSS of the
+    process; in the workers, it is ``None`` and the batch goes to the queue.
+    """
+    if on_batch is not None:
+        on_batch(batch_result, total)
+    batch_done = time.monotonic()
+
+    def committed():
+        progress = (batch_result, time.monotonic() - batch_done, peak_rss_mb())
+        (send or _progress_queue.put)(progress)
+
+    transaction.on_commit(committed)
+
+
+class ProgressTracker:
+    """Adds up the batches committed by all the workers and passes them to ``on_progress``.
+
+    ``on_progress`` is called with the batch, the running total of the import, the
+    seconds the batch took to commit and the highest peak RSS reported by a process.
+    """
+
+    def __init__(self, on_progress):
+        self.on_progress = on_progress
+        self.total = IngestResult()
+        self.peak_rss_mb = 0
+
+    def __call__(self, progress):
+        batch_result, commit_seconds, peak = progress
+        self.total += batch_result
+        self.peak_rss_mb = max(self.peak_rss_mb, peak)
+        self.on_progress(batch_result, self.total, commit_seconds, self.peak_rss_mb)
+
+    def drain(self, progress_queue, timeout=None):
+        """Reports the batches in the queue, waiting up to ``timeout`` for the first."""
+        try:
+            self(progress_queue.get(timeout=timeout))
+            while True:
+                self(progress_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+
+def import_file(
+    path, workers=None, batch_size=None, on_batch=None, default_agency_id=None, on_progress=None
+):
+    """Imports a CSV file using up to ``workers`` processes.
+
+    ``on_batch`` is called in the worker processes, so it must be picklable (e.g. a
+    module-level function or a ``functools.partial`` of one). ``on_progress`` is called
+    in the calling process once each batch is committed (see :class:`ProgressTracker`).
+    """
+    workers = workers or os.cpu_count() or 1
+    if connection.vendor == "sqlite":
+        # SQLite allows a single writer at a time: extra processes would only wait
+        workers = 1
+    header, ranges = split_ranges(path, workers)
+    tracker = ProgressTracker(on_progress) if on_progress else None
+    if workers == 1 or len(ranges) <= 1:
+        if tracker:
+            on_batch = partial(_send_batch, on_batch, tracker)
+        result = IngestResult()
+        for start, end in ranges:
+            result += ingest_range(
+                path, header, start, end, batch_size, on_batch, default_agency_id
+            )
+        return result
+
+    progress_queue = multiprocessing.Queue() if tracker else None
+    if tracker:
+        on_batch = partial(_send_batch, on_batch, None)
+    # connections must not be shared with forked workers: each one opens its own
+    connections.close_all()
+    result = IngestResult()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(progress_queue,)
+    ) as executor:
+        futures = [
+            executor.submit(
+                ingest_range, path, header, start, end, batch_size, on_batch, default_agency_id
+            )
+            for start, end in ranges
+        ]
+        while tracker and not all(future.done() for future in futures):
+            tracker.drain(progress_queue, timeout=PROGRESS_INTERVAL)
+        for future in futures:
+            result += future.result()
+    if tracker:
+        # the workers have exited: their last batches are in the queue
+        tracker.drain(progress_queue, timeout=0)
+        progress_queue.close()
+    return result
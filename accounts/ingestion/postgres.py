@@ -0,0 +1,172 @@
+"""PostgreSQL fast path for CSV ingestion.
+
+Every batch is streamed into a temporary staging table with ``COPY FROM STDIN`` and
+merged into the client, consumer, debt and debt-consumer tables with a few set-based
+``INSERT ... SELECT ... ON CONFLICT`` statements, so the database does the joins and
+the duplicate detection instead of Python. The same statement that inserts the
+debts adds them to the portfolio rollups.
+"""
+
+import csv
+import io
+
+from django.db import connection
+from django.utils import timezone
+
+from accounts.ingestion.engine import BatchIngestor, IngestResult
+from accounts.ingestion.validation import validate_batch
+from accounts.models import Client, Consumer, Debt, DebtRollup
+
+STAGING_TABLE = "accounts_debt_staging"
+STAGING_COLUMNS = [
+    "line",
+    "client_ref",
+    "balance",
+    "status",
+    "name",
+    "address",
+    "ssn",
+    "agency_id",
+    "fingerprint",
+]
+
+CREATE_STAGING = f"""
+    CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+        line integer NOT NULL,
+        client_ref varchar(64) NOT NULL,
+        balance numeric(10, 2) NOT NULL,
+        status varchar(32) NOT NULL,
+        name varchar(255) NOT NULL,
+        address text NOT NULL,
+        ssn varchar(11) NOT NULL,
+        agency_id bigint NOT NULL,
+        fingerprint varchar(64) NOT NULL
+    )
+"""
+
+COPY_STAGING = f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+MERGE_CLIENTS = """
+    INSERT INTO {client} (name, agency_id, reference_no)
+    SELECT DISTINCT ON (s.client_ref) 'Client ' || s.client_ref, s.agency_id, s.client_ref
+    FROM {staging} s
+    ORDER BY s.client_ref, s.line
+    ON CONFLICT (reference_no) DO NOTHING
+"""
+
+MERGE_CONSUMERS = """
+    INSERT INTO {consumer} (name, address, ssn, is_entity)
+    SELECT DISTINCT ON (s.ssn) s.name, s.address, s.ssn, false
+    FROM {staging} s
+    WHERE NOT EXISTS (SELECT 1 FROM {consumer} c WHERE c.ssn = s.ssn)
+    ORDER BY s.ssn, s.line
+    ON CONFLICT DO NOTHING
+"""
+
+MERGE_DEBTS = """
+    WITH new_debts AS (
+        INSERT INTO {debt} (balance, status, client_reference_no, created_at, client_id,
+                            agency_id, fingerprint)
+        SELECT u.balance, u.status, u.client_ref, %s, u.client_id, u.agency_id, u.fingerprint
+        FROM (
+            SELECT DISTINCT ON (s.fingerprint) s.line, s.balance, s.status, s.client_ref,
+                   c.id AS client_id, c.agency_id, s.fingerprint
+            FROM {staging} s
+            JOIN {client} c ON c.reference_no = s.client_ref
+            ORDER BY s.fingerprint, s.line
+        ) u
+        ORDER BY u.line
+        ON CONFLICT (fingerprint) DO NOTHING
+        RETURNING id, fingerprint, agency_id, client_id, status, balance
+    ), new_links AS (
+        INSERT INTO {through} (debt_id, consumer_id)
+        SELECT DISTINCT ON (d.id) d.id, co.id
+        FROM new_debts d
+        JOIN {staging} s ON s.fingerprint = d.fingerprint
+        JOIN {consumer} co ON co.ssn = s.ssn
+        ORDER BY d.id, co.id
+    ), rollups AS (
+        INSERT INTO {rollup} (agency_id, client_id, status, debts, balance)
+        SELECT agency_id, client_id, status, count(*), sum(balance)
+        FROM new_debts
+        GROUP BY agency_id, client_id, status
+        ON CONFLICT (client_id, status) DO UPDATE SET
+            debts = {rollup}.debts + excluded.debts,
+            balance = {rollup}.balance + excluded.balance
+    )
+    SELECT count(*), coalesce(array_agg(DISTINCT agency_id), '{{}}') FROM new_debts
+"""
+
+
+def _tables():
+    return {
+        "staging": STAGING_TABLE,
+        "client": Client._meta.db_table,
+        "consumer": Consumer._meta.db_table,
+        "debt": Debt._meta.db_table,
+        "through": Debt.consumers.through._meta.db_table,
+        "rollup": DebtRollup._meta.db_table,
+    }
+
+
+def copy_from(cursor, sql, data):
+    """Runs ``COPY ... FROM STDIN`` with psycopg2 or psycopg 3."""
+    raw_cursor = cursor.cursor
+    if hasattr(raw_cursor, "copy_expert"):
+        raw_cursor.copy_expert(sql, data)
+    else:
+        with raw_cursor.copy(sql) as copy:
+            while chunk := data.read(64 * 1024):
+                copy.write(chunk)
+
+
+class CopyIngestor(BatchIngestor):
+    """Ingests batches through a ``COPY`` staging table (PostgreSQL only)."""
+
+    def ingest_batch(self, rows):
+        result = IngestResult()
+        clean, rejected = validate_batch(rows)
+        result.failed += len(rejected)
+        agencies = self._resolve_agencies(clean)
+
+        buffer = io.StringIO()
+        # quote everything: COPY reads unquoted empty values as NULL
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        staged = 0
+        for line, row in enumerate(clean):
+            if row.agency_id and row.agency_id not in agencies:
+                result.failed += 1
+                continue
+            writer.writerow(
+                [
+                    line,
+                    row.client_ref,
+                    row.balance,
+                    row.status,
+                    row.name,
+                    row.address,
+                    row.ssn,
+                    self._agency_for(row, agencies).pk,
+                    row.fingerprint,
+                ]
+            )
+            staged += 1
+
+        if not staged:
+            return result
+
+        buffer.seek(0)
+        tables = _tables()
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING)
+            cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+            copy_from(cursor, COPY_STAGING, buffer)
+            cursor.execute(MERGE_CLIENTS.format(**tables))
+            cursor.execute(MERGE_CONSUMERS.format(**tables))
+            cursor.execute(MERGE_DEBTS.format(**tables), [timezone.now()])
+            created, agency_ids = cursor.fetchone()
+
+        result.created += created
+        result.agency_ids.update(agency_ids)
+        result.duplicated += staged - created
+        return result
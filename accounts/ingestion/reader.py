@@ -0,0 +1,129 @@
+"""Streaming CSV parsing for uploaded files.
+
+Uploads are decoded chunk by chunk through an incremental UTF-8 decoder and handed to
+``csv.DictReader`` line by line, so the memory needed to parse a file does not depend
+on its size.
+"""
+
+import codecs
+import mmap
+from collections import deque
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class CSVEncodingError(ValueError):
+    """Raised when the uploaded file is not valid UTF-8."""
+
+    def __init__(self, line, reason):
+        self.line = line
+        super().__init__(f"Invalid UTF-8 data on line {line} of the CSV file: {reason}")
+
+
+class CSVLineReader:
+    """Iterates over the decoded lines of a stream of byte chunks.
+
+    A leading BOM is dropped. Lines keep their terminator, as expected by the ``csv``
+    module, so quoted fields spanning several lines are parsed correctly.
+
+    ``offset`` is the byte offset right after the last line handed out; since
+    ``csv.DictReader`` never reads ahead, after reading a row it is the position to
+    resume from. Passing ``offset`` resumes a stream there: the header line is read
+    from the start of the stream and everything before ``offset`` is skipped.
+    """
+
+    def __init__(self, chunks, encoding="utf-8-sig", offset=0):
+        if offset:
+            chunks = skip_to_offset(chunks, offset)
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._lines = deque()
+        self._pending = ""
+        self._exhausted = False
+        self._started = False
+        self._resume_offset = offset
+        self.line_num = 0
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._lines:
+            if self._exhausted:
+                raise StopIteration
+            self._fill()
+        self.line_num += 1
+        line = self._lines.popleft()
+        self.offset += len(line.encode("utf-8"))
+        if self.line_num == 1:
+            self.offset = max(self.offset, self._resume_offset)
+        return line
+
+    def _fill(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._exhausted = True
+            text = self._pending + self._decode(b"", final=True)
+            self._pending = ""
+            if text:
+                self._lines.append(text)
+            return
+
+        if not self._started and chunk:
+            self._started = True
+            if chunk.startswith(codecs.BOM_UTF8):
+                self.offset += len(codecs.BOM_UTF8)
+        parts = (self._pending + self._decode(chunk)).split("\n")
+        self._pending = parts.pop()
+        self._lines.extend(f"{part}\n" for part in parts)
+
+    def _decode(self, chunk, final=False):
+        buffered = self._decoder.getstate()[0]
+        try:
+            return self._decoder.decode(chunk, final)
+        except UnicodeDecodeError as exc:
+            data = buffered + chunk
+            line = self.line_num + len(self._lines) + data[: exc.start].count(b"\n") + 1
+            raise CSVEncodingError(line, exc.reason) from exc
+
+
+def skip_to_offset(chunks, offset):
+    """Yields the first line of a byte stream followed by the bytes from ``offset`` on."""
+    position = 0
+    in_header = True
+    for chunk in chunks:
+        if in_header:
+            newline = chunk.find(b"\n")
+            if newline == -1:
+                position += len(chunk)
+                yield chunk
+                continue
+            in_header = False
+            yield chunk[: newline + 1]
+            position += newline + 1
+            chunk = chunk[newline + 1 :]
+
+        end = position + len(chunk)
+        if end > offset:
+            yield chunk[max(offset - position, 0) :]
+        position = end
+
+
+def mmap_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields the bytes of a local file in chunks read through a memory map.
+
+    The kernel pages the file in on demand, so large files are read without copying
+    them through Python file buffers.
+    """
+    with open(path, "rb") as csv_file:
+        try:
+            mapped = mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty files cannot be mapped
+            return
+        with mapped:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            for start in range(0, len(mapped), chunk_size):
+                yield mapped[start : start + chunk_size]
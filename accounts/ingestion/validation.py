@@ -0,0 +1,141 @@
+"""Validation and normalization of CSV rows before they reach the database.
+
+Whole batches are checked up front: balances are parsed as ``Decimal`` and must
+satisfy ``Debt.clean()``, SSNs are matched against a compiled pattern, statuses are
+normalized and names trimmed. Rejected rows are split out, so invalid data never
+costs a database round trip and the insert stage only sees clean, typed rows.
+"""
+
+import re
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple, Optional
+
+from accounts.ingestion.fingerprint import CENTS, STATUS_SEPARATORS, debt_fingerprint
+from accounts.models import Client, Consumer, Debt
+
+REQUIRED_COLUMNS = [
+    "client reference no",
+    "balance",
+    "status",
+    "consumer name",
+    "consumer address",
+    "ssn",
+]
+
+SSN_PATTERN = re.compile(r"(\d{3})-?(\d{2})-?(\d{4})")
+WHITESPACE = re.compile(r"\s+")
+
+_balance_field = Debt._meta.get_field("balance")
+MAX_BALANCE = Decimal(10 ** (_balance_field.max_digits - _balance_field.decimal_places)) - CENTS
+MAX_REFERENCE_NO = Client._meta.get_field("reference_no").max_length
+MAX_STATUS = Debt._meta.get_field("status").max_length
+MAX_NAME = Consumer._meta.get_field("name").max_length
+
+
+class CleanRow(NamedTuple):
+    """A validated CSV row with normalized, typed values."""
+
+    client_ref: str
+    balance: Decimal
+    status: str
+    name: str
+    address: str
+    ssn: str
+    agency_id: Optional[int]
+    fingerprint: str
+
+
+class RejectedRow(NamedTuple):
+    row: dict
+    reason: str
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def check_columns(row):
+    """Raises ``ValueError`` if the CSV file lacks one of the required columns."""
+    missing = [column for column in REQUIRED_COLUMNS if column not in row]
+    if missing:
+        raise ValueError(f"CSV file is missing required columns: {', '.join(missing)}")
+
+
+def parse_balance(value):
+    try:
+        balance = Decimal(value.strip())
+    except InvalidOperation:
+        raise InvalidRow(f"invalid balance {value!r}")
+    if not balance.is_finite() or balance <= 0:
+        raise InvalidRow("balance must be greater than zero")
+    if balance != balance.quantize(CENTS):
+        raise InvalidRow("balance has more than 2 decimal places")
+    if balance > MAX_BALANCE:
+        raise InvalidRow("balance is too large")
+    return balance.quantize(CENTS)
+
+
+def normalize_ssn(value):
+    match = SSN_PATTERN.fullmatch(value.strip())
+    if match is None:
+        raise InvalidRow(f"invalid SSN {value!r}")
+    return "-".join(match.groups())
+
+
+def canonical_status(value):
+    """Returns ``value`` cased and separated like the statuses the ingestion stores.
+
+    The status filters of the views go through it too: ``in collection`` finds
+    ``IN_COLLECTION``.
+    """
+    return STATUS_SEPARATORS.sub("_", value.strip()).upper()
+
+
+def normalize_status(value):
+    status = canonical_status(value)
+    if not status or len(status) > MAX_STATUS:
+        raise InvalidRow(f"invalid status {value!r}")
+    return status
+
+
+def clean_row(row):
+    """Validates a single CSV row and returns a :class:`CleanRow`."""
+    client_ref = (row["client reference no"] or "").strip()
+    if not client_ref or len(client_ref) > MAX_REFERENCE_NO:
+        raise InvalidRow("invalid client reference no")
+
+    name = WHITESPACE.sub(" ", (row["consumer name"] or "").strip())
+    if not name or len(name) > MAX_NAME:
+        raise InvalidRow("invalid consumer name")
+
+    agency_id = (row.get("agency_id") or "").strip()
+    if agency_id and not agency_id.isdigit():
+        raise InvalidRow(f"invalid agency_id {agency_id!r}")
+
+    balance = parse_balance(row["balance"] or "")
+    status = normalize_status(row["status"] or "")
+    ssn = normalize_ssn(row["ssn"] or "")
+    return CleanRow(
+        client_ref=client_ref,
+        balance=balance,
+        status=status,
+        name=name,
+        address=(row["consumer address"] or "").strip(),
+        ssn=ssn,
+        agency_id=int(agency_id) if agency_id else None,
+        fingerprint=debt_fingerprint(client_ref, ssn, balance, status),
+    )
+
+
+def validate_batch(rows):
+    """Splits a batch of CSV rows into clean rows and rejected rows."""
+    clean = []
+    rejected = []
+    if rows:
+        check_columns(rows[0])
+    for row in rows:
+        try:
+            clean.append(clean_row(row))
+        except InvalidRow as exc:
+            rejected.append(RejectedRow(row, str(exc)))
+    return clean, rejected
@@ -0,0 +1,82 @@
+"""Runs the benchmark suite on a scratch copy of the configured database."""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from accounts.benchmarks.suite import SCENARIOS, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the ingestion path on generated CSV files and prints JSON results. "
+        "Runs on a scratch test database, so no data is touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[1000, 10000],
+            help="Sizes of the generated files (1k to 10M rows).",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(SCENARIOS),
+            help="Scenario to run, may be repeated (default: ingest and reingest).",
+        )
+        parser.add_argument("--backend", choices=["auto", "orm", "copy"], default="auto")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--repeat-clients", type=float, default=0.9)
+        parser.add_argument("--repeat-consumers", type=float, default=0.5)
+        parser.add_argument("--bad-rows", type=float, default=0.01)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON results to this file.")
+        parser.add_argument("--compare", help="JSON results of a previous run to compare with.")
+
+    def handle(self, *args, **options):
+        if options["backend"] == "copy" and connection.vendor != "postgresql":
+            raise CommandError("The copy backend requires PostgreSQL.")
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = run_suite(
+                options["rows"],
+                options["scenario"] or ["ingest", "reingest"],
+                backend=options["backend"],
+                batch_size=options["batch_size"],
+                repeat_clients=options["repeat_clients"],
+                repeat_consumers=options["repeat_consumers"],
+                bad_rows=options["bad_rows"],
+                seed=options["seed"],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for result in report["results"]:
+            self.stderr.write(
+                f"{result['scenario']:>10} {result['rows']:>9} rows  "
+                + "  ".join(
+                    f"{key}={value}"
+                    for key, value in result.items()
+                    if key not in ("scenario", "rows")
+                )
+            )
+
+        if options["compare"]:
+            with open(options["compare"]) as baseline_file:
+                for change in compare(report, json.load(baseline_file)):
+                    self.stderr.write(
+                        f"{change['scenario']:>10} {change['rows']:>9} rows  "
+                        f"{change['change']:+.1%} rows/s vs baseline"
+                    )
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,107 @@
+"""Server-side bulk load of a debts CSV file, bypassing the upload endpoint."""
+
+import csv
+import os
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.benchmarks.measure import peak_rss_mb
+from accounts.ingestion import CSVLineReader, ingest_rows, mmap_chunks
+from accounts.ingestion.parallel import import_file
+from accounts.models import CollectionAgency
+
+
+class Command(BaseCommand):
+    help = "Imports a CSV file in the upload format from the local filesystem."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Rows committed per transaction (defaults to CSV_INGEST_BATCH_SIZE).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes importing the file in parallel.",
+        )
+        parser.add_argument(
+            "--agency-id",
+            type=int,
+            default=None,
+            help="Agency of the rows without an agency_id column value.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"File {path} does not exist.")
+
+        agency_id = options["agency_id"]
+        if agency_id is not None and not CollectionAgency.objects.filter(pk=agency_id).exists():
+            raise CommandError(f"Agency with ID {agency_id} not found.")
+
+        started = time.monotonic()
+        try:
+            if options["workers"] > 1:
+                result = import_file(
+                    path,
+                    workers=options["workers"],
+                    batch_size=options["batch_size"],
+                    default_agency_id=agency_id,
+                    on_progress=self.progress_reporter(started),
+                )
+            else:
+                reader = csv.DictReader(CSVLineReader(mmap_chunks(path)))
+                result = ingest_rows(
+                    reader,
+                    batch_size=options["batch_size"],
+                    on_batch=self.batch_reporter(started),
+                    default_agency_id=agency_id,
+                )
+        except ValueError as exc:  # invalid encoding or missing columns
+            raise CommandError(f"Import failed: {exc!r}") from exc
+
+        elapsed = time.monotonic() - started
+        peak = max(peak_rss_mb(), peak_rss_mb(resource.RUSAGE_CHILDREN))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {path}: {result.created} created, {result.duplicated} duplicated, "
+                f"{result.failed} failed in {elapsed:.1f}s "
+                f"({result.processed / elapsed if elapsed else 0:.0f} rows/s, "
+                f"peak RSS {peak:.0f} MB)."
+            )
+        )
+
+    def progress_reporter(self, started):
+        """Returns an ``on_progress`` callback printing the progress of a parallel import."""
+
+        def on_progress(batch_result, total, commit_seconds, peak):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{total.processed} rows | {total.processed / elapsed:.0f} rows/s"
+                f" | commit {commit_seconds * 1000:.1f} ms | peak RSS {peak:.0f} MB"
+            )
+
+        return on_progress
+
+    def batch_reporter(self, started):
+        """Returns an ``on_batch`` callback printing progress once each batch commits."""
+        on_progress = self.progress_reporter(started)
+
+        def on_batch(batch_result, total):
+            batch_done = time.monotonic()
+
+            def report():
+                commit_seconds = time.monotonic() - batch_done
+                on_progress(batch_result, total, commit_seconds, peak_rss_mb())
+
+            transaction.on_commit(report)
+
+        return on_batch
@@ -0,0 +1,51 @@
+"""Compares running deployments of the app under slow uploads and list requests."""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from accounts.benchmarks.load import run_load
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads running servers with slow CSV uploads and account list requests, and "
+        "prints the list latencies as JSON. Start the WSGI and the ASGI deployments "
+        "(e.g. SERVER_INTERFACE=wsgi|asgi gunicorn) and pass both URLs to compare them."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", action="append", required=True, help="Base URL of a server, may be repeated."
+        )
+        parser.add_argument("--slow-clients", type=int, default=50)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=10.0)
+        parser.add_argument(
+            "--upload-seconds", type=float, default=5.0, help="Time each upload takes to send."
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file.")
+
+    def handle(self, *args, **options):
+        results = []
+        for url in options["url"]:
+            result = run_load(
+                url,
+                slow_clients=options["slow_clients"],
+                readers=options["readers"],
+                seconds=options["seconds"],
+                upload_seconds=options["upload_seconds"],
+            )
+            self.stderr.write(
+                "  ".join(f"{key}={value}" for key, value in result.items() if key != "url")
+                + f"  {url}"
+            )
+            results.append(result)
+
+        output = json.dumps({"results": results}, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
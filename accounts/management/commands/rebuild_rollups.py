@@ -0,0 +1,23 @@
+"""Recomputes the portfolio rollups from the debt table."""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from accounts.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the debt rollups behind /accounts/summary from every stored debt."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database to rebuild the rollups of.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        with transaction.atomic(using=using):
+            groups = rebuild_rollups(using=using)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {groups} rollups."))
@@ -0,0 +1,79 @@
+"""Worker processing the CSV files queued through ``POST /accounts/csv?async=1``."""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts.ingestion.jobs import claim_next_job, purge_failed_jobs, requeue_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Processes queued CSV ingestion jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait before polling again when the queue is empty.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes used to import each file.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Queue failed jobs again; they resume from their last checkpoint.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=None,
+            help="Minutes without a committed batch after which a running job is "
+            "considered interrupted and queued again.",
+        )
+        parser.add_argument(
+            "--purge-failed-after",
+            type=float,
+            default=None,
+            help="Days after which the files of failed jobs are deleted; they can no "
+            "longer be retried.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the jobs currently queued and exit.",
+        )
+
+    def handle(self, *args, **options):
+        stale_after = options["stale_after"]
+        if options["purge_failed_after"] is not None:
+            cutoff = timezone.now() - timedelta(days=options["purge_failed_after"])
+            purged = purge_failed_jobs(finished_before=cutoff)
+            self.stdout.write(f"Purged the files of {purged} failed ingest jobs.")
+        requeued = requeue_jobs(
+            retry_failed=options["retry_failed"],
+            stale_after=timedelta(minutes=stale_after) if stale_after is not None else None,
+        )
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} interrupted ingest jobs.")
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Processing ingest job {job.pk}...")
+            job = run_job(job, workers=options["workers"])
+            self.stdout.write(
+                f"Ingest job {job.pk} {job.status}: {job.rows_processed} rows "
+                f"({job.rows_per_second} rows/s)."
+            )
@@ -0,0 +1,182 @@
+"""Per-request instrumentation and Prometheus metrics.
+
+While :class:`accounts.middleware.RequestMetricsMiddleware` handles a request, a
+:class:`RequestMetrics` is bound to the current context and installed as an
+``execute_wrapper`` on every database connection, so it sees the number and the
+duration of the queries. Code can time its own phases with :func:`timing` (the list
+times its COUNT and its serialization) and report ingested rows with
+:func:`record_rows`; both are no-ops outside an instrumented request.
+
+The middleware then adds a ``Server-Timing`` header to the response and feeds the
+histograms of :data:`REGISTRY`, rendered in the Prometheus text format by
+``GET /metrics``. The registry lives in the memory of each worker process, so every
+worker must be scraped separately.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+@dataclass
+class RequestMetrics:
+    """Measurements of a single request."""
+
+    queries: int = 0
+    db_seconds: float = 0.0
+    rows_ingested: int = 0
+    # seconds spent in the phases timed with timing(), by name
+    phases: dict = field(default_factory=dict)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total_seconds):
+        """Returns the value of the ``Server-Timing`` header of the request."""
+        entries = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"']
+        entries += [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        if self.rows_ingested:
+            entries.append(f'ingest;desc="{self.rows_ingested} rows"')
+        entries.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def collect(metrics):
+    """Binds ``metrics`` to the current context while the block runs."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timing(name):
+    """Adds the time spent in the block to the phase ``name`` of the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[name] = metrics.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def record_rows(count):
+    """Counts ``count`` rows ingested by the current request."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.rows_ingested += count
+
+
+def _format_labels(names, values):
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{{{_format_labels(self.labels, labels)}}} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket (the last one is +Inf), sum]
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels) or ([0] * (len(self.buckets) + 1), 0)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[labels] = (counts, total + value)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = _format_labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            yield f"{self.name}_sum{{{label_text}}} {total}"
+            yield f"{self.name}_count{{{label_text}}} {cumulative}"
+
+
+class Registry:
+    """The metrics of the process, updated by every instrumented request."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.requests = Counter(
+            "http_requests_total", "Requests handled.", ("view", "method", "status")
+        )
+        self.duration = Histogram(
+            "http_request_duration_seconds",
+            "Time spent handling requests.",
+            ("view", "method"),
+            LATENCY_BUCKETS,
+        )
+        self.phases = Histogram(
+            "http_request_phase_seconds",
+            "Time spent in the database and in the timed phases of requests.",
+            ("view", "phase"),
+            LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            "http_request_queries", "SQL queries run per request.", ("view",), QUERY_BUCKETS
+        )
+        self.rows = Counter("ingested_rows_total", "CSV rows ingested by requests.", ("view",))
+
+    def observe(self, view, method, status, metrics, total_seconds):
+        with self.lock:
+            self.requests.inc((view, method, str(status)))
+            self.duration.observe((view, method), total_seconds)
+            self.queries.observe((view,), metrics.queries)
+            self.phases.observe((view, "db"), metrics.db_seconds)
+            for name, seconds in metrics.phases.items():
+                self.phases.observe((view, name), seconds)
+            if metrics.rows_ingested:
+                self.rows.inc((view,), metrics.rows_ingested)
+
+    def render(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self.lock:
+            metrics = [self.requests, self.duration, self.phases, self.queries, self.rows]
+            return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
@@ -0,0 +1,42 @@
+"""Middleware of the accounts app"""
+
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from accounts.metrics import REGISTRY, RequestMetrics, collect
+
+
+class RequestMetricsMiddleware:
+    """Measures every request and exports the measurements (see :mod:`accounts.metrics`).
+
+    Unless ``REQUEST_METRICS_ENABLED`` is set, Django drops the middleware at startup,
+    so disabled instrumentation costs nothing. The body of streaming responses, like
+    the export, is produced after the middleware returns and is not measured.
+
+    It is synchronous, to wrap the connections of the thread that runs the queries:
+    under ASGI, enabling it runs every request in a thread.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        started = time.perf_counter()
+        with collect(metrics), ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unmatched"
+        REGISTRY.observe(view, request.method, response.status_code, metrics, elapsed)
+        response["Server-Timing"] = metrics.server_timing(elapsed)
+        return response
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 08:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_consumers(apps, schema_editor):
+    """Keeps the oldest consumer of every SSN and moves the debts of the others to it."""
+    Consumer = apps.get_model("accounts", "Consumer")
+    Through = apps.get_model("accounts", "Debt").consumers.through
+    duplicated = (
+        Consumer.objects.exclude(ssn="")
+        .values("ssn")
+        .annotate(keep=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for group in duplicated:
+        others = Consumer.objects.filter(ssn=group["ssn"]).exclude(id=group["keep"])
+        linked = set(
+            Through.objects.filter(consumer_id=group["keep"]).values_list("debt_id", flat=True)
+        )
+        for link in Through.objects.filter(consumer__in=others):
+            if link.debt_id not in linked:
+                Through.objects.create(debt_id=link.debt_id, consumer_id=group["keep"])
+                linked.add(link.debt_id)
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_ingestjob"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_consumers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="consumer",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("ssn", ""), _negated=True),
+                fields=("ssn",),
+                name="accounts_consumer_unique_ssn",
+            ),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 08:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from accounts.ingestion.fingerprint import debt_fingerprint
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """Fingerprints the debts that were ingested before duplicate detection existed.
+
+    Only debts linked to a single consumer (as created by the CSV upload) can be
+    fingerprinted. When the same row was ingested several times, the oldest debt gets
+    the fingerprint and the copies are left without one.
+    """
+    Debt = apps.get_model("accounts", "Debt")
+    debts = (
+        Debt.objects.annotate(total_consumers=Count("consumers"), ssn=Min("consumers__ssn"))
+        .filter(total_consumers=1)
+        .order_by("id")
+        .values_list("id", "client_reference_no", "ssn", "balance", "status")
+    )
+    seen = set()
+    pending = []
+    for debt_id, reference_no, ssn, balance, status in debts.iterator(chunk_size=2000):
+        fingerprint = debt_fingerprint(reference_no, ssn, balance, status)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        pending.append(Debt(id=debt_id, fingerprint=fingerprint))
+        if len(pending) >= 1000:
+            Debt.objects.bulk_update(pending, ["fingerprint"])
+            pending = []
+    Debt.objects.bulk_update(pending, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_consumer_unique_ssn"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="debt",
+            name="fingerprint",
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_ingestjob_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="debt",
+            index=models.Index(fields=["created_at", "id"], name="accounts_de_created_379acb_idx"),
+        ),
+        migrations.RemoveIndex(
+            model_name="debt",
+            name="accounts_de_created_4df51d_idx",
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+COUNTED_TABLES = ["accounts_debt"]
+
+
+def create_count_triggers(apps, schema_editor):
+    """Keeps the row counters in sync with triggers (SQLite only).
+
+    PostgreSQL estimates totals from planner statistics and needs no counter.
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    RowCount = apps.get_model("accounts", "RowCount")
+    for table in COUNTED_TABLES:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            (rows,) = cursor.fetchone()
+        RowCount.objects.update_or_create(table=table, defaults={"rows": rows})
+        schema_editor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE accounts_rowcount SET rows = rows + 1 WHERE "table" = '{table}';
+            END
+            """
+        )
+        schema_editor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE accounts_rowcount SET rows = rows - 1 WHERE "table" = '{table}';
+            END
+            """
+        )
+
+
+def drop_count_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in COUNTED_TABLES:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_count_insert")
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_count_delete")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0007_debt_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RowCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("table", models.CharField(max_length=64, unique=True)),
+                ("rows", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_count_triggers, drop_count_triggers),
+    ]
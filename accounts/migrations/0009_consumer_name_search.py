@@ -0,0 +1,80 @@
+# Generated by Django 5.2 on 2026-10-18 08:18
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+TRGM_INDEX = "accounts_consumer_name_trgm"
+FTS_TABLE = "accounts_consumer_name_fts"
+
+FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON accounts_consumer
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON accounts_consumer
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name ON accounts_consumer
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END
+    """,
+]
+
+
+def create_name_search_index(apps, schema_editor):
+    """Creates the pg_trgm index (PostgreSQL) or FTS5 table (SQLite) of consumer names.
+
+    Either is skipped when the database lacks the extension.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                return
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON accounts_consumer "
+                "USING gin (UPPER(name::text) gin_trgm_ops)"
+            )
+        elif connection.vendor == "sqlite":
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, "
+                    "content='accounts_consumer', content_rowid='id', tokenize='trigram')"
+                )
+            except OperationalError:  # built without FTS5, or older than 3.34
+                return
+            for sql in FTS_TRIGGERS:
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_name_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"DROP INDEX IF EXISTS {TRGM_INDEX}")
+        elif connection.vendor == "sqlite":
+            for event in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{event}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0008_rowcount"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_search_index, drop_name_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-18 08:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_agencies(apps, schema_editor):
+    """Copies the agency of every debt's client onto the debt, in a single UPDATE."""
+    Client = apps.get_model("accounts", "Client")
+    Debt = apps.get_model("accounts", "Debt")
+    Debt.objects.update(
+        agency_id=Subquery(Client.objects.filter(pk=OuterRef("client_id")).values("agency_id"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0009_consumer_name_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="debt",
+            name="agency",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="debts",
+                to="accounts.collectionagency",
+            ),
+        ),
+        migrations.RunPython(backfill_agencies, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="debt",
+            name="agency",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="debts",
+                to="accounts.collectionagency",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="debt",
+            index=models.Index(
+                fields=["agency", "status", "balance"],
+                name="accounts_de_agency__ae6386_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="debt",
+            index=models.Index(
+                fields=["agency", "created_at", "id"],
+                name="accounts_de_agency__0cfe87_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2 on 2026-10-18 08:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_rollups(apps, schema_editor):
+    """Fills the rollups from the debts already imported."""
+    DebtRollup = apps.get_model("accounts", "DebtRollup")
+    Debt = apps.get_model("accounts", "Debt")
+    schema_editor.execute(
+        f"""
+        INSERT INTO {DebtRollup._meta.db_table} (agency_id, client_id, status, debts, balance)
+        SELECT agency_id, client_id, status, count(*), sum(balance)
+        FROM {Debt._meta.db_table}
+        GROUP BY agency_id, client_id, status
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0010_debt_agency"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DebtRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.CharField(max_length=32)),
+                ("debts", models.BigIntegerField(default=0)),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=18),
+                ),
+                (
+                    "agency",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="accounts.collectionagency",
+                    ),
+                ),
+                (
+                    "client",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="accounts.client",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["agency", "status"],
+                        name="accounts_de_agency__dcda4c_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("client", "status"),
+                        name="accounts_debtrollup_unique_client_status",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 09:20
+
+from django.db import migrations
+
+TABLE = "accounts_debt"
+
+
+def recreate_count_triggers(apps, schema_editor):
+    """Recreates the row count triggers of 0008 (SQLite only).
+
+    SQLite drops triggers along with their table, and 0010 rebuilt the debt table.
+    The counter is reset: it is recounted on its next use. Later rebuilds are
+    handled by the post_migrate hook of the app.
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_count_insert AFTER INSERT ON {TABLE}
+        BEGIN
+            UPDATE accounts_rowcount SET rows = rows + 1 WHERE "table" = '{TABLE}';
+        END
+        """
+    )
+    schema_editor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_count_delete AFTER DELETE ON {TABLE}
+        BEGIN
+            UPDATE accounts_rowcount SET rows = rows - 1 WHERE "table" = '{TABLE}';
+        END
+        """
+    )
+    RowCount = apps.get_model("accounts", "RowCount")
+    RowCount.objects.using(schema_editor.connection.alias).filter(table=TABLE).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0011_debtrollup"),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_count_triggers, migrations.RunPython.noop),
+    ]
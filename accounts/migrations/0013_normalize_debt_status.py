@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 10:05
+
+import re
+
+from django.db import migrations
+
+STATUS_SEPARATORS = re.compile(r"[\s-]+")
+
+
+def normalize_statuses(apps, schema_editor):
+    """Stores the statuses imported before they were normalized like the new imports.
+
+    ``in collection`` becomes ``IN_COLLECTION``, which the status filters look for.
+    The rollups are grouped by status, so they are rebuilt if any status changed.
+    """
+    alias = schema_editor.connection.alias
+    Debt = apps.get_model("accounts", "Debt")
+    DebtRollup = apps.get_model("accounts", "DebtRollup")
+    changed = False
+    for status in Debt.objects.using(alias).values_list("status", flat=True).distinct():
+        normalized = STATUS_SEPARATORS.sub("_", status.strip()).upper()
+        if normalized and normalized != status:
+            Debt.objects.using(alias).filter(status=status).update(status=normalized)
+            changed = True
+    if changed:
+        DebtRollup.objects.using(alias).all().delete()
+        schema_editor.execute(
+            f"""
+            INSERT INTO {DebtRollup._meta.db_table} (agency_id, client_id, status, debts, balance)
+            SELECT agency_id, client_id, status, count(*), sum(balance)
+            FROM {Debt._meta.db_table}
+            GROUP BY agency_id, client_id, status
+            """
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0012_debt_count_triggers"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_statuses, migrations.RunPython.noop),
+    ]
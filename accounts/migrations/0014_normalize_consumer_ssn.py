@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 10:20
+
+import re
+
+from django.db import migrations
+
+SSN_PATTERN = re.compile(r"(\d{3})-?(\d{2})-?(\d{4})")
+
+
+def normalize_ssns(apps, schema_editor):
+    """Stores the SSNs imported before they were normalized as ``ddd-dd-dddd``.
+
+    Ingestion looks consumers up by their normalized SSN, so a consumer stored as
+    ``111111111`` would otherwise get a twin ``111-11-1111`` on the next import. A
+    consumer whose normalized SSN is already taken is merged into the one holding it:
+    its debts are moved over, as in 0004. SSNs that do not look like one are kept.
+    """
+    alias = schema_editor.connection.alias
+    Consumer = apps.get_model("accounts", "Consumer")
+    Through = apps.get_model("accounts", "Debt").consumers.through
+    consumers = Consumer.objects.using(alias)
+    unnormalized = consumers.exclude(ssn="").exclude(ssn__regex=r"^[0-9]{3}-[0-9]{2}-[0-9]{4}$")
+    for consumer in unnormalized.order_by("id"):
+        match = SSN_PATTERN.fullmatch(consumer.ssn.strip())
+        if match is None:
+            continue
+        ssn = "-".join(match.groups())
+        keep = consumers.filter(ssn=ssn).first()
+        if keep is None:
+            consumer.ssn = ssn
+            consumer.save(update_fields=["ssn"])
+            continue
+        links = Through.objects.using(alias)
+        linked = set(links.filter(consumer_id=keep.id).values_list("debt_id", flat=True))
+        for link in links.filter(consumer_id=consumer.id):
+            if link.debt_id not in linked:
+                links.create(debt_id=link.debt_id, consumer_id=keep.id)
+                linked.add(link.debt_id)
+        consumer.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_normalize_debt_status"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_ssns, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
 """Models representing the accounts app"""
 
+from functools import partial
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from accounts.caching import bump_generations
 
 
 class CollectionAgency(models.Model):
@@ -30,6 +35,22 @@ class Client(models.Model):
             models.Index(fields=["agency"]),
         ]
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            previous_agency_id = (
+                Client.objects.filter(pk=self.pk).values_list("agency_id", flat=True).first()
+                if self.pk is not None
+                else None
+            )
+            super().save(*args, **kwargs)
+            if previous_agency_id is not None and previous_agency_id != self.agency_id:
+                # keep the agency denormalized on the debts and rollups in sync
+                self.debts.update(agency_id=self.agency_id)
+                self.rollups.update(agency_id=self.agency_id)
+                transaction.on_commit(
+                    partial(bump_generations, {previous_agency_id, self.agency_id})
+                )
+
     def __str__(self):
         return self.name
 
@@ -46,6 +67,15 @@ class Consumer(models.Model):
         indexes = [
             models.Index(fields=["name"]),  # required to optimize the search by name
         ]
+        constraints = [
+            # consumers are identified by their SSN during ingestion; the unique index
+            # lets concurrent imports insert them with ON CONFLICT DO NOTHING.
+            models.UniqueConstraint(
+                fields=["ssn"],
+                condition=~models.Q(ssn=""),
+                name="accounts_consumer_unique_ssn",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -58,8 +88,15 @@ class Debt(models.Model):
     status = models.CharField(max_length=32)
     client_reference_no = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
+    # hash of the normalized CSV row, used to skip rows that were already ingested
+    fingerprint = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="debts")
+    # copy of client.agency, so debts can be filtered by agency without a join; the
+    # composite indexes below start with it, hence no index of its own
+    agency = models.ForeignKey(
+        CollectionAgency, on_delete=models.CASCADE, related_name="debts", db_index=False
+    )
     consumers = models.ManyToManyField(Consumer, related_name="debts")
 
     class Meta:
@@ -67,7 +104,10 @@ class Debt(models.Model):
             models.Index(fields=["balance"]),
             models.Index(fields=["status"]),
             models.Index(fields=["client_reference_no"]),
-            models.Index(fields=["created_at"]),
+            models.Index(fields=["created_at", "id"]),  # keyset pagination
+            # dashboard filters: agency + status + balance range, and agency pages
+            models.Index(fields=["agency", "status", "balance"]),
+            models.Index(fields=["agency", "created_at", "id"]),
         ]
 
     def clean(self):
@@ -75,5 +115,104 @@ class Debt(models.Model):
         if self.balance <= 0:
             raise ValidationError("balance must be greater than zero.")
 
+    def save(self, *args, **kwargs):
+        if self.client_id is not None:
+            self.agency_id = self.client.agency_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Debt #{self.id} (${self.balance})"
+
+
+class DebtRollup(models.Model):
+    """Number and total balance of the debts of a client with a given status.
+
+    Ingestion adds every batch of new debts to these totals, so portfolio summaries
+    read one row per group instead of every debt. Debts written another way are
+    counted by ``python manage.py rebuild_rollups`` (see :mod:`accounts.rollups`).
+    """
+
+    # indexed by the unique constraint below
+    client = models.ForeignKey(
+        Client, on_delete=models.CASCADE, related_name="rollups", db_index=False
+    )
+    # copy of client.agency, like Debt.agency
+    agency = models.ForeignKey(
+        CollectionAgency, on_delete=models.CASCADE, related_name="rollups", db_index=False
+    )
+    status = models.CharField(max_length=32)
+    debts = models.BigIntegerField(default=0)
+    balance = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["agency", "status"]),
+        ]
+        constraints = [
+            # the conflict target of the incremental upserts
+            models.UniqueConstraint(
+                fields=["client", "status"], name="accounts_debtrollup_unique_client_status"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.client_id}/{self.status}: {self.debts} debts (${self.balance})"
+
+
+class IngestJob(models.Model):
+    """A CSV file queued for asynchronous ingestion by the ingest worker."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    file = models.FileField(upload_to="ingest/")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    rows_created = models.PositiveBigIntegerField(default=0)
+    rows_duplicated = models.PositiveBigIntegerField(default=0)
+    rows_failed = models.PositiveBigIntegerField(default=0)
+    # checkpoint: byte offset of the first row after the last committed batch
+    byte_offset = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),  # worker polling order
+        ]
+
+    @property
+    def rows_per_second(self):
+        """Average throughput since the worker picked up the job."""
+        if self.started_at is None:
+            return 0.0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 2) if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return f"IngestJob #{self.id} ({self.status})"
+
+
+class RowCount(models.Model):
+    """Running row count of a table, used for estimated list totals on SQLite.
+
+    The counters are maintained by SQLite triggers; PostgreSQL estimates totals from
+    planner statistics instead (see :mod:`accounts.counts`).
+    """
+
+    table = models.CharField(max_length=64, unique=True)
+    rows = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.table}: {self.rows}"
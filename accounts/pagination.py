@@ -1,8 +1,153 @@
-""" Pagination class for Accounts app"""
+"""Pagination class for Accounts app"""
 
-from rest_framework.pagination import LimitOffsetPagination
+import base64
+import binascii
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from accounts.counts import estimated_count, exact_count
+from accounts.metrics import timing
 
 
 class CustomLimitOffsetPagination(LimitOffsetPagination):
+    """Limit/offset pagination with a selectable way of computing ``count``.
+
+    ``?count=exact`` (the default) runs a ``COUNT`` cached briefly for identical
+    filters, ``?count=estimated`` returns a cheap estimate and ``?count=none`` skips the
+    total: one extra row is fetched to know whether there is a next page.
+    """
+
     default_limit = 50
     max_limit = 1000
+    count_query_param = "count"
+    count_modes = ("exact", "estimated", "none")
+    default_count_mode = "exact"
+    # the exact count, when the async list view already ran it with the async ORM
+    known_count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(request)
+        if self.count_mode != "none":
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = None
+        page = list(queryset[self.offset : self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+        return page[: self.limit]
+
+    def get_count_mode(self, request):
+        mode = request.query_params.get(self.count_query_param)
+        return mode if mode in self.count_modes else self.default_count_mode
+
+    def get_count(self, queryset):
+        if self.known_count is not None:
+            return self.known_count
+        with timing("count"):
+            if self.count_mode == "estimated":
+                return estimated_count(queryset)
+            return exact_count(queryset)
+
+    def get_next_link(self):
+        if self.count_mode != "none":
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"]["nullable"] = True
+        return response_schema
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on ``(created_at, id)``.
+
+    Each page filters on the key of the last row of the previous page instead of
+    skipping rows with OFFSET, so every page costs one index range scan whatever its
+    depth. Rows inserted during a crawl only ever appear after the rows already seen,
+    and no COUNT query is needed.
+    """
+
+    ordering = ("created_at", "id")
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    default_limit = CustomLimitOffsetPagination.default_limit
+    max_limit = CustomLimitOffsetPagination.max_limit
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            # the range condition alone can use the index; ties are excluded after it
+            queryset = queryset.filter(created_at__gte=created_at).exclude(
+                created_at=created_at, id__lte=pk
+            )
+
+        page = list(queryset[: self.limit + 1])
+        self.has_next = len(page) > self.limit
+        page = page[: self.limit]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    @staticmethod
+    def encode_cursor(obj):
+        position = f"{obj.created_at.isoformat()}|{obj.id}"
+        return base64.urlsafe_b64encode(position.encode("ascii")).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii")
+            created_at, pk = position.split("|")
+            return datetime.fromisoformat(created_at), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @classmethod
+    def requested(cls, request):
+        """Whether a request opted into cursor pagination."""
+        params = request.query_params
+        return params.get("pagination") == "cursor" or cls.cursor_query_param in params
@@ -0,0 +1,98 @@
+"""Portfolio totals kept in the :class:`DebtRollup` table.
+
+Every ingestion batch adds the number and balance of its new debts to the rollup of
+their client and status with an ``INSERT ... ON CONFLICT DO UPDATE``, so concurrent
+imports add up instead of overwriting each other. Summaries by status, agency or
+client then aggregate a few rollup rows rather than the whole debt table.
+
+Only ingestion maintains the rollups; after debts are created, changed or deleted
+another way, recompute them with ``python manage.py rebuild_rollups``.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import Sum
+
+from accounts.models import Debt, DebtRollup
+
+CENTS = Decimal("0.01")
+# summary groups: request name -> rollup column
+GROUP_FIELDS = {"status": "status", "agency": "agency_id", "client": "client_id"}
+
+ADD_TO_ROLLUPS = """
+    INSERT INTO {rollup} (agency_id, client_id, status, debts, balance)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (client_id, status) DO UPDATE SET
+        debts = {rollup}.debts + excluded.debts,
+        balance = {rollup}.balance + excluded.balance
+"""
+
+REBUILD_ROLLUPS = """
+    INSERT INTO {rollup} (agency_id, client_id, status, debts, balance)
+    SELECT agency_id, client_id, status, count(*), sum(balance)
+    FROM {debt}
+    GROUP BY agency_id, client_id, status
+"""
+
+
+def _tables():
+    return {"rollup": DebtRollup._meta.db_table, "debt": Debt._meta.db_table}
+
+
+def add_to_rollups(debts, using="default"):
+    """Adds newly inserted debts to their rollups, with a single statement."""
+    groups = defaultdict(lambda: [0, Decimal(0)])
+    for debt in debts:
+        group = groups[debt.agency_id, debt.client_id, debt.status]
+        group[0] += 1
+        group[1] += Decimal(debt.balance)
+    if not groups:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            ADD_TO_ROLLUPS.format(**_tables()),
+            [(*key, count, balance) for key, (count, balance) in groups.items()],
+        )
+
+
+def rebuild_rollups(using="default"):
+    """Recomputes every rollup from the debt table and returns the number of groups.
+
+    Must be called inside a transaction, or concurrent readers see empty totals.
+    """
+    DebtRollup.objects.using(using).all().delete()
+    with connections[using].cursor() as cursor:
+        cursor.execute(REBUILD_ROLLUPS.format(**_tables()))
+    return DebtRollup.objects.using(using).count()
+
+
+def summarize(group_by=(), agency_id=None, status=None, using="default"):
+    """Returns the portfolio totals and the totals of every group, from the rollups.
+
+    ``group_by`` lists keys of :data:`GROUP_FIELDS`.
+    """
+    rollups = DebtRollup.objects.using(using)
+    if agency_id:
+        rollups = rollups.filter(agency_id=agency_id)
+    if status:
+        rollups = rollups.filter(status=status)
+
+    total = rollups.aggregate(debts=Sum("debts"), balance=Sum("balance"))
+    columns = [GROUP_FIELDS[name] for name in group_by]
+    groups = []
+    if columns:
+        for row in (
+            rollups.values(*columns)
+            .annotate(total_debts=Sum("debts"), total_balance=Sum("balance"))
+            .order_by(*columns)
+        ):
+            group = {name: row[GROUP_FIELDS[name]] for name in group_by}
+            group.update(debts=row["total_debts"], balance=row["total_balance"].quantize(CENTS))
+            groups.append(group)
+    return {
+        "count": total["debts"] or 0,
+        "balance": (total["balance"] or Decimal(0)).quantize(CENTS),
+        "results": groups,
+    }
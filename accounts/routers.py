@@ -0,0 +1,56 @@
+"""Read replica routing.
+
+The list, export and summary views read from one of the ``DATABASE_REPLICAS``
+(see :func:`read_database`) by passing its alias explicitly with ``using()``;
+everything else, and every write, uses the primary (``default``) database.
+
+Replicas lag behind the primary, so a client that just ingested a file would not see
+its debts there. Upload responses therefore *pin* the client to the primary for
+``DATABASE_REPLICA_LAG_SECONDS`` with a cookie, also returned as a header that API
+clients can send back (see :func:`pin_to_primary`).
+"""
+
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "primary_until"
+PIN_HEADER = "X-Primary-Until"
+
+
+def pin_to_primary(response):
+    """Makes the next reads of the client that receives ``response`` use the primary."""
+    lag = settings.DATABASE_REPLICA_LAG_SECONDS
+    until = str(int(time.time() + lag) + 1)
+    response.set_cookie(PIN_COOKIE, until, max_age=lag + 1, httponly=True, samesite="Lax")
+    response[PIN_HEADER] = until
+    return response
+
+
+def pinned_to_primary(request):
+    until = request.headers.get(PIN_HEADER) or request.COOKIES.get(PIN_COOKIE, "")
+    return until.isdigit() and int(until) > time.time()
+
+
+def read_database(request):
+    """Returns the alias of the database the reads of ``request`` should use."""
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas or pinned_to_primary(request):
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+class ReplicaRouter:
+    """Sends every write to the primary, including those of objects read from a replica."""
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,111 @@
+"""Indexed substring search on consumer names.
+
+``name__icontains`` compiles to ``UPPER(name) LIKE '%term%'``, which no btree index
+can serve. Substring searches are backed instead by:
+
+* on PostgreSQL, a pg_trgm GIN index on ``UPPER(name::text)`` that the planner uses
+  for the ``icontains`` lookup as is;
+* on SQLite, an FTS5 table with the trigram tokenizer mirroring the consumer names,
+  kept in sync by triggers.
+
+Either is skipped when the database lacks the extension, and searches fall back to
+``icontains``.
+"""
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.db.utils import OperationalError
+
+from accounts.models import Consumer
+
+TRGM_INDEX = "accounts_consumer_name_trgm"
+FTS_TABLE = "accounts_consumer_name_fts"
+# trigram indexes cannot narrow down shorter terms
+MIN_TERM_LENGTH = 3
+
+FTS_TRIGGERS = {
+    "insert": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON accounts_consumer
+        BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+    "delete": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON accounts_consumer
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+    """,
+    "update": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name ON accounts_consumer
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+        END
+    """,
+}
+
+# whether the name search index exists, per database
+_available = {}
+
+
+def install_name_search(connection):
+    """Creates the substring search index of the database, if supported.
+
+    Like the row count triggers, this also runs after every ``migrate`` because SQLite
+    drops triggers when Django rebuilds the consumer table.
+    """
+    _available.pop(connection.settings_dict["NAME"], None)
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                return
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON accounts_consumer "
+                "USING gin (UPPER(name::text) gin_trgm_ops)"
+            )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE %s", [f"{FTS_TABLE}%"])
+            existing = {name for (name,) in cursor.fetchall()}
+            if FTS_TABLE not in existing:
+                try:
+                    cursor.execute(
+                        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, "
+                        "content='accounts_consumer', content_rowid='id', tokenize='trigram')"
+                    )
+                except OperationalError:  # built without FTS5, or older than 3.34
+                    return
+            elif {f"{FTS_TABLE}_{event}" for event in FTS_TRIGGERS} <= existing:
+                return
+            for sql in FTS_TRIGGERS.values():
+                cursor.execute(sql)
+            # index the names stored while the triggers were missing
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def has_fts_index(connection):
+    name = connection.settings_dict["NAME"]
+    if name not in _available:
+        _available[name] = FTS_TABLE in connection.introspection.table_names()
+    return _available[name]
+
+
+def fts_phrase(term):
+    """Quotes ``term`` as an FTS5 phrase, so it is matched literally."""
+    return '"{}"'.format(term.replace('"', '""'))
+
+
+def matching_consumers(term, using="default"):
+    """Returns the consumers whose name contains ``term``, ignoring case."""
+    connection = connections[using]
+    consumers = Consumer.objects.using(using)
+    if connection.vendor == "sqlite" and len(term) >= MIN_TERM_LENGTH and has_fts_index(connection):
+        return consumers.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [fts_phrase(term)]
+            )
+        )
+    return consumers.filter(name__icontains=term)
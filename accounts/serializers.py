@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from rest_framework import serializers
 
 from .models import Consumer, Debt
@@ -15,3 +17,71 @@ class DebtSerializer(serializers.ModelSerializer):
     class Meta:
         model = Debt
         fields = ["id", "balance", "status", "client", "consumers"]
+
+
+# columns read by serialize_debt_rows(); created_at is only used for keyset cursors
+DEBT_ROW_FIELDS = ("id", "balance", "status", "client_id", "created_at")
+DEBT_FIELDS = tuple(DebtSerializer.Meta.fields)
+
+
+def serialize_debt_rows(rows, fields=DEBT_FIELDS, using="default"):
+    """Returns the ``DebtSerializer(many=True).data`` of debts fetched as plain rows.
+
+    ``rows`` come from ``values_list(*DEBT_ROW_FIELDS, named=True)``. The consumers of
+    the whole page are read with a single query of the three serialized columns and
+    grouped per debt, so no model instance nor serializer field is involved and the
+    output is identical to the serializer's. Only the given ``fields`` of
+    :data:`DEBT_FIELDS` are returned; without consumers, no query runs at all.
+    """
+    if not rows:
+        return []
+    if "consumers" in fields:
+        consumers = _group_consumers(_consumer_links(rows, using))
+    else:
+        consumers = defaultdict(list)
+    return _debt_dicts(rows, fields, consumers)
+
+
+async def aserialize_debt_rows(rows, fields=DEBT_FIELDS, using="default"):
+    """Async version of :func:`serialize_debt_rows`."""
+    if not rows:
+        return []
+    if "consumers" in fields:
+        consumers = _group_consumers([link async for link in _consumer_links(rows, using)])
+    else:
+        consumers = defaultdict(list)
+    return _debt_dicts(rows, fields, consumers)
+
+
+def _debt_dicts(rows, fields, consumers):
+    balance = DebtSerializer().fields["balance"].to_representation
+    debts = [
+        {
+            "id": row.id,
+            "balance": balance(row.balance),
+            "status": row.status,
+            "client": row.client_id,
+            "consumers": consumers[row.id],
+        }
+        for row in rows
+    ]
+    if set(fields) >= set(DEBT_FIELDS):
+        return debts
+    fields = [name for name in DEBT_FIELDS if name in fields]
+    return [{name: debt[name] for name in fields} for debt in debts]
+
+
+def _consumer_links(rows, using):
+    return (
+        Debt.consumers.through.objects.using(using)
+        .filter(debt_id__in=[row.id for row in rows])
+        .order_by("debt_id", "consumer_id")
+        .values_list("debt_id", "consumer_id", "consumer__name", "consumer__is_entity")
+    )
+
+
+def _group_consumers(links):
+    consumers = defaultdict(list)
+    for debt_id, consumer_id, name, is_entity in links:
+        consumers[debt_id].append({"id": consumer_id, "name": name, "is_entity": is_entity})
+    return consumers
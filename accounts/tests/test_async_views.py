@@ -0,0 +1,172 @@
+"""Test the async versions of the account list, export and upload views"""
+
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.async_views import account_list, export_debts, upload_csv
+from accounts.models import Client as ClientModel, CollectionAgency, Consumer, Debt, IngestJob
+from accounts.routers import PIN_HEADER
+from accounts.views import AccountListView
+
+HEADER = "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+
+
+@override_settings(ACCOUNT_LIST_CACHE_SECONDS=300)
+class AsyncAccountListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.factory = RequestFactory()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        for balance in (100, 200, 300):
+            debt = Debt.objects.create(balance=balance, status="IN_COLLECTION", client=client)
+            debt.consumers.add(Consumer.objects.create(name=f"Zoë {balance}", ssn=str(balance)))
+        self.addCleanup(cache.clear)
+
+    def get(self, params=None, **headers):
+        request = self.factory.get(reverse("accounts-list"), params, headers=headers)
+        return async_to_sync(account_list)(request)
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=0)
+    def test_same_response_as_the_sync_view(self):
+        for params in (
+            {},
+            {"limit": 2, "offset": 1, "min_balance": 150},
+            {"pagination": "cursor", "limit": 2, "fields": "id,consumers"},
+            {"count": "none", "consumer_name": "zoë 2"},
+        ):
+            with self.subTest(params=params):
+                expected = self.client.get(reverse("accounts-list"), params)
+                response = self.get(params)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], expected["Content-Type"])
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response["ETag"], expected["ETag"])
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=0)
+    def test_validators_and_count_use_the_async_orm(self):
+        params = {"limit": 2, "min_balance": 150}
+        expected = self.client.get(reverse("accounts-list"), params)
+        cache.clear()  # the count is cached too, and the ETag depends on the generation
+
+        sync_error = AssertionError("ran synchronously")
+        with (
+            mock.patch.object(AccountListView, "validators", side_effect=sync_error),
+            mock.patch("accounts.pagination.exact_count", side_effect=sync_error),
+        ):
+            response = self.get(params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+
+    def test_cached_pages_need_no_query(self):
+        # the entries are shared with the sync view
+        self.client.get(reverse("accounts-list"))
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_request(self):
+        etag = self.get()["ETag"]
+        with self.assertNumQueries(0):
+            response = self.get(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_errors(self):
+        response = self.get({"fields": "id,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {"fields": "Unknown fields: secret"})
+
+        response = self.get({"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), {"detail": "Invalid cursor"})
+
+        request = self.factory.post(reverse("accounts-list"))
+        self.assertEqual(async_to_sync(account_list)(request).status_code, 405)
+
+
+class AsyncExportTests(TestCase):
+    def setUp(self):
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        for balance in (100, 200, 300):
+            Debt.objects.create(balance=balance, status="IN_COLLECTION", client=client)
+
+    async def read(self, response):
+        return [chunk async for chunk in response]
+
+    @override_settings(ACCOUNT_EXPORT_CHUNK_SIZE=2)
+    def test_streams_chunks_asynchronously(self):
+        request = RequestFactory().get(reverse("accounts-export"), {"format": "ndjson"})
+        response = async_to_sync(export_debts)(request)
+
+        # the ASGI handler only streams async iterators without reading them whole
+        self.assertTrue(response.is_async)
+        chunks = async_to_sync(self.read)(response)
+        expected = APIClient().get(reverse("accounts-export"), {"format": "ndjson"})
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(b"".join(chunks), b"".join(expected.streaming_content))
+
+    def test_csv_export(self):
+        request = RequestFactory().get(reverse("accounts-export"), {"format": "csv"})
+        response = async_to_sync(export_debts)(request)
+
+        chunks = async_to_sync(self.read)(response)
+        expected = APIClient().get(reverse("accounts-export"), {"format": "csv"})
+        self.assertEqual(b"".join(chunks), b"".join(expected.streaming_content))
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="debts.csv"')
+
+
+class AsyncUploadTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        self.addCleanup(cache.clear)
+
+    def upload(self, data, query=""):
+        request = self.factory.post(reverse("upload-csv") + query, data)
+        return async_to_sync(upload_csv)(request)
+
+    def csv_file(self, content):
+        file = io.StringIO(content)
+        file.name = "test.csv"
+        return file
+
+    def test_upload_is_ingested(self):
+        file = self.csv_file(HEADER + "ref1,10.00,IN_COLLECTION,Bob,Elm St,222-22-2222,\n")
+        response = self.upload({"file": file})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["data"]["created"], 1)
+        self.assertIn(PIN_HEADER, response)
+        self.assertEqual(Debt.objects.get().balance, 10)
+
+    def test_queued_upload(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        file = self.csv_file(HEADER + "ref1,10.00,IN_COLLECTION,Bob,Elm St,222-22-2222,\n")
+        with override_settings(MEDIA_ROOT=media_root):
+            response = self.upload({"file": file}, "?async=1")
+
+        self.assertEqual(response.status_code, 202)
+        job = IngestJob.objects.get(pk=json.loads(response.content)["data"]["job_id"])
+        self.assertEqual(job.status, IngestJob.QUEUED)
+        self.assertFalse(Debt.objects.exists())
+
+    def test_invalid_uploads(self):
+        self.assertEqual(self.upload({}).status_code, 400)
+        file = self.csv_file(HEADER)
+        self.assertEqual(self.upload({"file": file}, "?resume_from=x").status_code, 400)
+        request = self.factory.get(reverse("upload-csv"))
+        self.assertEqual(async_to_sync(upload_csv)(request).status_code, 405)
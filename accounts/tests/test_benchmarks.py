@@ -0,0 +1,112 @@
+"""Test the benchmark suite"""
+
+import io
+from unittest import skipUnless
+
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase
+
+from accounts.benchmarks.generator import HEADER, UNKNOWN_AGENCY_ID, generate_rows, write_csv
+from accounts.benchmarks.load import run_load
+from accounts.benchmarks.measure import measure, reset_peak_rss
+from accounts.benchmarks.suite import compare, run_suite
+from accounts.ingestion.validation import validate_batch
+from accounts.models import CollectionAgency
+
+
+class GeneratorTests(TestCase):
+    def test_same_seed_same_rows(self):
+        self.assertEqual(list(generate_rows(100, seed=3)), list(generate_rows(100, seed=3)))
+        self.assertNotEqual(list(generate_rows(100, seed=3)), list(generate_rows(100, seed=4)))
+
+    def test_repeat_ratios(self):
+        rows = list(generate_rows(2000, repeat_clients=0.9, repeat_consumers=0.0))
+
+        clients = {row[0] for row in rows}
+        ssns = {row[5] for row in rows}
+        self.assertLess(len(clients), 400)
+        self.assertEqual(len(ssns), 2000)
+
+    def test_bad_rows(self):
+        rows = list(generate_rows(1000, bad_rows=0.1))
+        unknown_agency = [row for row in rows if row[6] == UNKNOWN_AGENCY_ID]
+        _, rejected = validate_batch([dict(zip(HEADER, map(str, row))) for row in rows])
+        self.assertTrue(50 < len(unknown_agency) + len(rejected) < 150)
+        self.assertTrue(unknown_agency)
+        self.assertTrue(rejected)
+
+    def test_write_csv_includes_header(self):
+        output = io.StringIO()
+        write_csv(output, 3)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0], ",".join(HEADER))
+        self.assertEqual(len(lines), 4)
+
+
+class MeasureTests(TestCase):
+    @skipUnless(reset_peak_rss(), "the peak RSS cannot be reset")
+    def test_peak_rss_is_the_block_peak(self):
+        with measure() as first:
+            data = b"x" * (64 * 1024 * 1024)
+            del data
+        with measure() as second:
+            pass
+
+        self.assertGreater(first["peak_rss_mb"], second["peak_rss_mb"] + 32)
+
+
+class SuiteTests(TestCase):
+    def test_run_suite_reports_measurements(self):
+        CollectionAgency.objects.create(name="Agency X")
+        report = run_suite([50], ["ingest", "reingest"], bad_rows=0.0)
+
+        ingest, reingest = report["results"]
+        self.assertEqual(ingest["created"], 50)
+        self.assertEqual(reingest["duplicated"], 50)
+        for result in report["results"]:
+            self.assertGreater(result["rows_per_second"], 0)
+            self.assertGreater(result["queries"], 0)
+            self.assertIn("peak_rss_mb", result)
+        self.assertIn("vendor", report["meta"])
+
+    def test_list_page_compares_serialization_paths(self):
+        CollectionAgency.objects.create(name="Agency X")
+        report = run_suite([120], ["list_page"], bad_rows=0.0)
+
+        (result,) = report["results"]
+        self.assertGreater(result["rows_per_second"], 0)
+        self.assertGreater(result["serializer_ms_per_page"], 0)
+        self.assertGreater(result["speedup"], 0)
+        # the rows and the consumers of each page of 50 rows
+        self.assertEqual(result["queries"], 6)
+
+    def test_compare_with_baseline(self):
+        result = {"scenario": "ingest", "rows": 10, "backend": "BatchIngestor"}
+        baseline = {"results": [{**result, "rows_per_second": 100.0}]}
+        current = {"results": [{**result, "rows_per_second": 150.0}]}
+
+        (change,) = compare(current, baseline)
+        self.assertAlmostEqual(change["change"], 0.5)
+
+
+class LatencyScenarioTests(TransactionTestCase):
+    # the scenario opens and closes connections, which a test transaction forbids
+    def test_list_latency_reports_percentiles(self):
+        CollectionAgency.objects.create(name="Agency X")
+        report = run_suite([20], ["list_latency"], bad_rows=0.0)
+
+        (result,) = report["results"]
+        self.assertEqual(result["requests"], 200)
+        self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertGreater(result["fresh_connection_p99_ms"], 0)
+
+
+class LoadTests(LiveServerTestCase):
+    def test_run_load_against_a_live_server(self):
+        result = run_load(
+            self.live_server_url, slow_clients=2, readers=1, seconds=1, upload_seconds=0.2
+        )
+
+        self.assertGreater(result["uploads"], 0)
+        self.assertGreater(result["list_requests"], 0)
+        self.assertEqual(result["upload_errors"] + result["list_errors"], 0)
+        self.assertLessEqual(result["list_p50_ms"], result["list_p99_ms"])
@@ -0,0 +1,108 @@
+"""Test management commands"""
+
+import io
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+
+from accounts.models import Client, CollectionAgency, Debt
+
+HEADER = "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+
+
+class ImportDebtsCommandTests(TestCase):
+    def setUp(self):
+        self.default_agency = CollectionAgency.objects.create(name="Default")
+        self.agency = CollectionAgency.objects.create(name="Agency X")
+
+    def write_csv(self, content):
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as csv_file:
+            csv_file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_reports_progress_and_totals(self):
+        path = self.write_csv(
+            HEADER
+            + "".join(
+                f"ref{i},{i + 1}.00,IN_COLLECTION,Consumer {i},Main St,{i:03d}-00-0000,\n"
+                for i in range(5)
+            )
+        )
+        out = io.StringIO()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_debts", path, "--batch-size", "2", stdout=out)
+
+        output = out.getvalue()
+        self.assertEqual(Debt.objects.count(), 5)
+        self.assertEqual(output.count("rows/s | commit"), 3)
+        self.assertIn("peak RSS", output)
+        self.assertIn("5 created, 0 duplicated, 0 failed", output)
+
+    def test_agency_id_sets_the_default_agency(self):
+        path = self.write_csv(
+            HEADER
+            + "ref1,10.00,IN_COLLECTION,Alice,Main St,111-11-1111,\n"
+            + f"ref2,10.00,IN_COLLECTION,Bob,Main St,222-22-2222,{self.default_agency.pk}\n"
+        )
+
+        call_command("import_debts", path, "--agency-id", str(self.agency.pk), stdout=io.StringIO())
+
+        self.assertEqual(Client.objects.get(reference_no="ref1").agency, self.agency)
+        self.assertEqual(Client.objects.get(reference_no="ref2").agency, self.default_agency)
+
+    def test_unknown_agency_id(self):
+        path = self.write_csv(HEADER)
+        with self.assertRaisesMessage(CommandError, "Agency with ID 999999 not found."):
+            call_command("import_debts", path, "--agency-id", "999999")
+
+    def test_missing_file(self):
+        with self.assertRaisesMessage(CommandError, "does not exist"):
+            call_command("import_debts", "/does/not/exist.csv")
+
+    def test_invalid_header(self):
+        path = self.write_csv("wrong,header\nbad,data\n")
+        with self.assertRaisesMessage(CommandError, "Import failed"):
+            call_command("import_debts", path, stdout=io.StringIO())
+
+    def test_empty_file(self):
+        path = self.write_csv("")
+        out = io.StringIO()
+        call_command("import_debts", path, stdout=out)
+        self.assertIn("0 created", out.getvalue())
+
+
+class ParallelImportDebtsCommandTests(TransactionTestCase):
+    """The workers import through their own connections, so the rows must be committed."""
+
+    def setUp(self):
+        CollectionAgency.objects.create(name="Default")
+
+    def test_parallel_import_reports_progress(self):
+        handle, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as csv_file:
+            csv_file.write(
+                HEADER
+                + "".join(
+                    f"ref{i},{i + 1}.00,IN_COLLECTION,Consumer {i},Main St,{i:03d}-00-0000,\n"
+                    for i in range(8)
+                )
+            )
+        self.addCleanup(os.remove, path)
+        out = io.StringIO()
+
+        call_command("import_debts", path, "--workers", "2", "--batch-size", "2", stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(Debt.objects.count(), 8)
+        # a line per batch, whichever worker committed it, with the running total
+        progress = [int(line.split()[0]) for line in lines if "rows/s | commit" in line]
+        self.assertGreaterEqual(len(progress), 4)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 8)
+        output = out.getvalue()
+        self.assertIn("8 created, 0 duplicated, 0 failed", output)
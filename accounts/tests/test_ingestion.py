@@ -0,0 +1,476 @@
+"""Test the batched ingestion engine"""
+
+import csv
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from accounts.ingestion import (
+    BatchIngestor,
+    CSVEncodingError,
+    CSVLineReader,
+    chunked,
+    get_ingestor,
+    ingest_rows,
+)
+from accounts.ingestion.fingerprint import debt_fingerprint
+from accounts.ingestion.parallel import import_file, ingest_range, split_ranges
+from accounts.ingestion.postgres import CopyIngestor
+from accounts.ingestion.validation import clean_row, validate_batch
+from accounts.models import Client, CollectionAgency, Consumer, Debt
+
+
+def make_row(client_ref, ssn, balance="100.00", status="IN_COLLECTION", agency_id=""):
+    return {
+        "client reference no": client_ref,
+        "balance": balance,
+        "status": status,
+        "consumer name": f"Consumer {ssn}",
+        "consumer address": "123 Main St",
+        "ssn": ssn,
+        "agency_id": agency_id,
+    }
+
+
+class ChunkedTests(TestCase):
+    def test_chunked_splits_iterable(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_chunked_empty_iterable(self):
+        self.assertEqual(list(chunked([], 2)), [])
+
+
+class BatchIngestorTests(TestCase):
+    def setUp(self):
+        self.agency = CollectionAgency.objects.create(name="Agency X")
+
+    def test_ingest_creates_records(self):
+        rows = [
+            make_row("ref1", "111-11-1111"),
+            make_row("ref1", "222-22-2222", balance="50.00"),
+            make_row("ref2", "111-11-1111", agency_id=str(self.agency.id)),
+        ]
+        result = ingest_rows(rows)
+
+        self.assertEqual(result.as_dict(), {"created": 3, "duplicated": 0, "failed": 0})
+        self.assertEqual(Client.objects.count(), 2)
+        self.assertEqual(Consumer.objects.count(), 2)
+        self.assertEqual(Debt.objects.count(), 3)
+        self.assertEqual(Client.objects.get(reference_no="ref2").agency, self.agency)
+        self.assertEqual(
+            Consumer.objects.get(ssn="111-11-1111").debts.count(),
+            2,
+        )
+
+    def test_ingest_reuses_existing_client_and_consumer(self):
+        client = Client.objects.create(name="Existing", agency=self.agency, reference_no="ref1")
+        consumer = Consumer.objects.create(name="Alice", address="Home", ssn="111-11-1111")
+
+        result = ingest_rows([make_row("ref1", "111-11-1111")])
+
+        self.assertEqual(result.created, 1)
+        debt = Debt.objects.get()
+        self.assertEqual(debt.client, client)
+        self.assertEqual(list(debt.consumers.all()), [consumer])
+        self.assertEqual(Client.objects.get(pk=client.pk).name, "Existing")
+
+    def test_debts_take_the_agency_of_their_client(self):
+        other = CollectionAgency.objects.create(name="Agency Y")
+        Client.objects.create(name="Existing", agency=other, reference_no="ref1")
+        rows = [
+            make_row("ref1", "111-11-1111", agency_id=str(self.agency.id)),
+            make_row("ref2", "222-22-2222", agency_id=str(other.id)),
+        ]
+        ingest_rows(rows)
+
+        self.assertEqual(
+            dict(Debt.objects.values_list("client_reference_no", "agency_id")),
+            {"ref1": other.id, "ref2": other.id},
+        )
+
+    def test_ingest_counts_unknown_agency_as_failed(self):
+        rows = [make_row("ref1", "111-11-1111", agency_id="999999")]
+        result = ingest_rows(rows)
+
+        self.assertEqual(result.as_dict(), {"created": 0, "duplicated": 0, "failed": 1})
+        self.assertFalse(Client.objects.filter(reference_no="ref1").exists())
+
+    def test_ingest_spans_multiple_batches(self):
+        rows = [make_row(f"ref{i % 3}", f"{i:03d}-00-0000") for i in range(7)]
+        result = BatchIngestor(batch_size=2).ingest(rows)
+
+        self.assertEqual(result.created, 7)
+        self.assertEqual(Client.objects.count(), 3)
+        self.assertEqual(Debt.objects.count(), 7)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        """One batch costs the same number of queries regardless of its size."""
+        ingestor = BatchIngestor(batch_size=500)
+        ingestor.default_agency  # resolved once per import
+        rows = [make_row(f"ref{i}", f"{i:03d}-00-0000") for i in range(120)]
+        # savepoint + release, the fingerprint lookup, select, insert and read back
+        # for clients and consumers, then the debt insert (in its own savepoint), one
+        # insert for the consumer links and one upsert of the rollups.
+        with self.assertNumQueries(14):
+            ingestor.ingest(rows)
+        self.assertEqual(Debt.objects.count(), 120)
+
+
+class CSVLineReaderTests(TestCase):
+    def test_lines_are_reassembled_across_chunks(self):
+        chunks = [b"a,b\n1,", b"2\n3,4", b"\n5,6"]
+        self.assertEqual(list(CSVLineReader(chunks)), ["a,b\n", "1,2\n", "3,4\n", "5,6"])
+
+    def test_multibyte_character_split_across_chunks(self):
+        data = "name\nJosé\n".encode("utf-8")
+        split = data.index(b"\xc3") + 1
+        self.assertEqual(list(CSVLineReader([data[:split], data[split:]])), ["name\n", "José\n"])
+
+    def test_bom_is_dropped(self):
+        rows = list(csv.DictReader(CSVLineReader([b"\xef\xbb\xbfname,ssn\nAlice,1\n"])))
+        self.assertEqual(rows, [{"name": "Alice", "ssn": "1"}])
+
+    def test_quoted_field_spanning_lines(self):
+        rows = list(csv.DictReader(CSVLineReader([b'name,address\nAlice,"1 Main St\nCity"\n'])))
+        self.assertEqual(rows, [{"name": "Alice", "address": "1 Main St\nCity"}])
+
+    def test_invalid_utf8_reports_line(self):
+        chunks = [b"name\nAlice\n", b"Bob\nJos\xe9\n"]
+        with self.assertRaises(CSVEncodingError) as ctx:
+            list(CSVLineReader(chunks))
+        self.assertEqual(ctx.exception.line, 4)
+        self.assertIn("line 4", str(ctx.exception))
+
+    def test_truncated_utf8_at_end_of_file(self):
+        with self.assertRaises(CSVEncodingError) as ctx:
+            list(CSVLineReader([b"name\nJos\xc3"]))
+        self.assertEqual(ctx.exception.line, 2)
+
+
+class ConflictSafeUpsertTests(TestCase):
+    def setUp(self):
+        self.agency = CollectionAgency.objects.create(name="Agency X")
+
+    def test_client_created_concurrently_is_reused(self):
+        """A client inserted by another worker after the lookup does not break the batch."""
+        existing = Client.objects.create(name="Other", agency=self.agency, reference_no="ref1")
+        in_bulk = Client.objects.in_bulk
+        stale_lookups = iter([{}])
+
+        def racing_in_bulk(*args, **kwargs):
+            return next(stale_lookups, None) or in_bulk(*args, **kwargs)
+
+        with mock.patch.object(Client.objects, "in_bulk", side_effect=racing_in_bulk):
+            result = BatchIngestor().ingest([make_row("ref1", "111-11-1111")])
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Client.objects.count(), 1)
+        self.assertEqual(Debt.objects.get().client, existing)
+
+    def test_consumer_created_concurrently_is_reused(self):
+        """A consumer inserted by another worker after the lookup is linked to the debt."""
+        existing = Consumer.objects.create(name="Alice", address="Home", ssn="111-11-1111")
+        stale_lookup = Consumer.objects.none()
+        read_back = Consumer.objects.filter(ssn__in=["111-11-1111"])
+
+        with mock.patch.object(Consumer.objects, "filter", side_effect=[stale_lookup, read_back]):
+            result = BatchIngestor().ingest([make_row("ref1", "111-11-1111")])
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Consumer.objects.count(), 1)
+        self.assertEqual(list(Debt.objects.get().consumers.all()), [existing])
+
+    def test_missing_rows_are_inserted_in_key_order(self):
+        """Concurrent imports lock the new unique keys in the same order."""
+        rows = [make_row("ref2", "222-22-2222"), make_row("ref1", "111-11-1111")]
+
+        with (
+            mock.patch.object(
+                Client.objects, "bulk_create", wraps=Client.objects.bulk_create
+            ) as client_create,
+            mock.patch.object(
+                Consumer.objects, "bulk_create", wraps=Consumer.objects.bulk_create
+            ) as consumer_create,
+        ):
+            BatchIngestor().ingest(rows)
+
+        clients = client_create.call_args.args[0]
+        consumers = consumer_create.call_args.args[0]
+        self.assertEqual([client.reference_no for client in clients], ["ref1", "ref2"])
+        self.assertEqual([consumer.ssn for consumer in consumers], ["111-11-1111", "222-22-2222"])
+
+
+class ParallelImportTests(TestCase):
+    HEADER = "client reference no,balance,status,consumer name,consumer address,ssn\n"
+
+    def setUp(self):
+        CollectionAgency.objects.create(name="Agency X")
+        lines = [
+            f"ref{i % 4},{i + 1}.00,IN_COLLECTION,Consumer {i % 5},Main St,{i % 5:03d}-00-0000\n"
+            for i in range(40)
+        ]
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as csv_file:
+            csv_file.write(self.HEADER + "".join(lines))
+        self.addCleanup(os.remove, self.path)
+        self.lines = lines
+
+    def test_split_ranges_cover_every_row_once(self):
+        header, ranges = split_ranges(self.path, 6)
+
+        self.assertEqual(header.decode(), self.HEADER)
+        self.assertGreater(len(ranges), 1)
+        with open(self.path, "rb") as csv_file:
+            data = csv_file.read()
+        self.assertEqual(ranges[0][0], len(header))
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[start - 1 : start], b"\n")
+
+    def test_split_ranges_with_more_parts_than_rows(self):
+        _, ranges = split_ranges(self.path, 1000)
+        self.assertEqual(len(ranges), len(self.lines))
+
+    def test_ingesting_every_range_imports_the_whole_file(self):
+        header, ranges = split_ranges(self.path, 5)
+        total = sum(
+            (ingest_range(self.path, header, start, end) for start, end in ranges),
+            start=BatchIngestor().ingest([]),
+        )
+
+        self.assertEqual(total.created, 40)
+        self.assertEqual(Client.objects.count(), 4)
+        self.assertEqual(Consumer.objects.count(), 5)
+        self.assertEqual(Debt.objects.count(), 40)
+
+    def test_import_file_with_single_worker(self):
+        result = import_file(self.path, workers=1, batch_size=7)
+        self.assertEqual(result.created, 40)
+        self.assertEqual(Debt.objects.count(), 40)
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        CollectionAgency.objects.create(name="Agency X")
+
+    def test_fingerprint_normalizes_values(self):
+        self.assertEqual(
+            debt_fingerprint("ref1", "111-11-1111", "100.5", "in_collection"),
+            debt_fingerprint(" ref1 ", "111111111", "100.50", "IN_COLLECTION "),
+        )
+        self.assertNotEqual(
+            debt_fingerprint("ref1", "111-11-1111", "100.50", "IN_COLLECTION"),
+            debt_fingerprint("ref1", "111-11-1111", "100.51", "IN_COLLECTION"),
+        )
+
+    def test_reingesting_rows_reports_duplicates(self):
+        rows = [make_row("ref1", "111-11-1111"), make_row("ref2", "222-22-2222")]
+        ingest_rows(rows)
+
+        result = ingest_rows(rows + [make_row("ref3", "333-33-3333")])
+
+        self.assertEqual(result.as_dict(), {"created": 1, "duplicated": 2, "failed": 0})
+        self.assertEqual(Debt.objects.count(), 3)
+
+    def test_repeated_row_within_a_file(self):
+        rows = [make_row("ref1", "111-11-1111"), make_row("ref1", "111-11-1111", balance="100")]
+        result = BatchIngestor(batch_size=1).ingest(rows + rows)
+
+        self.assertEqual(result.as_dict(), {"created": 1, "duplicated": 3, "failed": 0})
+
+    def test_known_file_only_costs_the_fingerprint_lookup(self):
+        rows = [make_row(f"ref{i}", f"{i:03d}-00-0000") for i in range(50)]
+        ingestor = BatchIngestor()
+        ingestor.ingest(rows)
+
+        # savepoint + release and the fingerprint lookup
+        with self.assertNumQueries(3):
+            result = ingestor.ingest(rows)
+        self.assertEqual(result.duplicated, 50)
+
+    def test_rows_stored_concurrently_are_counted_as_duplicates(self):
+        """A row inserted by another import after the lookup is skipped on retry."""
+        ingest_rows([make_row("ref1", "111-11-1111")])
+        ingestor = BatchIngestor()
+        known_fingerprints = ingestor._known_fingerprints
+        stale_lookups = iter([set()])
+
+        def racing_lookup(rows):
+            return next(stale_lookups, None) or known_fingerprints(rows)
+
+        with mock.patch.object(ingestor, "_known_fingerprints", side_effect=racing_lookup):
+            result = ingestor.ingest(
+                [make_row("ref1", "111-11-1111"), make_row("ref2", "222-22-2222")]
+            )
+
+        self.assertEqual(result.as_dict(), {"created": 1, "duplicated": 1, "failed": 0})
+        self.assertEqual(Debt.objects.count(), 2)
+
+
+class ValidationTests(TestCase):
+    def test_clean_row_normalizes_values(self):
+        row = make_row(" ref1 ", "111111111", balance=" 100.5 ", status=" in collection ")
+        row["consumer name"] = "  John   Doe "
+        row["agency_id"] = " 7 "
+
+        cleaned = clean_row(row)
+
+        self.assertEqual(cleaned.client_ref, "ref1")
+        self.assertEqual(cleaned.balance, Decimal("100.50"))
+        self.assertEqual(cleaned.status, "IN_COLLECTION")
+        self.assertEqual(cleaned.name, "John Doe")
+        self.assertEqual(cleaned.ssn, "111-11-1111")
+        self.assertEqual(cleaned.agency_id, 7)
+        self.assertEqual(
+            cleaned.fingerprint,
+            debt_fingerprint("ref1", "111-11-1111", "100.50", "IN_COLLECTION"),
+        )
+
+    def test_invalid_rows_are_rejected(self):
+        invalid = [
+            make_row("ref1", "111-11-1111", balance="-5.00"),
+            make_row("ref1", "111-11-1111", balance="0"),
+            make_row("ref1", "111-11-1111", balance="abc"),
+            make_row("ref1", "111-11-1111", balance="NaN"),
+            make_row("ref1", "111-11-1111", balance="1.005"),
+            make_row("ref1", "111-11-1111", balance="100000000.00"),
+            make_row("ref1", "1111-1-1111"),
+            make_row("ref1", ""),
+            make_row("", "111-11-1111"),
+            make_row("ref1", "111-11-1111", status="  "),
+            make_row("ref1", "111-11-1111", agency_id="x1"),
+        ]
+        clean, rejected = validate_batch(invalid + [make_row("ref1", "111-11-1111")])
+
+        self.assertEqual(len(clean), 1)
+        self.assertEqual([r.row for r in rejected], invalid)
+        self.assertEqual(rejected[0].reason, "balance must be greater than zero")
+
+    def test_missing_column_raises(self):
+        row = make_row("ref1", "111-11-1111")
+        del row["ssn"]
+        with self.assertRaisesMessage(ValueError, "missing required columns: ssn"):
+            validate_batch([row])
+
+    def test_rejected_rows_are_counted_as_failed(self):
+        CollectionAgency.objects.create(name="Agency X")
+        rows = [make_row("ref1", "111-11-1111"), make_row("ref2", "222-22-2222", balance="-1")]
+
+        result = ingest_rows(rows)
+
+        self.assertEqual(result.as_dict(), {"created": 1, "duplicated": 0, "failed": 1})
+        self.assertFalse(Client.objects.filter(reference_no="ref2").exists())
+
+    def test_invalid_batch_costs_no_queries(self):
+        rows = [make_row(f"ref{i}", "bad-ssn") for i in range(20)]
+        # only the savepoint + release of the batch transaction
+        with self.assertNumQueries(2):
+            result = BatchIngestor().ingest(rows)
+        self.assertEqual(result.failed, 20)
+
+
+class GetIngestorTests(TestCase):
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_sqlite_uses_orm_batches(self):
+        self.assertIs(type(get_ingestor()), BatchIngestor)
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+    def test_postgresql_uses_copy(self):
+        self.assertIsInstance(get_ingestor(), CopyIngestor)
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+    @override_settings(CSV_INGEST_USE_COPY=False)
+    def test_copy_can_be_disabled(self):
+        self.assertIs(type(get_ingestor()), BatchIngestor)
+
+
+@skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+class CopyIngestorTests(TestCase):
+    def setUp(self):
+        self.agency = CollectionAgency.objects.create(name="Agency X")
+
+    def test_copy_creates_records(self):
+        Client.objects.create(name="Existing", agency=self.agency, reference_no="ref2")
+        rows = [
+            make_row("ref1", "111-11-1111"),
+            make_row("ref1", "222-22-2222", balance="50.00"),
+            make_row("ref2", "111-11-1111", agency_id=str(self.agency.id)),
+            make_row("ref3", "333-33-3333", agency_id="999999"),
+        ]
+        result = CopyIngestor().ingest(rows)
+
+        self.assertEqual(result.as_dict(), {"created": 3, "duplicated": 0, "failed": 1})
+        self.assertEqual(Client.objects.count(), 2)
+        self.assertEqual(Client.objects.get(reference_no="ref2").name, "Existing")
+        self.assertEqual(Consumer.objects.count(), 2)
+        self.assertEqual(Debt.objects.count(), 3)
+        self.assertEqual(Consumer.objects.get(ssn="111-11-1111").debts.count(), 2)
+        for debt in Debt.objects.all():
+            self.assertEqual(debt.consumers.count(), 1)
+            self.assertIsNotNone(debt.fingerprint)
+            self.assertEqual(debt.agency_id, debt.client.agency_id)
+
+    def test_copy_skips_duplicates(self):
+        rows = [make_row("ref1", "111-11-1111"), make_row("ref1", "111-11-1111", balance="100")]
+        first = CopyIngestor(batch_size=1).ingest(rows)
+        second = CopyIngestor().ingest(rows + [make_row("ref2", "222-22-2222")])
+
+        self.assertEqual(first.as_dict(), {"created": 1, "duplicated": 1, "failed": 0})
+        self.assertEqual(second.as_dict(), {"created": 1, "duplicated": 2, "failed": 0})
+        self.assertEqual(Debt.objects.count(), 2)
+
+    def test_copy_handles_quotes_and_commas(self):
+        row = make_row("ref1", "111-11-1111")
+        row["consumer name"] = 'O\'Brien, "Jr"'
+        row["consumer address"] = "1 Main St\nCity"
+        CopyIngestor().ingest([row])
+
+        consumer = Consumer.objects.get()
+        self.assertEqual(consumer.name, 'O\'Brien, "Jr"')
+        self.assertEqual(consumer.address, "1 Main St\nCity")
+
+    def test_copy_rejects_invalid_rows(self):
+        rows = [make_row("ref1", "111-11-1111"), make_row("ref2", "12345", balance="-1")]
+        result = CopyIngestor().ingest(rows)
+
+        self.assertEqual(result.as_dict(), {"created": 1, "duplicated": 0, "failed": 1})
+
+    def test_copy_keeps_empty_values(self):
+        row = make_row("ref1", "111-11-1111")
+        row["consumer address"] = ""
+        CopyIngestor().ingest([row])
+
+        self.assertEqual(Consumer.objects.get().address, "")
+
+
+class CheckpointTests(TestCase):
+    DATA = "\ufeffname,ssn\r\nJosé,1\r\nBob,2\r\nEve,3\r\n".encode("utf-8")
+
+    def test_offset_follows_the_rows_read(self):
+        lines = CSVLineReader([self.DATA[:7], self.DATA[7:]])
+        reader = csv.DictReader(lines)
+
+        next(reader)
+        self.assertEqual(self.DATA[lines.offset :], b"Bob,2\r\nEve,3\r\n")
+        next(reader)
+        self.assertEqual(self.DATA[lines.offset :], b"Eve,3\r\n")
+        next(reader)
+        self.assertEqual(lines.offset, len(self.DATA))
+
+    def test_resume_from_offset(self):
+        offset = self.DATA.index(b"Eve")
+        lines = CSVLineReader([self.DATA[:5], self.DATA[5:20], self.DATA[20:]], offset=offset)
+
+        self.assertEqual(list(csv.DictReader(lines)), [{"name": "Eve", "ssn": "3"}])
+        self.assertEqual(lines.offset, len(self.DATA))
+
+    def test_resume_at_end_of_file(self):
+        lines = CSVLineReader([self.DATA], offset=len(self.DATA))
+        self.assertEqual(list(csv.DictReader(lines)), [])
@@ -0,0 +1,112 @@
+"""Test the request instrumentation and the metrics endpoint"""
+
+import io
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.metrics import REGISTRY, Histogram, RequestMetrics, collect, record_rows, timing
+from accounts.models import Client as ClientModel, CollectionAgency, Debt
+
+HEADER = "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+
+
+def server_timing(response):
+    """Maps the metric names of a Server-Timing header to their parameters."""
+    metrics = {}
+    for entry in response["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        # the middleware chain is built on the first request of the client
+        self.client = Client()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        Debt.objects.create(balance=100, status="IN_COLLECTION", client=client)
+        REGISTRY.clear()
+        self.addCleanup(REGISTRY.clear)
+        self.addCleanup(cache.clear)
+
+    def test_list_reports_its_queries_and_phases(self):
+        response = self.client.get(reverse("accounts-list"))
+
+        timings = server_timing(response)
+        # newest debt, count, page and consumers
+        self.assertEqual(timings["db"]["desc"], '"4 queries"')
+        for phase in ("validators", "count", "serialize", "total"):
+            self.assertGreaterEqual(float(timings[phase]["dur"]), 0)
+
+    def test_upload_reports_the_rows_ingested(self):
+        file = io.StringIO(
+            HEADER
+            + "ref1,10.00,IN_COLLECTION,Bob,Elm St,222-22-2222,\n"
+            + "ref1,20.00,IN_COLLECTION,Eve,Elm St,333-33-3333,\n"
+        )
+        file.name = "test.csv"
+        response = self.client.post(reverse("upload-csv"), {"file": file})
+
+        self.assertEqual(server_timing(response)["ingest"]["desc"], '"2 rows"')
+        self.assertIn('ingested_rows_total{view="upload-csv"} 2', REGISTRY.render())
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("accounts-list"))
+        self.client.get(reverse("accounts-list"), {"status": "PAID_IN_FULL"})
+        self.client.get("/missing")
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn('http_requests_total{view="accounts-list",method="GET",status="200"} 2', text)
+        self.assertIn('http_requests_total{view="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn(
+            'http_request_duration_seconds_count{view="accounts-list",method="GET"} 2', text
+        )
+        self.assertIn('http_request_phase_seconds_count{view="accounts-list",phase="count"}', text)
+        self.assertIn('http_request_queries_bucket{view="accounts-list",le="+Inf"} 2', text)
+
+
+class DisabledMetricsTests(TestCase):
+    def setUp(self):
+        self.addCleanup(cache.clear)
+
+    def test_no_instrumentation_when_disabled(self):
+        response = self.client.get(reverse("accounts-list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+    def test_helpers_are_no_ops_outside_requests(self):
+        with timing("serialize"):
+            pass
+        record_rows(10)
+
+
+class MetricsHelpersTests(TestCase):
+    def test_timings_add_up_per_phase(self):
+        metrics = RequestMetrics()
+        with collect(metrics):
+            for _ in range(2):
+                with timing("serialize"):
+                    pass
+            record_rows(3)
+            record_rows(4)
+        self.assertEqual(list(metrics.phases), ["serialize"])
+        self.assertEqual(metrics.rows_ingested, 7)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency", "Latency.", ("view",), (0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(("list",), value)
+
+        lines = list(histogram.render())
+        self.assertIn('latency_bucket{view="list",le="0.1"} 2', lines)
+        self.assertIn('latency_bucket{view="list",le="1.0"} 3', lines)
+        self.assertIn('latency_bucket{view="list",le="+Inf"} 4', lines)
+        self.assertIn('latency_sum{view="list"} 3.65', lines)
+        self.assertIn('latency_count{view="list"} 4', lines)
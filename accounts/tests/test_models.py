@@ -25,6 +25,18 @@ class ClientTestCase(TestCase):
         self.assertEqual(client.agency, agency)
         self.assertEqual(str(client), "Client 1")
 
+    def test_moving_client_updates_debt_agency(self):
+        agency_a = CollectionAgency.objects.create(name="Agency A")
+        agency_b = CollectionAgency.objects.create(name="Agency B")
+        client = Client.objects.create(name="Client 1", agency=agency_a, reference_no="ref1")
+        debt = Debt.objects.create(balance=100.00, client=client)
+
+        client.agency = agency_b
+        client.save()
+
+        debt.refresh_from_db()
+        self.assertEqual(debt.agency, agency_b)
+
 
 class ConsumerTestCase(TestCase):
     """Test for Consumer model."""
@@ -54,6 +66,12 @@ class DebtTestCase(TestCase):
         self.assertIn(consumer_2, debt.consumers.all())
         self.assertEqual(debt.consumers.count(), 2)
 
+    def test_debt_copies_client_agency(self):
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = Client.objects.create(name="Client 1", agency=agency)
+        debt = Debt.objects.create(balance=150.00, client=client)
+        self.assertEqual(debt.agency, agency)
+
     def test_debt_balance_validation(self):
         """Test for Debt balance validation (should raise error if balance is zero or negative)."""
         agency = CollectionAgency.objects.create(name="Agency A")
@@ -0,0 +1,180 @@
+"""Test the portfolio rollups and the summary endpoint"""
+
+import io
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import Client as HttpClient, TestCase
+from django.urls import reverse
+
+from accounts.ingestion import BatchIngestor
+from accounts.ingestion.postgres import CopyIngestor
+from accounts.models import Client, CollectionAgency, Debt, DebtRollup
+from accounts.rollups import rebuild_rollups, summarize
+from accounts.tests.test_ingestion import make_row
+
+
+def debt_totals():
+    """The rollups recomputed from the debts, for comparison."""
+    return {
+        (row["agency_id"], row["client_id"], row["status"]): (row["debts"], row["balance"])
+        for row in Debt.objects.values("agency_id", "client_id", "status").annotate(
+            debts=Count("id"), balance=Sum("balance")
+        )
+    }
+
+
+def rollup_totals():
+    return {
+        (rollup.agency_id, rollup.client_id, rollup.status): (rollup.debts, rollup.balance)
+        for rollup in DebtRollup.objects.all()
+    }
+
+
+class RollupMaintenanceTests(TestCase):
+    def setUp(self):
+        self.agency = CollectionAgency.objects.create(name="Agency A")
+        self.other_agency = CollectionAgency.objects.create(name="Agency B")
+        self.rows = [
+            make_row("ref1", "111-11-1111", balance="10.50"),
+            make_row("ref1", "222-22-2222", balance="20.25"),
+            make_row("ref1", "333-33-3333", balance="5.00", status="PAID_IN_FULL"),
+            make_row("ref2", "444-44-4444", agency_id=str(self.other_agency.pk)),
+            make_row("ref3", "555-55-5555", balance="0.01", agency_id=str(self.other_agency.pk)),
+        ]
+
+    def assert_rollups_match_debts(self):
+        self.assertEqual(rollup_totals(), debt_totals())
+
+    def test_ingestion_adds_every_batch_to_the_rollups(self):
+        BatchIngestor(batch_size=2).ingest(self.rows)
+
+        self.assert_rollups_match_debts()
+        rollup = DebtRollup.objects.get(client__reference_no="ref1", status="IN_COLLECTION")
+        self.assertEqual((rollup.debts, rollup.balance), (2, Decimal("30.75")))
+
+    def test_reingesting_a_file_leaves_the_rollups_unchanged(self):
+        BatchIngestor().ingest(self.rows)
+        before = rollup_totals()
+        BatchIngestor().ingest(self.rows + [make_row("ref1", "666-66-6666", balance="1.00")])
+
+        after = rollup_totals()
+        client = Client.objects.get(reference_no="ref1")
+        key = (client.agency_id, client.pk, "IN_COLLECTION")
+        self.assertEqual(after.pop(key), (3, Decimal("31.75")))
+        before.pop(key)
+        self.assertEqual(after, before)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL only")
+    def test_copy_ingestion_adds_to_the_rollups(self):
+        CopyIngestor(batch_size=2).ingest(self.rows)
+        CopyIngestor().ingest(self.rows)
+
+        self.assert_rollups_match_debts()
+
+    def test_moving_a_client_moves_its_rollups(self):
+        BatchIngestor().ingest(self.rows)
+        client = Client.objects.get(reference_no="ref1")
+        client.agency = self.other_agency
+        client.save()
+
+        self.assert_rollups_match_debts()
+
+    def test_rebuild_counts_debts_written_outside_ingestion(self):
+        BatchIngestor().ingest(self.rows)
+        client = Client.objects.get(reference_no="ref2")
+        Debt.objects.create(balance=7, status="DISPUTED", client=client)
+        Debt.objects.filter(client__reference_no="ref3").delete()
+
+        self.assertEqual(rebuild_rollups(), 4)
+        self.assert_rollups_match_debts()
+
+    def test_rebuild_command(self):
+        client = Client.objects.create(name="Client", agency=self.agency, reference_no="ref9")
+        Debt.objects.create(balance=7, status="DISPUTED", client=client)
+        out = io.StringIO()
+        call_command("rebuild_rollups", stdout=out)
+
+        self.assertIn("Rebuilt 1 rollups.", out.getvalue())
+        self.assert_rollups_match_debts()
+
+
+class SummaryTests(TestCase):
+    def setUp(self):
+        self.client = HttpClient()
+        self.agency = CollectionAgency.objects.create(name="Agency A")
+        self.other_agency = CollectionAgency.objects.create(name="Agency B")
+        BatchIngestor(default_agency_id=self.agency.pk).ingest(
+            [
+                make_row("ref1", "111-11-1111", balance="10.50"),
+                make_row("ref1", "222-22-2222", balance="20.25"),
+                make_row("ref1", "333-33-3333", balance="5.00", status="PAID_IN_FULL"),
+                make_row("ref2", "444-44-4444", agency_id=str(self.other_agency.pk)),
+            ]
+        )
+        self.url = reverse("accounts-summary")
+
+    def test_summarize_by_status(self):
+        summary = summarize(["status"])
+
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual(summary["balance"], Decimal("135.75"))
+        self.assertEqual(
+            summary["results"],
+            [
+                {"status": "IN_COLLECTION", "debts": 3, "balance": Decimal("130.75")},
+                {"status": "PAID_IN_FULL", "debts": 1, "balance": Decimal("5.00")},
+            ],
+        )
+
+    def test_summarize_by_agency_and_status_with_filters(self):
+        summary = summarize(["agency", "status"], agency_id=self.agency.pk, status="IN_COLLECTION")
+
+        self.assertEqual(summary["count"], 2)
+        self.assertEqual(
+            summary["results"],
+            [
+                {
+                    "agency": self.agency.pk,
+                    "status": "IN_COLLECTION",
+                    "debts": 2,
+                    "balance": Decimal("30.75"),
+                }
+            ],
+        )
+
+    def test_summary_endpoint(self):
+        # the totals and the groups, whatever the number of debts
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"group_by": "client"})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["count"], data["balance"]), (4, "135.75"))
+        self.assertEqual(
+            [(group["client"], group["debts"], group["balance"]) for group in data["results"]],
+            [
+                (Client.objects.get(reference_no="ref1").pk, 3, "35.75"),
+                (Client.objects.get(reference_no="ref2").pk, 1, "100.00"),
+            ],
+        )
+
+    def test_summary_without_groups(self):
+        response = self.client.get(self.url, {"group_by": "", "status": "NONE"})
+
+        self.assertEqual(response.json(), {"count": 0, "balance": "0.00", "results": []})
+
+    def test_invalid_group(self):
+        response = self.client.get(self.url, {"group_by": "status,consumer"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_agency_id(self):
+        response = self.client.get(self.url, {"agency_id": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_method(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 405)
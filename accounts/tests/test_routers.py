@@ -0,0 +1,125 @@
+"""Test the routing of the account reads to the read replicas"""
+
+import io
+import time
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import Client as ClientModel, CollectionAgency, Consumer, Debt
+from accounts.rollups import rebuild_rollups
+from accounts.routers import PIN_COOKIE, PIN_HEADER, ReplicaRouter
+
+HEADER = "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+
+
+def create_debt(balance, consumer_name, ssn, client):
+    debt = Debt.objects.create(balance=balance, status="IN_COLLECTION", client=client)
+    debt.consumers.add(Consumer.objects.create(name=consumer_name, ssn=ssn))
+    return debt
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(TransactionTestCase):
+    """The replica is a test mirror of the primary: the queries tell which one was read.
+
+    The mirror only sees what the primary committed, hence the transaction test case.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.client = APIClient()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        self.client_obj = ClientModel.objects.create(
+            name="Client 1", agency=agency, reference_no="ref1"
+        )
+        create_debt("100.00", "Rita", "111-11-1111", self.client_obj)
+        self.addCleanup(cache.clear)
+
+    def read(self, url, params=None, client=None, **headers):
+        """Sends a GET request and returns the response and the databases it read."""
+        with (
+            CaptureQueriesContext(connections["default"]) as primary,
+            CaptureQueriesContext(connections["replica"]) as replica,
+        ):
+            response = (client or self.client).get(url, params, headers=headers)
+            if response.streaming:  # the rows are read while streaming
+                response.streaming_content = [b"".join(response.streaming_content)]
+        self.assertEqual(response.status_code, 200)
+        read = {alias for alias, queries in [("default", primary), ("replica", replica)] if queries}
+        return response, read
+
+    def test_list_reads_the_replica(self):
+        response, read = self.read(reverse("accounts-list"), {"consumer_name": "rita"})
+        self.assertEqual(read, {"replica"})
+        self.assertEqual(response.data["count"], 1)
+
+    def test_export_reads_the_replica(self):
+        response, read = self.read(reverse("accounts-export"), {"format": "ndjson"})
+        self.assertEqual(read, {"replica"})
+        self.assertIn("Rita", b"".join(response.streaming_content).decode())
+
+    def test_summary_reads_the_replica(self):
+        rebuild_rollups()
+        response, read = self.read(reverse("accounts-summary"))
+        self.assertEqual(read, {"replica"})
+        self.assertEqual(response.json()["balance"], "100.00")
+
+    def test_upload_pins_the_client_to_the_primary(self):
+        file = io.StringIO(HEADER + "ref1,10.00,IN_COLLECTION,Bob,Elm St,222-22-2222,\n")
+        file.name = "test.csv"
+        response = self.client.post(reverse("upload-csv"), {"file": file})
+
+        self.assertEqual(response.status_code, 200)
+        until = int(response[PIN_HEADER])
+        self.assertGreater(until, time.time())
+        self.assertEqual(response.cookies[PIN_COOKIE].value, str(until))
+        # the cookie is sent back: the new debt is read from the primary
+        response, read = self.read(reverse("accounts-list"))
+        self.assertEqual(read, {"default"})
+        self.assertEqual(response.data["count"], 2)
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=300)
+    def test_pinned_client_does_not_get_a_page_cached_from_the_replica(self):
+        file = io.StringIO(HEADER + "ref1,10.00,IN_COLLECTION,Bob,Elm St,222-22-2222,\n")
+        file.name = "test.csv"
+        self.client.post(reverse("upload-csv"), {"file": file})
+
+        # another client caches the replica's page under the new generation; a debt
+        # created without bumping the generation then stands for the rows the lagging
+        # replica did not have yet
+        response, _ = self.read(reverse("accounts-list"), client=APIClient())
+        self.assertEqual(response.data["count"], 2)
+        create_debt("20.00", "Alice", "333-33-3333", self.client_obj)
+
+        response, read = self.read(reverse("accounts-list"))
+        self.assertEqual(read, {"default"})
+        self.assertEqual(response.data["count"], 3)
+
+    def test_pin_header(self):
+        until = str(int(time.time()) + 60)
+        _, read = self.read(reverse("accounts-list"), **{PIN_HEADER: until})
+        self.assertEqual(read, {"default"})
+
+    def test_expired_or_invalid_pin_reads_the_replica(self):
+        until = str(int(time.time()) - 1)
+        _, read = self.read(reverse("accounts-list"), **{PIN_HEADER: until})
+        self.assertEqual(read, {"replica"})
+        self.client.cookies[PIN_COOKIE] = "tomorrow"
+        _, read = self.read(reverse("accounts-list"))
+        self.assertEqual(read, {"replica"})
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_primary_without_replicas(self):
+        _, read = self.read(reverse("accounts-list"))
+        self.assertEqual(read, {"default"})
+
+    def test_writes_go_to_the_primary(self):
+        debt = Debt.objects.using("replica").get()
+        self.assertEqual(ReplicaRouter().db_for_write(Debt, instance=debt), "default")
+        self.assertTrue(ReplicaRouter().allow_relation(debt, Debt.objects.get()))
@@ -0,0 +1,89 @@
+"""Test the consumer name search"""
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from accounts.counts import get_row_count, install_row_count_triggers
+from accounts.models import Client, CollectionAgency, Consumer, Debt
+from accounts.search import FTS_TABLE, has_fts_index, install_name_search, matching_consumers
+
+
+def trgm_index_exists():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'accounts_consumer_name_trgm'")
+        return cursor.fetchone() is not None
+
+
+class MatchingConsumersTests(TestCase):
+    def setUp(self):
+        self.alice = Consumer.objects.create(name="Alice Johnson", ssn="111-11-1111")
+        self.bob = Consumer.objects.create(name='Bob "The Builder" Smith', ssn="222-22-2222")
+        Consumer.objects.bulk_create(
+            [Consumer(name="Carlos García", ssn="333-33-3333"), Consumer(name="Jo", ssn="")]
+        )
+
+    def names(self, term):
+        return sorted(matching_consumers(term).values_list("name", flat=True))
+
+    def test_substring_ignores_case(self):
+        self.assertEqual(self.names("JOHN"), ["Alice Johnson"])
+        self.assertEqual(self.names("garcía"), ["Carlos García"])
+        self.assertEqual(self.names("nobody"), [])
+
+    def test_short_terms(self):
+        self.assertEqual(self.names("jo"), ["Alice Johnson", "Jo"])
+
+    def test_quotes_are_matched_literally(self):
+        self.assertEqual(self.names('"The Builder"'), ['Bob "The Builder" Smith'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.alice.name = "Alicia Keys"
+        self.alice.save()
+        self.bob.delete()
+
+        self.assertEqual(self.names("John"), [])
+        self.assertEqual(self.names("Keys"), ["Alicia Keys"])
+        self.assertEqual(self.names("Builder"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_sqlite_uses_fts_table(self):
+        self.assertTrue(has_fts_index(connection))
+        self.assertIn(FTS_TABLE, str(matching_consumers("John").query))
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_missing_triggers_are_recreated(self):
+        """SQLite drops triggers when a migration rebuilds their table."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {FTS_TABLE}_insert")
+        Consumer.objects.create(name="Dana Scully", ssn="444-44-4444")
+
+        install_name_search(connection)
+
+        self.assertEqual(self.names("Scully"), ["Dana Scully"])
+
+    @skipUnless(trgm_index_exists(), "pg_trgm not available")
+    def test_postgresql_uses_trigram_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = matching_consumers("John").explain()
+        self.assertIn("accounts_consumer_name_trgm", plan)
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite only")
+class RowCountTriggerTests(TestCase):
+    def test_missing_triggers_reset_the_counter(self):
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = Client.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        Debt.objects.create(balance=10, client=client)
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER accounts_debt_count_insert")
+        Debt.objects.create(balance=20, client=client)
+
+        install_row_count_triggers(connection)
+        Debt.objects.create(balance=30, client=client)
+
+        self.assertEqual(get_row_count(Debt), 3)
@@ -1 +1,59 @@
 """Test serializers"""
+
+from django.db.models import Prefetch
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import Client, CollectionAgency, Consumer, Debt
+from accounts.serializers import DEBT_ROW_FIELDS, DebtSerializer, serialize_debt_rows
+
+
+class SerializeDebtRowsTests(TestCase):
+    def setUp(self):
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = Client.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        consumers = [
+            Consumer.objects.create(name="Zoë Ünal", address="1 Main St", ssn="111-11-1111"),
+            Consumer.objects.create(
+                name="ACME Holdings", address="2 Main St", ssn="222-22-2222", is_entity=True
+            ),
+            Consumer.objects.create(name='Bob "B" O\'Neil', address="3 Oak", ssn="333-33-3333"),
+        ]
+        balances = ["100.00", "0.01", "12345678.90", "7.50"]
+        for i, balance in enumerate(balances):
+            debt = Debt.objects.create(
+                balance=balance,
+                status="IN_COLLECTION",
+                client_reference_no=f"ref{i}",
+                client=client,
+            )
+            # added in reverse so the link rows are not in id order
+            debt.consumers.add(*reversed(consumers[: i % 4]))
+
+    def render_both(self, debts):
+        expected = DebtSerializer(
+            debts.prefetch_related(Prefetch("consumers", Consumer.objects.order_by("id"))),
+            many=True,
+        ).data
+        actual = serialize_debt_rows(debts.values_list(*DEBT_ROW_FIELDS, named=True))
+        return JSONRenderer().render(expected), JSONRenderer().render(actual)
+
+    def test_output_is_identical_to_debt_serializer(self):
+        expected, actual = self.render_both(Debt.objects.order_by("created_at", "id"))
+        self.assertEqual(actual, expected)
+        self.assertIn("Zoë".encode("utf-8"), actual)
+
+    def test_one_query_for_the_consumers_of_the_page(self):
+        rows = list(Debt.objects.values_list(*DEBT_ROW_FIELDS, named=True))
+        with self.assertNumQueries(1):
+            serialize_debt_rows(rows)
+
+    def test_no_rows(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(serialize_debt_rows([]), [])
+
+    def test_selected_fields_without_consumers_need_no_query(self):
+        rows = list(Debt.objects.order_by("id").values_list(*DEBT_ROW_FIELDS, named=True))
+        with self.assertNumQueries(0):
+            data = serialize_debt_rows(rows, fields=("status", "id"))
+        self.assertEqual(data[0], {"id": rows[0].id, "status": "IN_COLLECTION"})
@@ -0,0 +1,59 @@
+"""Test the SQLite tuning for concurrent readers and writer"""
+
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import SimpleTestCase
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite only")
+class SQLiteConcurrencyTests(SimpleTestCase):
+    """Uses a database file: the in-memory test database cannot use WAL journaling."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "db.sqlite3")
+
+    def connect(self):
+        default = connections[DEFAULT_DB_ALIAS]
+        wrapper = type(default)({**default.settings_dict, "NAME": self.path}, "concurrency")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def fetch(self, wrapper, sql):
+        with wrapper.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()[0]
+
+    def test_connections_are_tuned(self):
+        wrapper = self.connect()
+        self.assertEqual(self.fetch(wrapper, "PRAGMA journal_mode"), "wal")
+        self.assertEqual(self.fetch(wrapper, "PRAGMA synchronous"), 1)  # NORMAL
+        self.assertGreater(self.fetch(wrapper, "PRAGMA busy_timeout"), 0)
+        self.assertEqual(wrapper.transaction_mode, "IMMEDIATE")
+
+    def test_writer_commits_while_a_reader_is_reading(self):
+        writer, reader = self.connect(), self.connect()
+        with writer.cursor() as cursor:
+            cursor.execute("CREATE TABLE debt (balance INTEGER)")
+
+        # a list request in the middle of its read transaction
+        with reader.cursor() as cursor:
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT COUNT(*) FROM debt")
+
+        # an ingest batch, started like Django's atomic() starts it
+        with writer.cursor() as cursor:
+            cursor.execute(f"BEGIN {writer.transaction_mode}")
+            cursor.execute("INSERT INTO debt VALUES (100)")
+            cursor.execute("COMMIT")
+
+        # the reader keeps its snapshot until its transaction ends
+        self.assertEqual(self.fetch(reader, "SELECT COUNT(*) FROM debt"), 0)
+        with reader.cursor() as cursor:
+            cursor.execute("COMMIT")
+        self.assertEqual(self.fetch(reader, "SELECT COUNT(*) FROM debt"), 1)
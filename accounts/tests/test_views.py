@@ -1,11 +1,37 @@
 # accounts/tests/test_views.py
 
+import csv
 import io
-from django.test import TestCase, Client
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date
 
-from accounts.models import Client as ClientModel, Consumer, Debt, CollectionAgency
-from rest_framework.test import APIClient
+from accounts.caching import bump_generations, get_generation
+from accounts.ingestion import BatchIngestor
+from accounts.views import AccountListView
+from accounts.models import (
+    Client as ClientModel,
+    Consumer,
+    Debt,
+    CollectionAgency,
+    IngestJob,
+    RowCount,
+)
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 
 
 class AccountListViewTests(TestCase):
@@ -39,6 +65,8 @@ class AccountListViewTests(TestCase):
         )
         self.debt2.consumers.add(self.consumer2)
         self.url = reverse("accounts-list")
+        # list totals are cached for identical filters
+        self.addCleanup(cache.clear)
 
     def test_list_all_debts(self):
         """Should return all debts with no filters applied."""
@@ -80,6 +108,27 @@ class AccountListViewTests(TestCase):
         self.assertEqual(len(response.data["results"]), 1)
         self.assertIn("Alice", response.data["results"][0]["consumers"][0]["name"])
 
+    def test_consumer_name_matching_several_consumers_returns_debt_once(self):
+        self.debt1.consumers.add(Consumer.objects.create(name="Alicia", ssn="333-33-3333"))
+        response = self.client.get(self.url, {"consumer_name": "ali"})
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual([debt["id"] for debt in response.data["results"]], [self.debt1.pk])
+
+    def test_list_queries_need_no_distinct_or_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.url,
+                {"consumer_name": "ali", "status": "IN_COLLECTION", "agency_id": self.agency.pk},
+            )
+        self.assertEqual(response.status_code, 200)
+        # newest debt (for the ETag), count, page and the consumers of the page
+        self.assertEqual(len(queries), 4)
+        newest_sql, count_sql, page_sql, _ = [query["sql"].upper() for query in queries]
+        for sql in (newest_sql, count_sql, page_sql):
+            self.assertNotIn("DISTINCT", sql)
+            self.assertIn("EXISTS", sql)
+        self.assertNotIn("JOIN", page_sql)
+
     def test_filter_by_min_balance_no_match(self):
         """Should return no debts if min_balance is higher than any debt balance."""
         response = self.client.get(self.url, {"min_balance": 250})
@@ -167,6 +216,470 @@ class AccountListViewTests(TestCase):
         self.assertEqual(len(response.data["results"]), 0)
 
 
+@skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+class AccountListPlanTests(TestCase):
+    STATUSES = ["IN_COLLECTION", "PAID_IN_FULL", "INACTIVE", "DISPUTED"]
+
+    def setUp(self):
+        agencies = CollectionAgency.objects.bulk_create(
+            CollectionAgency(name=f"Agency {i}") for i in range(20)
+        )
+        self.agency = agencies[0]
+        clients = ClientModel.objects.bulk_create(
+            ClientModel(name=f"Client {i}", agency=agency, reference_no=f"ref{i}")
+            for i, agency in enumerate(agencies)
+        )
+        Debt.objects.bulk_create(
+            Debt(
+                balance=i % 500 + 1,
+                status=self.STATUSES[i // 20 % 4],
+                client_reference_no=clients[i % 20].reference_no,
+                client=clients[i % 20],
+                agency=agencies[i % 20],
+            )
+            for i in range(4000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE accounts_debt")
+            # the tables are tiny: make the planner pick the indexes it would use at scale
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def plan(self, **params):
+        view = AccountListView()
+        view.request = Request(APIRequestFactory().get(reverse("accounts-list"), params))
+        return view.get_queryset()[:50].explain()
+
+    def test_page_is_an_index_scan_with_limit(self):
+        plan = self.plan()
+        self.assertTrue(plan.startswith("Limit"), plan)
+        self.assertIn("Index Scan using accounts_de_created_379acb_idx", plan)
+        self.assertNotIn("Sort", plan)
+        self.assertNotIn("Unique", plan)
+
+    def test_agency_dashboard_filter_is_a_single_index_range_scan(self):
+        plan = self.plan(agency_id=self.agency.pk, status="IN_COLLECTION", min_balance=10)
+        self.assertIn("accounts_de_agency__ae6386_idx", plan)
+        self.assertNotIn("Join", plan)
+        self.assertNotIn("Nested Loop", plan)
+
+    def test_consumer_filter_is_a_semi_join(self):
+        plan = self.plan(consumer_name="Alice", min_balance=10)
+        self.assertTrue(plan.startswith("Limit"), plan)
+        # the planner may deduplicate the (few) matching consumer links, but never the
+        # debt rows themselves
+        self.assertNotIn("Unique", plan)
+        self.assertNotIn("Group Key: accounts_debt.", plan)
+
+
+class CountModeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        for i in range(5):
+            Debt.objects.create(
+                balance=i + 1, status="IN_COLLECTION", client_reference_no="ref1", client=client
+            )
+        self.url = reverse("accounts-list")
+        self.addCleanup(cache.clear)
+
+    def test_exact_count_is_cached_for_identical_filters(self):
+        with self.assertNumQueries(4):  # newest debt, count, page and consumers
+            response = self.client.get(self.url, {"min_balance": 2, "limit": 2})
+        self.assertEqual(response.data["count"], 4)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {"limit": 2, "offset": 2, "min_balance": 2})
+        self.assertEqual(response.data["count"], 4)
+
+    def test_estimated_count(self):
+        response = self.client.get(self.url, {"count": "estimated"})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.data["count"], 0)
+        if connection.vendor == "sqlite":
+            self.assertEqual(response.data["count"], 5)
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_sqlite_counter_follows_inserts_and_deletes(self):
+        Debt.objects.filter(balance__lte=2).delete()
+        response = self.client.get(self.url, {"count": "estimated"})
+        self.assertEqual(response.data["count"], 3)
+
+        RowCount.objects.all().delete()
+        response = self.client.get(self.url, {"count": "estimated"})
+        self.assertEqual(response.data["count"], 3)
+
+    def test_no_count(self):
+        with self.assertNumQueries(3):  # newest debt, the page and its consumers
+            response = self.client.get(self.url, {"count": "none", "limit": 2, "offset": 2})
+        self.assertIsNone(response.data["count"])
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIn("offset=4", response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+        response = self.client.get(self.url, {"count": "none", "limit": 2, "offset": 3})
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNone(response.data["next"])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        created_at = timezone.now()
+        self.debts = Debt.objects.bulk_create(
+            Debt(
+                balance=i + 1,
+                status="IN_COLLECTION",
+                client_reference_no="ref1",
+                client=client,
+                agency=agency,
+            )
+            for i in range(7)
+        )
+        # several debts share a timestamp, as with bulk ingestion
+        for i, debt in enumerate(self.debts):
+            Debt.objects.filter(pk=debt.pk).update(
+                created_at=created_at + timedelta(seconds=i // 3)
+            )
+        self.url = reverse("accounts-list")
+        self.addCleanup(cache.clear)
+
+    def crawl(self, params):
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            ids += [debt["id"] for debt in response.data["results"]]
+            if not response.data["next"]:
+                return ids
+            response = self.client.get(response.data["next"])
+
+    def test_cursor_pages_cover_every_debt_once(self):
+        ids = self.crawl({"pagination": "cursor", "limit": 2})
+        self.assertEqual(ids, [debt.pk for debt in self.debts])
+
+    def test_cursor_page_query_count_does_not_depend_on_depth(self):
+        first = self.client.get(self.url, {"pagination": "cursor", "limit": 2})
+        with self.assertNumQueries(3):  # newest debt, the page and its consumers, no COUNT
+            self.client.get(first.data["next"])
+
+    def test_rows_deleted_during_crawl_do_not_shift_pages(self):
+        first = self.client.get(self.url, {"pagination": "cursor", "limit": 3})
+        Debt.objects.filter(pk=self.debts[0].pk).delete()
+        second = self.client.get(first.data["next"])
+        self.assertEqual(
+            [debt["id"] for debt in second.data["results"]], [d.pk for d in self.debts[3:6]]
+        )
+
+    def test_cursor_with_filters(self):
+        ids = self.crawl({"pagination": "cursor", "limit": 2, "min_balance": 4})
+        self.assertEqual(ids, [debt.pk for debt in self.debts[3:]])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_offset_pagination_is_the_default(self):
+        response = self.client.get(self.url, {"limit": 2, "offset": 2})
+        self.assertEqual(response.data["count"], 7)
+
+
+@override_settings(ACCOUNT_LIST_CACHE_SECONDS=300)
+class AccountListCacheTests(TestCase):
+    HEADER = "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agency_a = CollectionAgency.objects.create(name="Agency A")
+        self.agency_b = CollectionAgency.objects.create(name="Agency B")
+        self.client_a = ClientModel.objects.create(
+            name="Client A", agency=self.agency_a, reference_no="refA"
+        )
+        Debt.objects.create(balance=100, status="IN_COLLECTION", client=self.client_a)
+        self.url = reverse("accounts-list")
+        self.addCleanup(cache.clear)
+
+    def upload(self, rows):
+        file = io.StringIO(self.HEADER + rows)
+        file.name = "test.csv"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+    def test_identical_requests_are_served_from_cache(self):
+        first = self.client.get(self.url, {"status": "IN_COLLECTION", "limit": 10})
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {"limit": 10, "status": "IN_COLLECTION", "x": ""})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+
+    def test_ingest_invalidates_cached_lists(self):
+        self.client.get(self.url)
+        self.upload(f"refB,50.00,IN_COLLECTION,Bob,Elm St,222-22-2222,{self.agency_b.pk}\n")
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_ingest_only_invalidates_the_agencies_it_touched(self):
+        self.client.get(self.url, {"agency_id": self.agency_a.pk})
+        self.client.get(self.url, {"agency_id": self.agency_b.pk})
+        self.upload(f"refB,50.00,IN_COLLECTION,Bob,Elm St,222-22-2222,{self.agency_b.pk}\n")
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {"agency_id": self.agency_a.pk})
+        response = self.client.get(self.url, {"agency_id": self.agency_b.pk})
+        self.assertEqual(response.data["count"], 1)
+
+    def test_moving_a_client_invalidates_both_agencies(self):
+        self.client.get(self.url, {"agency_id": self.agency_b.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_a.agency = self.agency_b
+            self.client_a.save()
+
+        response = self.client.get(self.url, {"agency_id": self.agency_b.pk})
+        self.assertEqual(response.data["count"], 1)
+
+    def test_evicted_generation_is_not_reused(self):
+        before = get_generation(self.agency_a.pk)
+        cache.clear()
+        bump_generations([self.agency_a.pk])
+        self.assertNotEqual(get_generation(self.agency_a.pk), before)
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=0)
+    def test_cache_can_be_disabled(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(3):  # newest debt, page and consumers; the total is cached
+            self.client.get(self.url)
+
+    def test_file_and_database_backends(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backends = [
+            {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": directory,
+            },
+            {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "test_cache"},
+        ]
+        for backend in backends:
+            with self.subTest(backend=backend["BACKEND"]), override_settings(
+                CACHES={"default": backend}
+            ):
+                call_command("createcachetable", verbosity=0)
+                self.client.get(self.url)
+                # the database cache costs a generation and a response lookup
+                with self.assertNumQueries(0 if "filebased" in backend["BACKEND"] else 2):
+                    response = self.client.get(self.url)
+                self.assertEqual(response.data["count"], 1)
+                self.upload(f"refB,50.00,IN_COLLECTION,Bob,Elm St,222-22-2222,{self.agency_b.pk}\n")
+                self.assertEqual(self.client.get(self.url).data["count"], 2)
+                Debt.objects.filter(client_reference_no="refB").delete()
+                cache.clear()
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        agency = CollectionAgency.objects.create(name="Agency A")
+        client = ClientModel.objects.create(name="Client 1", agency=agency, reference_no="ref1")
+        consumer = Consumer.objects.create(name="Alice", address="1 Main", ssn="111-11-1111")
+        for i in range(3):
+            debt = Debt.objects.create(balance=i + 1, status="IN_COLLECTION", client=client)
+            debt.consumers.add(consumer)
+        self.url = reverse("accounts-list")
+        self.addCleanup(cache.clear)
+
+    def test_only_the_requested_fields_are_returned(self):
+        response = self.client.get(self.url, {"fields": "status,id,balance"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data["results"][0]), ["id", "balance", "status"])
+        self.assertEqual(response.data["results"][0]["balance"], "1.00")
+
+    def test_consumers_are_not_queried_unless_requested(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"fields": "id,balance,status"})
+        self.assertEqual(len(queries), 3)  # newest debt, count and page
+        for query in queries:
+            self.assertNotIn("accounts_debt_consumers", query["sql"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"fields": "id,consumers"})
+        self.assertEqual(response.data["results"][0]["consumers"][0]["name"], "Alice")
+        self.assertIn("accounts_debt_consumers", queries[-1]["sql"])
+
+    def test_fields_with_cursor_pagination(self):
+        response = self.client.get(self.url, {"fields": "id", "pagination": "cursor", "limit": 2})
+        self.assertEqual(
+            response.data["results"], [{"id": debt.pk} for debt in Debt.objects.all()[:2]]
+        )
+        second = self.client.get(response.data["next"])
+        self.assertEqual(list(second.data["results"][0]), ["id"])
+
+    def test_unknown_field(self):
+        response = self.client.get(self.url, {"fields": "id,fingerprint"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("fingerprint", str(response.data["fields"]))
+
+
+@override_settings(ACCOUNT_LIST_CACHE_SECONDS=300)
+class ConditionalListTests(TestCase):
+    HEADER = AccountListCacheTests.HEADER
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agency = CollectionAgency.objects.create(name="Agency A")
+        self.client_obj = ClientModel.objects.create(
+            name="Client 1", agency=self.agency, reference_no="ref1"
+        )
+        self.debt = Debt.objects.create(balance=100, status="IN_COLLECTION", client=self.client_obj)
+        self.url = reverse("accounts-list")
+        self.addCleanup(cache.clear)
+
+    def test_validators_are_sent(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(response["Last-Modified"], http_date(self.debt.created_at.timestamp()))
+
+    def test_unchanged_page_returns_304_from_the_cache(self):
+        etag = self.client.get(self.url, {"limit": 10})["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"limit": 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=0)
+    def test_unchanged_page_returns_304_without_fetching_it(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(1):  # the newest debt only
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_the_request(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, {"fields": "id"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=0)
+    def test_new_debt_changes_the_validators(self):
+        etag = self.client.get(self.url)["ETag"]
+        Debt.objects.create(
+            balance=5,
+            status="IN_COLLECTION",
+            client=self.client_obj,
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(ACCOUNT_LIST_CACHE_SECONDS=0)
+    def test_moved_client_changes_the_last_modified(self):
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        other = CollectionAgency.objects.create(name="Agency B")
+        with mock.patch("accounts.caching.time.time", return_value=time.time() + 5):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client_obj.agency = other
+                self.client_obj.save()
+
+        # no debt was created: the list still changed, for the agency filter
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(
+            parse_http_date(response["Last-Modified"]), parse_http_date(last_modified)
+        )
+        response = self.client.get(
+            self.url, {"agency_id": other.pk}, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_ingest_changes_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        file = io.StringIO(self.HEADER + "ref1,50.00,IN_COLLECTION,Bob,Elm St,222-22-2222,\n")
+        file.name = "test.csv"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+
+
+class ExportDebtsTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.agency = CollectionAgency.objects.create(name="Agency A")
+        self.other_agency = CollectionAgency.objects.create(name="Agency B")
+        client = ClientModel.objects.create(name="Client 1", agency=self.agency, reference_no="r1")
+        other = ClientModel.objects.create(
+            name="Client 2", agency=self.other_agency, reference_no="r2"
+        )
+        self.alice = Consumer.objects.create(name="Alice, Jr.", address="1 Main", ssn="111-11-1111")
+        acme = Consumer.objects.create(
+            name="ACME", address="2 Main", ssn="222-22-2222", is_entity=True
+        )
+        self.debts = []
+        for i in range(5):
+            debt = Debt.objects.create(
+                balance=100 + i, status="IN_COLLECTION", client_reference_no=f"r{i}", client=client
+            )
+            debt.consumers.add(self.alice, acme)
+            self.debts.append(debt)
+        self.lone_debt = Debt.objects.create(balance=5, status="PAID_IN_FULL", client=other)
+        self.url = reverse("accounts-export")
+        self.addCleanup(cache.clear)
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_csv_has_a_line_per_debt_and_consumer(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="debts.csv"', response["Content-Disposition"])
+
+        lines = list(csv.reader(io.StringIO(self.export())))
+        self.assertEqual(lines[0][:4], ["id", "balance", "status", "client"])
+        self.assertEqual(len(lines), 1 + 5 * 2 + 1)
+        self.assertEqual(lines[1][4:], [str(self.alice.pk), "Alice, Jr.", "False"])
+        # a debt without consumers still gets its line
+        self.assertEqual(lines[-1][:2], [str(self.lone_debt.pk), "5.00"])
+        self.assertEqual(lines[-1][4:], ["", "", ""])
+
+    def test_ndjson_matches_the_account_list(self):
+        lines = self.export(format="ndjson", agency_id=self.agency.pk).splitlines()
+        listed = APIClient().get(
+            reverse("accounts-list"), {"agency_id": self.agency.pk, "limit": 100}
+        )
+        self.assertEqual([json.loads(line) for line in lines], listed.json()["results"])
+
+    def test_list_filters_apply(self):
+        lines = self.export(format="ndjson", min_balance=103, consumer_name="acme").splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [d.pk for d in self.debts[3:]])
+
+    @override_settings(ACCOUNT_EXPORT_CHUNK_SIZE=2)
+    def test_rows_are_fetched_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            lines = self.export(format="ndjson").splitlines()
+        self.assertEqual(len(lines), 6)
+        # the debts, then the consumers of each chunk of two
+        self.assertEqual(len(queries), 1 + 3)
+
+    def test_invalid_format(self):
+        response = self.client.get(self.url, {"format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_method(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 405)
+
+
 class UploadCSVTests(TestCase):
     def setUp(self):
         self.client = Client()
@@ -210,6 +723,65 @@ abcd1234,200.00,PAID_IN_FULL,Jane Smith,"456 Elm St, Town",222-22-2222
         self.assertEqual(debt.client, client_obj)
         self.assertTrue(debt.consumers.exists())
 
+    def test_upload_csv_twice_reports_duplicates(self):
+        """Test that uploading the same file again skips every row as a duplicate."""
+        csv_content = """client reference no,balance,status,consumer name,consumer address,ssn
+abcd1234,100.50,IN_COLLECTION,John Doe,"123 Main St, City",111-11-1111
+abcd1234,200.00,PAID_IN_FULL,Jane Smith,"456 Elm St, Town",222-22-2222
+"""
+        for _ in range(2):
+            file = io.StringIO(csv_content)
+            file.name = "test.csv"
+            response = self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"], {"created": 0, "duplicated": 2, "failed": 0})
+        self.assertEqual(Debt.objects.count(), 2)
+
+    def test_upload_csv_rejects_invalid_rows(self):
+        """Test that rows failing validation are reported as failed without aborting the file."""
+        csv_content = """client reference no,balance,status,consumer name,consumer address,ssn
+abcd1234,oops,IN_COLLECTION,John Doe,Main St,111-11-1111
+abcd1234,-10.00,IN_COLLECTION,John Doe,Main St,111-11-1111
+abcd1234,100.00,IN_COLLECTION,John Doe,Main St,12-345
+abcd1234,100.00,in collection,  John   Doe ,Main St,111111111
+"""
+        file = io.StringIO(csv_content)
+        file.name = "test.csv"
+
+        response = self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"], {"created": 1, "duplicated": 0, "failed": 3})
+        debt = Debt.objects.get()
+        self.assertEqual(debt.status, "IN_COLLECTION")
+        self.assertEqual(debt.consumers.get().ssn, "111-11-1111")
+        self.assertEqual(debt.consumers.get().name, "John Doe")
+
+    def test_status_filters_find_normalized_statuses(self):
+        """Test that the list and the summary filter on the status as the upload spelled it."""
+        csv_content = """client reference no,balance,status,consumer name,consumer address,ssn
+abcd1234,100.00,in_collection,John Doe,Main St,111-11-1111
+"""
+        file = io.StringIO(csv_content)
+        file.name = "test.csv"
+        self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        for status in ("in_collection", "In Collection", "IN_COLLECTION"):
+            with self.subTest(status=status):
+                response = self.client.get(reverse("accounts-list"), {"status": status})
+                self.assertEqual(response.json()["count"], 1)
+                response = self.client.get(reverse("accounts-summary"), {"status": status})
+                self.assertEqual(response.json()["count"], 1)
+
+    def test_upload_csv_invalid_resume_from(self):
+        file = io.StringIO("a,b\n")
+        file.name = "test.csv"
+        response = self.client.post(
+            reverse("upload-csv") + "?resume_from=abc", {"file": file}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 400)
+
     def test_upload_csv_missing_file(self):
         """Test that a POST request without a CSV file returns a 400 error with an appropriate message."""
 
@@ -239,6 +811,35 @@ abcd1234,200.00,PAID_IN_FULL,Jane Smith,"456 Elm St, Town",222-22-2222
         self.assertEqual(response.status_code, 500)
         self.assertIn("error", response.json())
 
+    def test_upload_csv_with_bom(self):
+        """Test that a UTF-8 BOM at the start of the file does not break the header."""
+        csv_content = (
+            "\ufeffclient reference no,balance,status,consumer name,consumer address,ssn\n"
+            "abcd1234,100.50,IN_COLLECTION,José Pérez,Main St,111-11-1111\n"
+        ).encode("utf-8")
+        file = io.BytesIO(csv_content)
+        file.name = "bom.csv"
+
+        response = self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["created"], 1)
+        self.assertEqual(Consumer.objects.get().name, "José Pérez")
+
+    def test_upload_csv_invalid_encoding(self):
+        """Test that a file that is not valid UTF-8 is rejected with the offending line."""
+        csv_content = (
+            b"client reference no,balance,status,consumer name,consumer address,ssn\n"
+            b"abcd1234,100.50,IN_COLLECTION,Jos\xe9,Main St,111-11-1111\n"
+        )
+        file = io.BytesIO(csv_content)
+        file.name = "latin1.csv"
+
+        response = self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 2", response.json()["error"])
+
     def test_upload_csv_with_valid_and_invalid_agency_id(self):
         """Test that uploading a CSV with both valid and invalid agency_id results in correct processing."""
 
@@ -287,3 +888,214 @@ abcd5678,200.00,PAID_IN_FULL,Jane Smith,"456 Elm St, Town",333-33-3333,999999
         # Verify client with the wrong agency_id was not created
         client_invalid = ClientModel.objects.filter(reference_no="abcd5678").first()
         self.assertIsNone(client_invalid)
+
+
+class UploadCheckpointTests(TransactionTestCase):
+    # the checkpoint moves when a batch commits, which a test transaction never does
+    def setUp(self):
+        self.client = Client()
+        CollectionAgency.objects.create(name="Agency X")
+        self.addCleanup(cache.clear)
+
+    @override_settings(CSV_INGEST_BATCH_SIZE=1, CSV_INGEST_USE_COPY=False)
+    def test_upload_csv_failure_returns_checkpoint_to_resume_from(self):
+        """Test that a failed upload reports its checkpoint and can be resumed from it."""
+        header = "client reference no,balance,status,consumer name,consumer address,ssn\n"
+        first = "abcd1234,100.50,IN_COLLECTION,John Doe,Main St,111-11-1111\n"
+        csv_content = (
+            header + first + "abcd1234,200.00,PAID_IN_FULL,Jane Smith,Elm St,222-22-2222\n"
+        )
+        file = io.StringIO(csv_content)
+        file.name = "test.csv"
+        ingest_batch = BatchIngestor.ingest_batch
+        batches = []
+
+        def interrupted_batch(ingestor, rows):
+            if batches:
+                raise OperationalError("server closed the connection unexpectedly")
+            batches.append(rows)
+            return ingest_batch(ingestor, rows)
+
+        with mock.patch.object(
+            BatchIngestor, "ingest_batch", autospec=True, side_effect=interrupted_batch
+        ):
+            response = self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+
+        self.assertEqual(response.status_code, 500)
+        checkpoint = response.json()["checkpoint"]
+        self.assertEqual(checkpoint["offset"], len(header + first))
+        self.assertEqual(checkpoint["created"], 1)
+
+        fixed = header + first + "abcd1234,200.00,PAID_IN_FULL,Jane Smith,Elm St,222-22-2222\n"
+        file = io.StringIO(fixed)
+        file.name = "test.csv"
+        response = self.client.post(
+            reverse("upload-csv") + f"?resume_from={checkpoint['offset']}",
+            {"file": file},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"], {"created": 1, "duplicated": 0, "failed": 0})
+        self.assertEqual(Debt.objects.count(), 2)
+
+    @override_settings(CSV_INGEST_BATCH_SIZE=1, CSV_INGEST_USE_COPY=False)
+    def test_uncommitted_batches_do_not_move_the_checkpoint(self):
+        """Test that a batch rolled back with its transaction is not in the checkpoint."""
+        csv_content = (
+            "client reference no,balance,status,consumer name,consumer address,ssn\n"
+            "abcd1234,100.50,IN_COLLECTION,John Doe,Main St,111-11-1111\n"
+        )
+        file = io.StringIO(csv_content)
+        file.name = "test.csv"
+
+        # the batch runs in a savepoint of a transaction that is then rolled back
+        with (
+            mock.patch("accounts.views.record_rows", side_effect=OperationalError("lost")),
+            transaction.atomic(),
+        ):
+            response = self.client.post(reverse("upload-csv"), {"file": file}, format="multipart")
+            transaction.set_rollback(True)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            response.json()["checkpoint"], {"offset": 0, "created": 0, "duplicated": 0, "failed": 0}
+        )
+        self.assertFalse(Debt.objects.exists())
+
+
+class UploadCSVJobTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, csv_content):
+        file = io.StringIO(csv_content)
+        file.name = "test.csv"
+        return self.client.post(
+            reverse("upload-csv") + "?async=1", {"file": file}, format="multipart"
+        )
+
+    def test_async_upload_returns_job_id(self):
+        """Test that an async upload is queued without ingesting any row."""
+        response = self.upload(
+            "client reference no,balance,status,consumer name,consumer address,ssn\n"
+            "abcd1234,100.50,IN_COLLECTION,John Doe,Main St,111-11-1111\n"
+        )
+
+        self.assertEqual(response.status_code, 202)
+        job = IngestJob.objects.get(pk=response.json()["data"]["job_id"])
+        self.assertEqual(job.status, IngestJob.QUEUED)
+        self.assertEqual(Debt.objects.count(), 0)
+
+    def test_job_status_after_worker_run(self):
+        """Test that the status endpoint reports the counters recorded by the worker."""
+        response = self.upload(
+            "client reference no,balance,status,consumer name,consumer address,ssn,agency_id\n"
+            "abcd1234,100.50,IN_COLLECTION,John Doe,Main St,111-11-1111,\n"
+            "abcd5678,200.00,PAID_IN_FULL,Jane Smith,Elm St,222-22-2222,999999\n"
+        )
+        job_id = response.json()["data"]["job_id"]
+
+        call_command("run_ingest_worker", "--once", stdout=io.StringIO())
+
+        response = self.client.get(reverse("upload-csv-status", args=[job_id]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["status"], IngestJob.DONE)
+        self.assertEqual(data["processed"], 2)
+        self.assertEqual(data["created"], 1)
+        self.assertEqual(data["failed"], 1)
+        self.assertEqual(Debt.objects.count(), 1)
+
+    def test_finished_job_deletes_its_file(self):
+        response = self.upload(
+            "client reference no,balance,status,consumer name,consumer address,ssn\n"
+            "abcd1234,100.50,IN_COLLECTION,John Doe,Main St,111-11-1111\n"
+        )
+        job = IngestJob.objects.get(pk=response.json()["data"]["job_id"])
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+
+        call_command("run_ingest_worker", "--once", stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestJob.DONE)
+        self.assertFalse(job.file)
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_job_files_are_purged(self):
+        response = self.upload("wrong,header,here\nbad,data,here")
+        job = IngestJob.objects.get(pk=response.json()["data"]["job_id"])
+        with self.assertLogs("accounts.ingestion.jobs", level="ERROR"):
+            call_command("run_ingest_worker", "--once", stdout=io.StringIO())
+        # kept for a retry until it is old enough
+        job.refresh_from_db()
+        self.assertTrue(os.path.exists(job.file.path))
+        path = job.file.path
+        IngestJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - timedelta(days=8))
+
+        out = io.StringIO()
+        call_command(
+            "run_ingest_worker", "--once", "--retry-failed", "--purge-failed-after", "7", stdout=out
+        )
+
+        self.assertIn("Purged the files of 1 failed ingest jobs.", out.getvalue())
+        job.refresh_from_db()
+        self.assertFalse(job.file)
+        self.assertFalse(os.path.exists(path))
+        # a purged job cannot be retried
+        call_command("run_ingest_worker", "--once", "--retry-failed", stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, IngestJob.FAILED)
+
+    def test_job_failure_is_reported(self):
+        """Test that a file that cannot be ingested marks the job as failed."""
+        response = self.upload("wrong,header,here\nbad,data,here")
+        job_id = response.json()["data"]["job_id"]
+
+        with self.assertLogs("accounts.ingestion.jobs", level="ERROR"):
+            call_command("run_ingest_worker", "--once", stdout=io.StringIO())
+
+        data = self.client.get(reverse("upload-csv-status", args=[job_id])).json()["data"]
+        self.assertEqual(data["status"], IngestJob.FAILED)
+        self.assertTrue(data["error"])
+
+    def test_interrupted_job_resumes_from_checkpoint(self):
+        """Test that a requeued job only ingests the rows after its checkpoint."""
+        header = "client reference no,balance,status,consumer name,consumer address,ssn\n"
+        first = "abcd1234,100.50,IN_COLLECTION,John Doe,Main St,111-11-1111\n"
+        csv_content = (
+            header + first + "abcd5678,200.00,PAID_IN_FULL,Jane Smith,Elm St,222-22-2222\n"
+        )
+        response = self.upload(csv_content)
+        job_id = response.json()["data"]["job_id"]
+        # the worker died after committing the first row
+        IngestJob.objects.filter(pk=job_id).update(
+            status=IngestJob.RUNNING,
+            byte_offset=len(header + first),
+            rows_processed=1,
+            rows_created=1,
+            heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+
+        out = io.StringIO()
+        call_command("run_ingest_worker", "--once", "--stale-after", "10", stdout=out)
+
+        self.assertIn("Requeued 1 interrupted ingest jobs.", out.getvalue())
+        data = self.client.get(reverse("upload-csv-status", args=[job_id])).json()["data"]
+        self.assertEqual(data["status"], IngestJob.DONE)
+        self.assertEqual(data["processed"], 2)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["checkpoint"]["offset"], len(csv_content))
+        self.assertEqual(
+            list(Debt.objects.values_list("client_reference_no", flat=True)), ["abcd5678"]
+        )
+
+    def test_job_status_not_found(self):
+        response = self.client.get(reverse("upload-csv-status", args=[999]))
+        self.assertEqual(response.status_code, 404)
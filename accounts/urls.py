@@ -1,9 +1,21 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
+
+# under ASGI the list, the export and the upload are served by their async versions
+if settings.SERVER_INTERFACE == "asgi":
+    account_list, upload_csv = async_views.account_list, async_views.upload_csv
+    export_debts = async_views.export_debts
+else:
+    account_list, upload_csv = views.AccountListView.as_view(), views.upload_csv
+    export_debts = views.export_debts
 
 # /accounts?min_balance=100&max_balance=1000&status=in_collection`
 urlpatterns = [
-    path("", views.AccountListView.as_view(), name="accounts-list"),
-    path("csv", views.upload_csv, name="upload-csv"),
+    path("", account_list, name="accounts-list"),
+    path("summary", views.debt_summary, name="accounts-summary"),
+    path("export", export_debts, name="accounts-export"),
+    path("csv", upload_csv, name="upload-csv"),
+    path("csv/<int:job_id>", views.upload_csv_status, name="upload-csv-status"),
 ]
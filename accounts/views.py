@@ -1,16 +1,41 @@
 """Views to handle accounts requests"""
 
 import csv
-import io
+import hashlib
+import json
+from functools import partial
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Exists, Max, OuterRef
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
+from rest_framework.response import Response
 
-from accounts.models import CollectionAgency, Client, Consumer, Debt
-from accounts.serializers import DebtSerializer
+from accounts.caching import alist_changed_at, list_cache_key, list_changed_at
+from accounts.ingestion import CSVEncodingError, CSVLineReader, ingest_rows
+from accounts.ingestion.jobs import enqueue_job, job_status
+from accounts.ingestion.validation import canonical_status
+from accounts.metrics import REGISTRY, record_rows, timing
+from accounts.models import Debt, IngestJob
+from accounts.serializers import (
+    DEBT_FIELDS,
+    DEBT_ROW_FIELDS,
+    DebtSerializer,
+    serialize_debt_rows,
+)
 import logging
-from accounts.pagination import CustomLimitOffsetPagination
+from accounts.pagination import CustomLimitOffsetPagination, KeysetPagination
+from accounts.rollups import GROUP_FIELDS, summarize
+from accounts.routers import pin_to_primary, read_database
+from accounts.search import matching_consumers
 
 logger = logging.getLogger(__name__)
 
@@ -19,30 +44,159 @@ class AccountListView(ListAPIView):
     serializer_class = DebtSerializer
     pagination_class = CustomLimitOffsetPagination
 
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or a cursor) switches to keyset pagination
+        if not hasattr(self, "_paginator") and KeysetPagination.requested(self.request):
+            self._paginator = KeysetPagination()
+        return super().paginator
+
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request.query_params)
+        key = list_cache_key(request, self.database)
+        timeout = self.cache_timeout()
+        cached = cache.get(key) if timeout else None
+        if cached is not None:
+            etag, last_modified = cached["etag"], cached["last_modified"]
+        else:
+            with timing("validators"):
+                etag, last_modified = self.validators(key)
+
+        # unchanged pages are answered before anything is fetched or serialized
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if cached is not None:
+            response = Response(cached["data"])
+        else:
+            response = self.list_rows(request, fields)
+            if timeout and response.status_code == 200:
+                cache.set(
+                    key,
+                    {"data": response.data, "etag": etag, "last_modified": last_modified},
+                    timeout,
+                )
+        return set_validators(response, etag, last_modified)
+
+    def cache_timeout(self):
+        """Returns how long the responses of this request may be cached, in seconds."""
+        timeout = settings.ACCOUNT_LIST_CACHE_SECONDS
+        if self.database != DEFAULT_DB_ALIAS:
+            # a lagging replica may answer with rows older than the generation
+            timeout = min(timeout, settings.DATABASE_REPLICA_LAG_SECONDS)
+        return timeout
+
+    def validators(self, key):
+        """Returns the ETag and Last-Modified timestamp of the list.
+
+        Both derive from the newest debt of the filtered list; the ETag also covers the
+        request (through its cache key, which includes the ingest generation). A change
+        that adds no debt, such as a client moved to another agency, only starts a new
+        generation: the list is last modified at the later of the two.
+        """
+        newest = self.filter_queryset(self.get_queryset()).aggregate(Max("created_at"))
+        return list_validators(key, newest["created_at__max"], list_changed_at(self.request))
+
+    async def avalidators(self, key):
+        """Async version of :meth:`validators`."""
+        queryset = self.filter_queryset(self.get_queryset())
+        newest = await queryset.aaggregate(Max("created_at"))
+        return list_validators(key, newest["created_at__max"], await alist_changed_at(self.request))
+
+    def list_rows(self, request, fields=DEBT_FIELDS):
+        """Lists the debts like ``ListAPIView.list`` without building model instances.
+
+        The page is read as plain rows and serialized by ``serialize_debt_rows``, which
+        produces the same data as ``DebtSerializer``; the consumers are only queried if
+        they are among the requested ``fields``.
+        """
+        rows = self.list_queryset()
+        page = self.paginate_queryset(rows)
+        with timing("serialize"):
+            data = serialize_debt_rows(list(rows) if page is None else page, fields, rows.db)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def list_queryset(self):
+        """Returns the filtered debts as the plain rows ``serialize_debt_rows`` takes."""
+        return self.filter_queryset(self.get_queryset()).values_list(*DEBT_ROW_FIELDS, named=True)
+
     def get_queryset(self):
-        queryset = Debt.objects.select_related("client__agency").prefetch_related("consumers").all()
-        min_balance = self.request.query_params.get("min_balance")
-        max_balance = self.request.query_params.get("max_balance")
-        consumer_name = self.request.query_params.get("consumer_name")
-        status = self.request.query_params.get("status")
-        agency_id = self.request.query_params.get("agency_id")
+        # DebtSerializer only needs client_id, so the client is not joined; rows are
+        # ordered by the (created_at, id) index so pages are stable and LIMIT is pushed
+        # down to the index scan. Consumers are read per page by list_rows().
+        queryset = Debt.objects.using(self.database).order_by("created_at", "id")
+        return filter_debts(queryset, self.request.query_params)
+
+    @cached_property
+    def database(self):
+        # a read replica, unless none is configured or the client just ingested
+        return read_database(self.request)
+
+
+def requested_fields(params):
+    """Returns the debt fields selected with ``?fields=``, all of them by default."""
+    fields = [name for name in params.get("fields", "").split(",") if name]
+    unknown = [name for name in fields if name not in DEBT_FIELDS]
+    if unknown:
+        raise ValidationError({"fields": f"Unknown fields: {', '.join(unknown)}"})
+    return fields or DEBT_FIELDS
+
+
+def list_validators(key, created_at, changed_at):
+    """Returns the ETag and Last-Modified timestamp of the list whose cache key is ``key``.
+
+    ``created_at`` is when its newest debt was created and ``changed_at`` when its
+    generation was last bumped (see :meth:`AccountListView.validators`).
+    """
+    etag = quote_etag(
+        hashlib.sha256(f"{key}|{created_at and created_at.isoformat()}".encode()).hexdigest()
+    )
+    last_modified = changed_at
+    if created_at is not None:
+        last_modified = max(last_modified, int(created_at.timestamp()))
+    return f"W/{etag}", last_modified or None
+
 
-        if agency_id:
-            queryset = queryset.filter(client__agency_id=agency_id)
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
 
-        if min_balance:
-            queryset = queryset.filter(balance__gte=min_balance)
 
-        if max_balance:
-            queryset = queryset.filter(balance__lte=max_balance)
+def filter_debts(queryset, params):
+    """Applies the account list filters found in ``params`` to a debt queryset."""
+    min_balance = params.get("min_balance")
+    max_balance = params.get("max_balance")
+    consumer_name = params.get("consumer_name")
+    status = params.get("status")
+    agency_id = params.get("agency_id")
 
-        if status:
-            queryset = queryset.filter(status=status)
+    if agency_id:
+        queryset = queryset.filter(agency_id=agency_id)
 
-        if consumer_name:
-            queryset = queryset.filter(consumers__name__icontains=consumer_name)
+    if min_balance:
+        queryset = queryset.filter(balance__gte=min_balance)
 
-        return queryset.distinct()
+    if max_balance:
+        queryset = queryset.filter(balance__lte=max_balance)
+
+    if status:
+        queryset = queryset.filter(status=canonical_status(status))
+
+    if consumer_name:
+        # a semi-join: unlike a join on the consumers, it cannot duplicate debts, so
+        # no DISTINCT is needed
+        debt_consumers = Debt.consumers.through.objects.filter(
+            debt_id=OuterRef("pk"),
+            consumer__in=matching_consumers(consumer_name, using=queryset.db),
+        )
+        queryset = queryset.filter(Exists(debt_consumers))
+
+    return queryset
 
 
 @csrf_exempt
@@ -53,73 +207,204 @@ def upload_csv(request):
     if "file" not in request.FILES:
         return JsonResponse({"error": "CSV file is required"}, status=400)
 
+    if request.GET.get("async") in ("1", "true"):
+        return queue_upload(request.FILES["file"])
+
+    resume_from = request.GET.get("resume_from", "0")
+    if not resume_from.isdigit():
+        return JsonResponse({"error": "resume_from must be a byte offset"}, status=400)
+
+    return ingest_upload(request.FILES["file"], int(resume_from))
+
+
+def queue_upload(file):
+    """Queues ``file`` for the ingest worker and returns the 202 response of the upload."""
+    job = enqueue_job(file)
+    return JsonResponse(
+        {
+            "status": "accepted",
+            "data": {"job_id": job.pk},
+            "message": "File queued.",
+        },
+        status=202,
+    )
+
+
+def ingest_upload(file, resume_from=0):
+    """Ingests the uploaded ``file`` from the byte offset ``resume_from``.
+
+    Returns the response of the upload, which pins the client to the primary database.
+    """
+    # checkpoint of the last committed batch, returned if the import fails so the
+    # client can resume it with ?resume_from=<offset>
+    lines = CSVLineReader(file.chunks(), offset=resume_from)
+    checkpoint = {"offset": resume_from, "created": 0, "duplicated": 0, "failed": 0}
+
+    def record_checkpoint(batch_result, total):
+        # called inside the batch's transaction: the batch only counts once committed
+        transaction.on_commit(partial(checkpoint.update, offset=lines.offset, **total.as_dict()))
+
     try:
-        csv_file = request.FILES["file"]
-        decoded_file = csv_file.read().decode("utf-8")
-        reader = csv.DictReader(io.StringIO(decoded_file))
-        created = 0
-        duplicated = 0
-        failed = 0
-        # if agency_id is not specified, added to the default one
-        default_agency = CollectionAgency.objects.first()
-
-        for row in reader:
-            client_ref = row["client reference no"].strip()
-            balance = row["balance"]
-            status = row["status"].strip()
-            name = row["consumer name"].strip()
-            address = row["consumer address"].strip()
-            ssn = row["ssn"].strip()
-            agency_id = row.get("agency_id")
-            if agency_id:
-                _agency = CollectionAgency.objects.filter(id=agency_id).first()
-                if not _agency:
-                    print(f"Agency with ID {agency_id} not found.")
-                    # logger.error(f"Agency with ID {agency_id} not found.")
-                    failed += 1
-                    continue
-            else:
-                _agency = default_agency
-            # Get or create the client
-            client, _ = Client.objects.get_or_create(
-                reference_no=client_ref,
-                defaults={
-                    "name": f"Client {client_ref}",
-                    "agency": _agency,
-                },
-            )
-
-            # Get or create the consumer
-            consumer, _ = Consumer.objects.get_or_create(
-                ssn=ssn,
-                defaults={
-                    "name": name,
-                    "address": address,
-                    "is_entity": False,
-                },
-            )
-
-            # Create the debt
-            debt = Debt.objects.create(
-                balance=balance,
-                status=status,
-                client_reference_no=client_ref,
-                client=client,
-            )
-            debt.consumers.add(consumer)
-            created += 1
+        result = ingest_rows(csv.DictReader(lines), on_batch=record_checkpoint)
+        record_rows(result.processed)
 
-        return JsonResponse(
+        response = JsonResponse(
             {
                 "status": "success",
-                "data": {
-                    "created": created,
-                    "duplicated": duplicated,
-                    "failed": failed,
-                },
+                "data": result.as_dict(),
                 "message": "File processed.",
             }
         )
 
+    except CSVEncodingError as e:
+        response = JsonResponse({"error": str(e), "checkpoint": checkpoint}, status=400)
+
     except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+        response = JsonResponse({"error": str(e), "checkpoint": checkpoint}, status=500)
+
+    # the batches committed so far are not on the replicas yet
+    return pin_to_primary(response)
+
+
+def upload_csv_status(request, job_id):
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed"}, status=405)
+
+    job = get_object_or_404(IngestJob, pk=job_id)
+    return JsonResponse({"status": "success", "data": job_status(job)})
+
+
+def prometheus_metrics(request):
+    """Exposes the request metrics of this process in the Prometheus text format."""
+    if not settings.REQUEST_METRICS_ENABLED:
+        raise Http404("Request metrics are disabled")
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4")
+
+
+def debt_summary(request):
+    """Returns the debt count and balance of the portfolio, optionally grouped.
+
+    ``group_by`` is a comma-separated list of status, agency and client; the totals
+    can be filtered on ``agency_id`` and ``status``. Served from the rollups, so the
+    cost depends on the number of groups rather than the number of debts.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed"}, status=405)
+
+    group_by = [name for name in request.GET.get("group_by", "status").split(",") if name]
+    unknown = [name for name in group_by if name not in GROUP_FIELDS]
+    if unknown:
+        return JsonResponse(
+            {"error": f"group_by must be a list of: {', '.join(GROUP_FIELDS)}"}, status=400
+        )
+
+    agency_id = request.GET.get("agency_id", "")
+    if agency_id and not agency_id.isdigit():
+        return JsonResponse({"error": "agency_id must be an integer"}, status=400)
+
+    summary = summarize(
+        group_by,
+        agency_id=agency_id,
+        status=canonical_status(request.GET.get("status", "")),
+        using=read_database(request),
+    )
+    return JsonResponse(summary)
+
+
+EXPORT_CSV_HEADER = [
+    "id",
+    "balance",
+    "status",
+    "client",
+    "consumer_id",
+    "consumer_name",
+    "consumer_is_entity",
+]
+
+
+class Echo:
+    """A file-like object whose ``write`` returns the data, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(rows, chunk_size, header, render):
+    """Yields the ``header`` then the debts of ``rows`` rendered chunk by chunk.
+
+    The debts are serialized like the account list and ``render`` turns every chunk of
+    them into lines.
+    """
+    if header:
+        yield header
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield render(serialize_debt_rows(chunk, using=rows.db))
+            chunk = []
+    if chunk:
+        yield render(serialize_debt_rows(chunk, using=rows.db))
+
+
+def export_csv_lines(debts):
+    # one line per debt and consumer, like the import files
+    writer = csv.writer(Echo())
+    lines = []
+    for debt in debts:
+        fields = [debt["id"], debt["balance"], debt["status"], debt["client"]]
+        consumers = [
+            [consumer["id"], consumer["name"], consumer["is_entity"]]
+            for consumer in debt["consumers"]
+        ]
+        for consumer in consumers or [["", "", ""]]:
+            lines.append(writer.writerow(fields + consumer))
+    return "".join(lines)
+
+
+def export_ndjson_lines(debts):
+    return "".join(
+        json.dumps(debt, ensure_ascii=False, separators=(",", ":")) + "\n" for debt in debts
+    )
+
+
+# the content type, header and renderer of every export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", csv.writer(Echo()).writerow(EXPORT_CSV_HEADER), export_csv_lines),
+    "ndjson": ("application/x-ndjson", "", export_ndjson_lines),
+}
+
+
+def export_debts(request):
+    """Streams every debt matching the account list filters as CSV or NDJSON.
+
+    Rows are read through a server-side cursor ``ACCOUNT_EXPORT_CHUNK_SIZE`` at a
+    time, so memory stays flat however many debts are exported.
+    """
+    return export_response(request, export_lines)
+
+
+def export_response(request, lines):
+    """Returns the response of an export request, streaming ``lines``.
+
+    ``lines`` is :func:`export_lines` or a function taking the same arguments; no query
+    runs before the response is streamed.
+    """
+    if request.method != "GET":
+        return JsonResponse({"error": "Only GET method allowed"}, status=405)
+
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse(
+            {"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400
+        )
+
+    content_type, header, render = EXPORT_FORMATS[export_format]
+    debts = Debt.objects.using(read_database(request)).order_by("created_at", "id")
+    rows = filter_debts(debts, request.GET).values_list(*DEBT_ROW_FIELDS, named=True)
+    response = StreamingHttpResponse(
+        lines(rows, settings.ACCOUNT_EXPORT_CHUNK_SIZE, header, render),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = f'attachment; filename="debts.{export_format}"'
+    return response
@@ -2,15 +2,48 @@
 ASGI config for collectionagency project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests under STATIC_URL are served by WhiteNoise, the others by Django, with the
+async versions of the account list, export and upload views (SERVER_INTERFACE=asgi).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import logging
 
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from dotenv import load_dotenv
+from whitenoise import WhiteNoise
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "collectionagency.settings")
+logger = logging.getLogger(__name__)
+load_dotenv()
 
-application = get_asgi_application()
+
+ENV = os.getenv("ENV", "dev")
+settings_module = f"collectionagency.settings.{ENV}"
+
+logger.info(f"Loading {settings_module} config.")
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+os.environ.setdefault("SERVER_INTERFACE", "asgi")
+
+django_application = get_asgi_application()
+
+
+def static_file_not_found(environ, start_response):
+    start_response("404 Not Found", [("Content-Type", "text/plain")])
+    return [b"Not Found"]
+
+
+# WhiteNoise is a WSGI application: static files are served in a thread
+static_files = WsgiToAsgi(
+    WhiteNoise(static_file_not_found, root=settings.STATIC_ROOT, prefix=settings.STATIC_URL)
+)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"].startswith(settings.STATIC_URL):
+        return await static_files(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -56,6 +56,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + MY_APPS
 
 MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "accounts.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -65,6 +66,14 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# "asgi" when served by collectionagency/asgi.py, which sets it: the account list,
+# export and upload are then served by their async views (accounts/async_views.py)
+SERVER_INTERFACE = os.environ.get("SERVER_INTERFACE", "wsgi")
+if SERVER_INTERFACE == "asgi":
+    # a synchronous middleware would run every request in a thread; asgi.py serves
+    # the static files instead
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = "collectionagency.urls"
 
 TEMPLATES = [
@@ -88,12 +97,49 @@ WSGI_APPLICATION = "collectionagency.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned so that the account list can be read while an upload writes:
+# - WAL journaling: readers neither wait for the writer nor block its commits;
+# - synchronous=NORMAL: in WAL mode a crash cannot corrupt the database, the last
+#   commits are only lost on power failure;
+# - 256 MB memory-mapped reads and a 64 MB page cache;
+# - transactions take the write lock when they begin (BEGIN IMMEDIATE) and wait up to
+#   SQLITE_TIMEOUT seconds for it, instead of failing with "database is locked" when
+#   a read turns into a write. The mode is per connection, so this applies to every
+#   atomic() block, not only to the ingest batches: two atomic() blocks never run at
+#   the same time, even if one of them only reads, and the second waits for the
+#   first to commit. Every atomic() block of the app writes (ingest batches, client
+#   moves, rollup rebuilds), as do Django's (sessions, admin); the list, export and
+#   summary read in autocommit mode and are not affected.
+SQLITE_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA mmap_size=268435456;"
+        "PRAGMA cache_size=-64000;"
+    ),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": int(os.environ.get("SQLITE_TIMEOUT", "20")),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "OPTIONS": SQLITE_OPTIONS,
+    },
 }
+# A read replica of the primary for the routing tests, which list it in
+# DATABASE_REPLICAS: it is a test mirror of the primary, and otherwise unused (reads
+# only go to the aliases listed in DATABASE_REPLICAS, and no connection is opened)
+TEST_REPLICA = {"TEST": {"MIRROR": "default"}}
+DATABASES["replica"] = {**DATABASES["default"], **TEST_REPLICA}
+DATABASE_ROUTERS = ["accounts.routers.ReplicaRouter"]
+
+# Aliases of the read replicas serving the account list, export and summary reads
+DATABASE_REPLICAS: list[str] = []
+# Seconds a client reads from the primary after an upload, and the longest a response
+# read from a replica is cached: the replication lag that is tolerated
+DATABASE_REPLICA_LAG_SECONDS = int(os.environ.get("DATABASE_REPLICA_LAG_SECONDS", "10"))
 
 
 # Password validation
@@ -135,7 +181,42 @@ STATICFILES_DIRS = [
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Uploaded files, e.g. the CSV files queued for asynchronous ingestion.
+# The ingest worker must be able to read this directory.
+MEDIA_URL = "/media/"
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Number of CSV rows persisted per transaction by the ingestion engine
+CSV_INGEST_BATCH_SIZE = int(os.environ.get("CSV_INGEST_BATCH_SIZE", "1000"))
+# On PostgreSQL, stream batches through COPY into a staging table instead of the ORM
+CSV_INGEST_USE_COPY = os.environ.get("CSV_INGEST_USE_COPY", "True") == "True"
+
+# Seconds an exact total of the account list is cached for identical filters
+ACCOUNT_LIST_COUNT_CACHE_SECONDS = int(os.environ.get("ACCOUNT_LIST_COUNT_CACHE_SECONDS", "30"))
+# Rows fetched per round trip by the streaming export (server-side cursor on PostgreSQL)
+ACCOUNT_EXPORT_CHUNK_SIZE = int(os.environ.get("ACCOUNT_EXPORT_CHUNK_SIZE", "2000"))
+
+# Per-request SQL/latency instrumentation: Server-Timing headers and GET /metrics
+REQUEST_METRICS_ENABLED = os.environ.get("REQUEST_METRICS_ENABLED", "False") == "True"
+
+# Local memory by default; file or database caches are shared by all worker processes
+# (the database cache needs `python manage.py createcachetable`)
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
+# Seconds account list responses are cached; ingestion invalidates them earlier (0 disables).
+# Off by default with local memory: an upload would only invalidate the pages cached by
+# the process that ingested it, the other processes would keep serving theirs
+_SHARED_CACHE = CACHES["default"]["BACKEND"] != "django.core.cache.backends.locmem.LocMemCache"
+ACCOUNT_LIST_CACHE_SECONDS = int(
+    os.environ.get("ACCOUNT_LIST_CACHE_SECONDS", "300" if _SHARED_CACHE else "0")
+)
@@ -18,3 +18,14 @@ DATABASES = {
         "PASSWORD": os.environ["DB_PASSWORD"],
     }
 }
+DATABASES["replica"] = {**DATABASES["default"], **TEST_REPLICA}
+
+# Read replicas: comma-separated hosts of the primary's streaming replicas
+for index, host in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(","))):
+    alias = f"replica{index + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
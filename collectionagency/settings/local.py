@@ -21,3 +21,4 @@ DATABASES = {
         "PASSWORD": os.environ["DB_PASSWORD"],
     }
 }
+DATABASES["replica"] = {**DATABASES["default"], **TEST_REPLICA}
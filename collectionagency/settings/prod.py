@@ -0,0 +1,39 @@
+"""Production settings: the Cloud Run settings with persistent, health-checked connections.
+
+Selected with ENV=prod. Served by gunicorn with ``gunicorn.conf.py``, which sizes
+workers and threads so that the connections they hold fit in DB_MAX_CONNECTIONS.
+"""
+
+import os
+
+# flake8: noqa
+from .dev import *
+
+# Keep connections open across requests instead of paying for a new connection
+# (TCP, TLS and authentication) on every request. Django checks a reused connection
+# before the first query of each request and replaces it if the server dropped it.
+CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "600"))
+if SERVER_INTERFACE == "asgi":
+    # under ASGI the queries of each request run in a thread of their own, whose
+    # connection could not be reused: the pool below keeps them open instead
+    CONN_MAX_AGE = 0
+CONN_HEALTH_CHECKS = True
+
+# psycopg 3 connection pool: each worker process keeps DB_POOL_MAX_SIZE connections
+# shared by its threads. On by default under ASGI, which would otherwise open a new
+# connection for every request.
+DB_POOL = os.environ.get("DB_POOL", str(SERVER_INTERFACE == "asgi")) == "True"
+
+for database in DATABASES.values():  # the primary and the read replicas
+    database["CONN_MAX_AGE"] = CONN_MAX_AGE
+    database["CONN_HEALTH_CHECKS"] = CONN_HEALTH_CHECKS
+    if DB_POOL:
+        # pooled connections are returned to the pool after each request
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "1")),
+                "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "4")),
+                "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            }
+        }
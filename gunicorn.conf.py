@@ -0,0 +1,109 @@
+"""Gunicorn configuration, loaded from the working directory by ``gunicorn``.
+
+Workers and threads are derived from the CPU cores and the memory available to the
+container, and from the number of database connections the instance may hold,
+DB_MAX_CONNECTIONS: with persistent connections (see
+``collectionagency/settings/prod.py``) every thread keeps its own connection, so
+``workers * threads`` never exceeds it. With DB_POOL=True each worker gets a pool of
+``threads`` connections instead. Every worker is a full Django process, budgeted at
+WORKER_MEMORY_MB (128) of the container's memory.
+
+SERVER_INTERFACE=asgi serves ``collectionagency.asgi`` with uvicorn workers instead:
+one event loop per core holds any number of slow clients, and every worker gets a
+pool of its share of the connections (DB_POOL, on by default under ASGI).
+
+WEB_CONCURRENCY and GUNICORN_THREADS override the computed values; the threads are
+still limited to the connections left to each worker.
+"""
+
+import math
+import os
+
+# (2 x cores) + 1 processes, as the gunicorn docs suggest
+WORKERS_PER_CORE = 2
+MAX_THREADS = 4
+WORKER_MEMORY_MB = int(os.environ.get("WORKER_MEMORY_MB", "128"))
+
+
+def available_cores():
+    """Cores usable by this process, honouring the cgroup CPU quota of containers."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cores = min(cores, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+def available_memory_mb():
+    """Memory usable by this process in MiB, honouring the cgroup limit of containers."""
+    memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    try:
+        with open("/sys/fs/cgroup/memory.max") as memory_max:
+            limit = memory_max.read().strip()
+        if limit != "max":
+            memory = min(memory, int(limit))
+    except (OSError, ValueError):
+        pass
+    return memory // (1024 * 1024)
+
+
+def worker_sizing(cores, connection_budget, memory_mb, workers=None, max_threads=MAX_THREADS):
+    """Returns the ``(workers, threads)`` to run with, within the connection budget.
+
+    ``workers`` overrides the number of workers computed from the cores and memory;
+    the threads always share what is left of the connection budget.
+    """
+    if workers is None:
+        workers = max(
+            1,
+            min(
+                WORKERS_PER_CORE * cores + 1,
+                connection_budget,
+                memory_mb // WORKER_MEMORY_MB,
+            ),
+        )
+    threads = max(1, min(max_threads, connection_budget // workers))
+    return workers, threads
+
+
+def asgi_worker_count(cores, connection_budget, memory_mb):
+    """Returns the number of uvicorn workers to run: one event loop per core."""
+    return max(1, min(cores, connection_budget, memory_mb // WORKER_MEMORY_MB))
+
+
+_cores = available_cores()
+_memory_mb = available_memory_mb()
+_connection_budget = int(os.environ.get("DB_MAX_CONNECTIONS", "20"))
+_workers = int(os.environ["WEB_CONCURRENCY"]) if "WEB_CONCURRENCY" in os.environ else None
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+if os.environ.get("SERVER_INTERFACE", "wsgi") == "asgi":
+    wsgi_app = "collectionagency.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    workers = _workers or asgi_worker_count(_cores, _connection_budget, _memory_mb)
+    _connections = max(1, _connection_budget // workers)
+else:
+    wsgi_app = "collectionagency.wsgi:application"
+    worker_class = "gthread"
+    workers, threads = worker_sizing(
+        _cores,
+        _connection_budget,
+        _memory_mb,
+        workers=_workers,
+        max_threads=int(os.environ.get("GUNICORN_THREADS", MAX_THREADS)),
+    )
+    _connections = threads
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+# the settings are imported by each worker (no preload_app), so no connection is
+# opened in the master and shared across forks
+preload_app = False
+
+# a pooled WSGI worker needs one connection per thread, an ASGI one its share
+os.environ.setdefault("DB_POOL_MAX_SIZE", str(_connections))